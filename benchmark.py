@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конвейера на синтетических данных.
+
+Генерирует architecture.json с N модулями верхнего уровня и подмодулями
+глубины D, соответствующее дерево файлов и локальный Git-репозиторий
+с C коммитами, которые меняют файлы группами (имитация совместных изменений).
+Затем замеряет время и пиковую память этапов: сканирование, JsonVisitor,
+JsonDeserializer, загрузка истории git2sqlite и query_graph_data_new.
+
+Все работает офлайн, нужен только установленный git.
+
+Пример:
+    python3 benchmark.py --modules 50 --depth 2 --files-per-module 40 --commits 2000 --repeat 3
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from main import load_project
+from visitors import JsonVisitor
+from deserializer import JsonDeserializer
+from profiling import add_profile_argument, profile_session
+from path_table import PATH_TABLE
+import git2sqlite
+import gen_graph_gs
+
+# Расширения файлов синтетического проекта
+EXTENSIONS = (".cpp", ".h")
+
+# Начало синтетической истории: коммиты идут с шагом в несколько минут до "сейчас"
+COMMIT_INTERVAL_SECONDS = 600
+
+
+@dataclass
+class SyntheticProject:
+    """Сгенерированные входные данные"""
+    root: Path
+    architecture: Path
+    modules: int = 0
+    files: List[str] = field(default_factory=list)  # Пути относительно root
+    commits: int = 0
+
+
+def _module_tree(name: str, path: str, depth: int, fanout: int,
+                 files_per_module: int, files: List[str]) -> dict:
+    """Описание модуля для architecture.json; файлы модуля добавляются в files"""
+    for i in range(files_per_module):
+        # Часть файлов лежит во вложенных директориях модуля
+        subdir = f"impl{i % 3}/" if i % 4 == 3 else ""
+        files.append(f"{path}/{subdir}{name}File{i}{EXTENSIONS[i % len(EXTENSIONS)]}")
+    module = {
+        "name": name,
+        "paths": [path],
+        "owners": [f"{name.lower()}.owner@example.com"],
+        "description": f"Synthetic module {name}",
+    }
+    if depth > 0:
+        module["submodules"] = [
+            _module_tree(f"{name}Sub{j}", f"{path}/{name}Sub{j}", depth - 1, fanout,
+                         files_per_module, files)
+            for j in range(fanout)
+        ]
+    return module
+
+
+def generate_architecture(root: Path, modules: int, depth: int, fanout: int,
+                          files_per_module: int) -> SyntheticProject:
+    """Создает дерево файлов в root и architecture.json рядом с ним"""
+    files: List[str] = []
+    top_level = [_module_tree(f"Module{i}", f"src/Module{i}", depth, fanout, files_per_module, files)
+                 for i in range(modules)]
+    count = modules * sum(fanout ** level for level in range(depth + 1))
+
+    for rel_path in files:
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("// generated\n")
+
+    architecture = root.parent / "architecture.json"
+    with open(architecture, "w", encoding="utf-8") as f:
+        json.dump({"project": "Synthetic", "name": "Synthetic", "root_directory": str(root),
+                   "modules": top_level}, f, indent=2)
+    return SyntheticProject(root=root, architecture=architecture, modules=count, files=files)
+
+
+def _data(payload: str) -> str:
+    encoded = payload.encode("utf-8")
+    return f"data {len(encoded)}\n{payload}\n"
+
+
+def generate_git_history(project: SyntheticProject, commits: int, touched_files: int,
+                         authors: int, seed: int) -> None:
+    """
+    Создает Git-репозиторий в project.root через git fast-import
+
+    Файлы делятся на группы совместного изменения внутри директорий;
+    коммит обычно меняет часть одной группы (популярность групп убывает
+    по Ципфу) и изредка добавляет случайный файл из другого места.
+    """
+    rng = random.Random(seed)
+    files = sorted(project.files)
+    touched = sorted(rng.sample(files, min(touched_files, len(files))))
+
+    # Группы соседних по пути файлов: совместно меняются файлы одной директории
+    groups: List[List[str]] = []
+    position = 0
+    while position < len(touched):
+        size = rng.randint(3, 8)
+        groups.append(touched[position:position + size])
+        position += size
+    weights = [1.0 / (rank + 1) for rank in range(len(groups))]
+    rng.shuffle(weights)
+
+    lines: Dict[str, int] = {path: 1 for path in files}
+    start = int(time.time()) - commits * COMMIT_INTERVAL_SECONDS
+    stream = io.StringIO()
+
+    def commit(mark: int, timestamp: int, author: int, message: str, changed: List[str]) -> None:
+        stream.write(f"commit refs/heads/master\nmark :{mark}\n")
+        identity = f"Author {author} <author{author}@example.com> {timestamp} +0000"
+        stream.write(f"author {identity}\ncommitter {identity}\n")
+        stream.write(_data(message))
+        if mark > 1:
+            stream.write(f"from :{mark - 1}\n")
+        for path in changed:
+            stream.write(f"M 100644 inline {path}\n")
+            stream.write(_data("".join(f"line {i}\n" for i in range(lines[path]))))
+
+    commit(1, start, 0, "Initial import", files)
+    for number in range(2, commits + 1):
+        group = rng.choices(groups, weights)[0]
+        changed = rng.sample(group, rng.randint(1, len(group)))
+        if rng.random() < 0.1:
+            changed.append(rng.choice(touched))
+        changed = sorted(set(changed))
+        for path in changed:
+            lines[path] += rng.randint(1, 5)
+        commit(number, start + number * COMMIT_INTERVAL_SECONDS, rng.randrange(authors),
+               f"Change {number}", changed)
+
+    git = ["git", "-C", str(project.root)]
+    subprocess.run(git + ["init", "-q"], check=True)
+    subprocess.run(git + ["fast-import", "--quiet"], input=stream.getvalue(), text=True, check=True)
+    subprocess.run(git + ["checkout", "-q", "-f", "master"], check=True)
+    project.commits = commits
+
+
+@dataclass
+class StageResult:
+    name: str
+    seconds: float
+    peak_bytes: Optional[int]
+
+
+def measure(name: str, setup: Callable[[], object], run: Callable[[object], None],
+            repeat: int, memory: bool) -> StageResult:
+    """
+    Замеряет этап
+
+    Время - лучшее из repeat запусков без трассировки памяти; пиковая память -
+    отдельный запуск под tracemalloc (трассировка замедляет выполнение и на
+    время не влияет). setup готовит свежее состояние и в замер не входит.
+    Перед каждым setup общая таблица путей очищается: иначе пути, добавленные
+    предыдущими запусками и этапами, не попадали бы в замер.
+    """
+    best = None
+    for _ in range(repeat):
+        PATH_TABLE.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            state = setup()
+            started = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        PATH_TABLE.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            state = setup()
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(state)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return StageResult(name, best, peak)
+
+
+def run_benchmarks(project: SyntheticProject, work_dir: Path, repeat: int, memory: bool,
+                   jobs: int) -> List[StageResult]:
+    results = []
+    result_json = work_dir / "result.json"
+    database = work_dir / "git_history.db"
+
+    def scanned_project():
+        scanned = load_project(str(project.architecture))
+        scanned.scan_files(project.root, jobs=jobs)
+        return scanned
+
+    results.append(measure("scan_files", lambda: load_project(str(project.architecture)),
+                           lambda state: state.scan_files(project.root, jobs=jobs), repeat, memory))
+
+    def write_json(state) -> None:
+        visitor = JsonVisitor()
+        state.accept(visitor)
+        result_json.write_text(visitor.get_result(), encoding="utf-8")
+
+    results.append(measure("json_visitor", scanned_project, write_json, repeat, memory))
+    results.append(measure("deserialize", lambda: None,
+                           lambda _: JsonDeserializer.deserialize(result_json), repeat, memory))
+    results.append(measure("deserialize_lazy", lambda: None,
+                           lambda _: JsonDeserializer.deserialize(result_json, lazy=True), repeat, memory))
+
+    def fresh_database():
+        if database.exists():
+            database.unlink()
+        return git2sqlite.create_database(str(database))
+
+    def ingest(connection) -> None:
+        git2sqlite.file_renames.clear()
+        git2sqlite.load_git_history(connection, {}, repo_path=str(project.root))
+        connection.close()
+
+    results.append(measure("git2sqlite_ingest", fresh_database, ingest, repeat, memory))
+
+    # query_graph_data_new берет эти параметры из глобальных переменных модуля
+    gen_graph_gs.max_files_per_commit = 21
+    gen_graph_gs.connection_threshold = 1
+    results.append(measure("query_graph_data_new", lambda: None,
+                           lambda _: gen_graph_gs.query_graph_data_new(str(database), None, None),
+                           repeat, memory))
+    return results
+
+
+def format_results(project: SyntheticProject, results: List[StageResult]) -> str:
+    lines = [f"Synthetic project: {project.modules} modules, {len(project.files)} files, "
+             f"{project.commits} commits",
+             f"{'stage':<22}{'time, ms':>12}{'peak memory, MB':>18}"]
+    for result in results:
+        peak = f"{result.peak_bytes / 2 ** 20:.1f}" if result.peak_bytes is not None else "-"
+        lines.append(f"{result.name:<22}{result.seconds * 1000:>12.1f}{peak:>18}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic inputs")
+    parser.add_argument("--modules", type=int, default=20, help="Number of top-level modules (default: 20)")
+    parser.add_argument("--depth", type=int, default=2, help="Depth of submodules (default: 2)")
+    parser.add_argument("--fanout", type=int, default=2, help="Submodules per module (default: 2)")
+    parser.add_argument("--files-per-module", type=int, default=20, help="Files per module (default: 20)")
+    parser.add_argument("--commits", type=int, default=500, help="Number of commits (default: 500)")
+    parser.add_argument("--touched-files", type=int, default=2000,
+                        help="Number of distinct files changed by the history (default: 2000)")
+    parser.add_argument("--authors", type=int, default=20, help="Number of commit authors (default: 20)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the best time is reported")
+    parser.add_argument("--jobs", type=int, default=1, help="Threads for scan_files (default: 1)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory run")
+    parser.add_argument("--workdir", help="Directory for generated data (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep generated data")
+    parser.add_argument("--json", metavar="FILE", help="Also write results as JSON")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    work_dir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="archtrace-bench-"))
+    work_dir = work_dir.resolve()
+    root = work_dir / "repo"
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+
+    try:
+        started = time.perf_counter()
+        project = generate_architecture(root, args.modules, args.depth, args.fanout,
+                                        args.files_per_module)
+        generate_git_history(project, args.commits, args.touched_files, args.authors, args.seed)
+        print(f"Generated inputs in {time.perf_counter() - started:.1f} s: {work_dir}", file=sys.stderr)
+
+        with profile_session(args.profile):
+            results = run_benchmarks(project, work_dir, max(1, args.repeat), not args.no_memory, args.jobs)
+        print(format_results(project, results))
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({
+                    "parameters": {key: value for key, value in vars(args).items()
+                                   if key not in ("json", "workdir", "keep", "profile")},
+                    "modules": project.modules,
+                    "files": len(project.files),
+                    "commits": project.commits,
+                    "stages": [{"name": result.name, "seconds": result.seconds, "peak_bytes": result.peak_bytes}
+                               for result in results],
+                }, f, indent=2)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir if not args.workdir else root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
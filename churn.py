@@ -0,0 +1,331 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+import csv
+import sqlite3
+import logging
+import time
+
+import history_db
+from path_index import PathTrie
+from profiling import PROFILER
+
+# Сводки изменений по файлам, модулям и авторам (таблицы churn_* в history_db).
+# Сводки пересчитываются из commit_files только за затронутые загрузкой сутки
+# и недели, поэтому их обновление пропорционально объему новой истории.
+
+DAY = 86400
+WEEK = 7 * DAY
+
+# Модуль файла, не попавшего ни в один путь modules.csv
+UNKNOWN_MODULE = "Unknown"
+
+# Водяной знак сводок в ingest_state: tip - наибольший commits.id, учтенный
+# сводками. repo_id 0 не принадлежит ни одному репозиторию
+ROLLUP_REPO_ID = 0
+ROLLUP_REF = "churn_rollups"
+
+# Начало суток и недели (понедельник) UTC для commits.commit_time.
+# День 0 (1970-01-01) - четверг, ближайший понедельник - день 4
+DAY_SQL = f"commits.commit_time / {DAY} * {DAY}"
+WEEK_SQL = f"(commits.commit_time / {DAY} - (commits.commit_time / {DAY} + 3) % 7) * {DAY}"
+
+
+def day_start(value) -> int:
+    """Начало суток UTC для времени (число, datetime или строка, см. history_db.to_epoch)"""
+    return history_db.to_epoch(value) // DAY * DAY
+
+
+def week_start(value) -> int:
+    """Начало недели (понедельник 00:00 UTC) для времени"""
+    day = history_db.to_epoch(value) // DAY
+    return (day - (day + 3) % 7) * DAY
+
+
+class ModuleMapper:
+    """
+    Модуль файла по modules.csv (столбцы path, module).
+
+    Как и в gen_graph_gs, файл относится к модулю с самым длинным путем-префиксом;
+    файлы вне всех путей относятся к UNKNOWN_MODULE. Префикс сравнивается по
+    сегментам (PathTrie), поэтому путь "src/core" не захватывает "src/core2".
+    """
+
+    def __init__(self, modules: Iterable[Tuple[str, str]] = ()):
+        """
+        Args:
+            modules: Пары (путь, имя модуля)
+        """
+        self._trie: PathTrie[str] = PathTrie()
+        self.size = 0
+        for path, module in modules:
+            self._trie.insert(path, module)
+            self.size += 1
+
+    @classmethod
+    def from_csv(cls, modules_file: str | Path) -> ModuleMapper:
+        """Читает modules.csv; первая строка - заголовок"""
+        with open(modules_file, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))[1:]
+        return cls((row[0].strip(), row[1].strip()) for row in rows if len(row) >= 2)
+
+    def module(self, path: str) -> str:
+        return self._trie.longest_prefix(path) or UNKNOWN_MODULE
+
+
+def _ranges(starts: Iterable[int], step: int) -> List[Tuple[int, int]]:
+    """Сливает начала интервалов длины step в непрерывные диапазоны [start, end)"""
+    ranges: List[Tuple[int, int]] = []
+    for start in sorted(set(starts)):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + step)
+        else:
+            ranges.append((start, start + step))
+    return ranges
+
+
+def _fill_period(connection: sqlite3.Connection, name: str, starts: Set[int], step: int) -> None:
+    """
+    Временные таблицы затронутого периода: {name} - начала суток или недель
+    (для удаления сводок по индексу) и {name}_ranges - непрерывные диапазоны
+    времени (для выборки коммитов по индексу commits_time)
+    """
+    connection.execute(f"CREATE TEMP TABLE {name} (start INTEGER PRIMARY KEY)")
+    connection.execute(f"CREATE TEMP TABLE {name}_ranges (start INTEGER, stop INTEGER)")
+    connection.executemany(f"INSERT INTO temp.{name} VALUES (?)", ((start,) for start in starts))
+    connection.executemany(f"INSERT INTO temp.{name}_ranges VALUES (?, ?)", _ranges(starts, step))
+
+
+def _fill_file_modules(connection: sqlite3.Connection, modules: ModuleMapper, commits: str) -> None:
+    """
+    Временная таблица "файл -> модуль": модуль вычисляется один раз на файл, а не на строку
+
+    Только для файлов, измененных коммитами commits (выражение FROM): при
+    обновлении за несколько суток остальные файлы базы не нужны.
+    """
+    connection.execute("CREATE TEMP TABLE file_module (file_id INTEGER PRIMARY KEY, module TEXT)")
+    if commits == "commits":
+        files = connection.execute("SELECT id, path FROM files").fetchall()
+    else:
+        files = connection.execute(f"""
+            SELECT files.id, files.path FROM files WHERE files.id IN (
+                SELECT commit_files.file_id FROM {commits}
+                JOIN commit_files ON commit_files.commit_id = commits.id)
+        """).fetchall()
+    connection.executemany("INSERT INTO temp.file_module VALUES (?, ?)",
+                           ((file_id, modules.module(path)) for file_id, path in files))
+
+
+def _rollup_watermark(connection: sqlite3.Connection) -> Optional[int]:
+    """Наибольший commits.id, учтенный сводками; None - сводки еще не строились"""
+    row = connection.execute("SELECT tip FROM ingest_state WHERE repo_id = ? AND ref = ?",
+                             (ROLLUP_REPO_ID, ROLLUP_REF)).fetchone()
+    return int(row[0]) if row else None
+
+
+def _save_rollup_watermark(connection: sqlite3.Connection) -> None:
+    last_commit = connection.execute("SELECT COALESCE(MAX(id), 0) FROM commits").fetchone()[0]
+    connection.execute("INSERT OR REPLACE INTO ingest_state (repo_id, ref, tip, updated_at) VALUES (?, ?, ?, ?)",
+                       (ROLLUP_REPO_ID, ROLLUP_REF, str(last_commit), int(time.time())))
+
+
+_TEMP_TABLES = ("churn_days", "churn_days_ranges", "churn_weeks", "churn_weeks_ranges", "file_module")
+
+
+def _refresh(connection: sqlite3.Connection, days: Optional[Set[int]], modules: ModuleMapper) -> None:
+    """Пересчитывает сводки за сутки days и их недели (None - за всю историю)"""
+    if days is None:
+        for table in ("churn_file_day", "churn_module_day", "churn_author_module_week"):
+            connection.execute(f"DELETE FROM {table}")
+        day_commits = week_commits = "commits"
+    else:
+        _fill_period(connection, "churn_days", days, DAY)
+        _fill_period(connection, "churn_weeks", {week_start(day) for day in days}, WEEK)
+        connection.execute("DELETE FROM churn_file_day WHERE day IN (SELECT start FROM temp.churn_days)")
+        connection.execute("DELETE FROM churn_module_day WHERE day IN (SELECT start FROM temp.churn_days)")
+        connection.execute("DELETE FROM churn_author_module_week WHERE week IN (SELECT start FROM temp.churn_weeks)")
+        day_commits, week_commits = (
+            f"temp.{name}_ranges AS period JOIN commits "
+            f"ON commits.commit_time >= period.start AND commits.commit_time < period.stop"
+            for name in ("churn_days", "churn_weeks"))
+    # Недели содержат затронутые сутки, поэтому их коммиты покрывают оба периода
+    _fill_file_modules(connection, modules, week_commits)
+
+    connection.execute(f"""
+        INSERT INTO churn_file_day (file_id, day, added, deleted, commits)
+        SELECT commit_files.file_id, {DAY_SQL}, SUM(commit_files.added), SUM(commit_files.deleted),
+               COUNT(DISTINCT commits.id)
+        FROM {day_commits}
+        JOIN commit_files ON commit_files.commit_id = commits.id
+        WHERE commits.commit_time IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    connection.execute(f"""
+        INSERT INTO churn_module_day (repo_id, module, day, added, deleted, commits)
+        SELECT commits.repo_id, file_module.module, {DAY_SQL}, SUM(commit_files.added),
+               SUM(commit_files.deleted), COUNT(DISTINCT commits.id)
+        FROM {day_commits}
+        JOIN commit_files ON commit_files.commit_id = commits.id
+        JOIN temp.file_module ON file_module.file_id = commit_files.file_id
+        WHERE commits.commit_time IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    connection.execute(f"""
+        INSERT INTO churn_author_module_week (author_id, repo_id, module, week, added, deleted, commits)
+        SELECT commits.author_id, commits.repo_id, file_module.module, {WEEK_SQL}, SUM(commit_files.added),
+               SUM(commit_files.deleted), COUNT(DISTINCT commits.id)
+        FROM {week_commits}
+        JOIN commit_files ON commit_files.commit_id = commits.id
+        JOIN temp.file_module ON file_module.file_id = commit_files.file_id
+        WHERE commits.commit_time IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+    _save_rollup_watermark(connection)
+
+
+@PROFILER.profiled("sqlite.churn")
+def update_rollups(connection: sqlite3.Connection, days: Iterable[int],
+                   modules: Optional[ModuleMapper] = None) -> None:
+    """
+    Пересчитывает сводки за затронутые сутки и содержащие их недели
+
+    Учтенные сводками коммиты отмечены водяным знаком в ingest_state. Сутки
+    коммитов, загруженных после него, добавляются к days; если знака нет
+    (сводки не строились или база обновлена со старой схемы), сводки
+    строятся заново по всей истории.
+
+    Args:
+        days: Начала суток (day_start) новых коммитов и строк, измененных загрузкой
+        modules: Модули файлов (по умолчанию все файлы в UNKNOWN_MODULE)
+    """
+    watermark = _rollup_watermark(connection)
+    if watermark is None:
+        days = None
+    else:
+        days = set(days)
+        days.update(day for day, in connection.execute(
+            f"SELECT DISTINCT {DAY_SQL} FROM commits WHERE id > ? AND commit_time IS NOT NULL", (watermark,)))
+        if not days:
+            return
+    _refresh_in_transaction(connection, days, modules)
+
+
+@PROFILER.profiled("sqlite.churn")
+def rebuild_rollups(connection: sqlite3.Connection, modules: Optional[ModuleMapper] = None) -> None:
+    """Строит сводки заново по всей истории (например, после изменения modules.csv)"""
+    _refresh_in_transaction(connection, None, modules)
+    logging.info("Сводки изменений перестроены")
+
+
+def _refresh_in_transaction(connection: sqlite3.Connection, days: Optional[Set[int]],
+                            modules: Optional[ModuleMapper]) -> None:
+    try:
+        _refresh(connection, days, modules or ModuleMapper())
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        for table in _TEMP_TABLES:
+            connection.execute(f"DROP TABLE IF EXISTS temp.{table}")
+
+
+def _period(column: str, since=None, until=None, start=day_start) -> Tuple[str, List[int]]:
+    """
+    Условие SQL для периода сводки
+
+    Границы округляются до начала суток (недели), в которые они попадают:
+    сводка за неполные сутки или неделю берется целиком.
+    """
+    condition = ""
+    params = []
+    if since:
+        condition += f" AND {column} >= ?"
+        params.append(start(since))
+    if until:
+        condition += f" AND {column} <= ?"
+        params.append(start(until))
+    return condition, params
+
+
+def file_churn(connection: sqlite3.Connection, since=None, until=None, repository=None,
+               limit: Optional[int] = None) -> List[Tuple[str, str, int, int, int]]:
+    """
+    Изменения файлов за период, самые изменяемые первыми
+
+    Returns:
+        Список (репозиторий, путь, добавлено строк, удалено строк, коммитов)
+    """
+    period, params = _period("churn_file_day.day", since, until)
+    repository_filter, repository_params = history_db.repository_filter(repository, "files.repo_id")
+    query = f"""
+        SELECT repositories.name, files.path, SUM(churn_file_day.added), SUM(churn_file_day.deleted),
+               SUM(churn_file_day.commits)
+        FROM churn_file_day
+        JOIN files ON files.id = churn_file_day.file_id
+        LEFT JOIN repositories ON repositories.id = files.repo_id
+        WHERE 1 = 1 {period} {repository_filter}
+        GROUP BY churn_file_day.file_id
+        ORDER BY SUM(churn_file_day.added) + SUM(churn_file_day.deleted) DESC
+    """
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return connection.execute(query, params + repository_params).fetchall()
+
+
+def module_churn(connection: sqlite3.Connection, since=None, until=None, repository=None,
+                 by_day: bool = False) -> List[Tuple]:
+    """
+    Изменения модулей за период
+
+    Returns:
+        Список (модуль, добавлено строк, удалено строк, коммитов) по убыванию
+        изменений; с by_day=True - (день, модуль, добавлено, удалено, коммитов)
+        по дням. Коммит, затронувший модуль в нескольких репозиториях,
+        считается в каждом из них
+    """
+    period, params = _period("day", since, until)
+    repository_filter, repository_params = history_db.repository_filter(repository, "repo_id")
+    if by_day:
+        query = f"""
+            SELECT day, module, SUM(added), SUM(deleted), SUM(commits)
+            FROM churn_module_day
+            WHERE 1 = 1 {period} {repository_filter}
+            GROUP BY day, module
+            ORDER BY day, module
+        """
+    else:
+        query = f"""
+            SELECT module, SUM(added), SUM(deleted), SUM(commits)
+            FROM churn_module_day
+            WHERE 1 = 1 {period} {repository_filter}
+            GROUP BY module
+            ORDER BY SUM(added) + SUM(deleted) DESC
+        """
+    return connection.execute(query, params + repository_params).fetchall()
+
+
+def author_module_churn(connection: sqlite3.Connection, since=None, until=None, repository=None,
+                        by_week: bool = False) -> List[Tuple]:
+    """
+    Изменения авторов по модулям за период (границы округляются до недель)
+
+    Returns:
+        Список (автор, email, команда, модуль, добавлено строк, удалено строк, коммитов);
+        с by_week=True перед автором идет начало недели
+    """
+    period, params = _period("churn_author_module_week.week", since, until, week_start)
+    repository_filter, repository_params = history_db.repository_filter(repository,
+                                                                        "churn_author_module_week.repo_id")
+    week = "churn_author_module_week.week, " if by_week else ""
+    query = f"""
+        SELECT {week}authors.name, authors.email, authors.team, churn_author_module_week.module,
+               SUM(churn_author_module_week.added), SUM(churn_author_module_week.deleted),
+               SUM(churn_author_module_week.commits)
+        FROM churn_author_module_week
+        LEFT JOIN authors ON authors.id = churn_author_module_week.author_id
+        WHERE 1 = 1 {period} {repository_filter}
+        GROUP BY {week}churn_author_module_week.author_id, churn_author_module_week.module
+        ORDER BY {week}SUM(churn_author_module_week.added) + SUM(churn_author_module_week.deleted) DESC
+    """
+    return connection.execute(query, params + repository_params).fetchall()
@@ -1,94 +1,335 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Dict, List, Set, Optional
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 import json
+import mmap
+import re
 import logging
 
 from project import Project
 from module import Module
 from file_info import FileInfo
+from path_table import RelativePathDecoder
+from visitors import RELATIVE_PATH_ENCODING
+from profiling import PROFILER
+
+# Лексемы для структурного прохода по JSON без построения объектов
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_SCALAR = re.compile(rb"[^,\]}\s]+")
+# Все, кроме скобок вне строк: контейнер пропускается прыжками от скобки к скобке
+_CONTAINER_BODY = re.compile(rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*', re.DOTALL)
+
+
+class _JsonScanner:
+    """
+    Структурный проход по JSON-документу без построения объектов.
+
+    Позволяет перебрать ключи объекта и элементы массива, а значения, которые
+    не нужны сразу, пропустить, запомнив их границы в файле.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def _error(self, message: str, pos: int) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, "", pos)
+
+    def skip_whitespace(self, pos: int) -> int:
+        return _WHITESPACE.match(self.buffer, pos).end()
+
+    def _expect(self, pos: int, token: bytes) -> int:
+        pos = self.skip_whitespace(pos)
+        if self.buffer[pos:pos + 1] != token:
+            raise self._error(f"Ожидался символ {token.decode()}", pos)
+        return pos + 1
+
+    def skip_value(self, pos: int) -> int:
+        """Пропускает значение, начинающееся с pos; возвращает позицию после него"""
+        buffer = self.buffer
+        pos = self.skip_whitespace(pos)
+        c = buffer[pos:pos + 1]
+        if c == b'"':
+            match = _STRING.match(buffer, pos)
+            if match is None:
+                raise self._error("Незакрытая строка", pos)
+            return match.end()
+        if c not in (b"{", b"["):
+            match = _SCALAR.match(buffer, pos)
+            if match is None:
+                raise self._error("Ожидалось значение", pos)
+            return match.end()
+        depth = 0
+        while True:
+            c = buffer[pos:pos + 1]
+            if not c:
+                raise self._error("Неожиданный конец документа", pos)
+            if c in (b"{", b"["):
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return pos + 1
+            pos = _CONTAINER_BODY.match(buffer, pos + 1).end()
+
+    def load_value(self, pos: int) -> Tuple[object, int]:
+        """Разбирает значение, начинающееся с pos; возвращает его и позицию после него"""
+        start = self.skip_whitespace(pos)
+        end = self.skip_value(start)
+        return json.loads(self.buffer[start:end]), end
+
+    def parse_object(self, pos: int, on_value: Callable[[str, int], int]) -> int:
+        """
+        Перебирает ключи объекта
+
+        Args:
+            pos: Позиция начала объекта
+            on_value: Обработчик (ключ, позиция значения) -> позиция после значения
+
+        Returns:
+            int: Позиция после объекта
+        """
+        buffer = self.buffer
+        pos = self.skip_whitespace(self._expect(pos, b"{"))
+        if buffer[pos:pos + 1] == b"}":
+            return pos + 1
+        while True:
+            pos = self.skip_whitespace(pos)
+            match = _STRING.match(buffer, pos)
+            if match is None:
+                raise self._error("Ожидался ключ объекта", pos)
+            key = json.loads(match.group())
+            pos = on_value(key, self._expect(match.end(), b":"))
+            pos = self.skip_whitespace(pos)
+            c = buffer[pos:pos + 1]
+            if c == b"}":
+                return pos + 1
+            if c != b",":
+                raise self._error("Ожидался символ , или }", pos)
+            pos += 1
+
+    def parse_array(self, pos: int, on_item: Callable[[int], int]) -> int:
+        """
+        Перебирает элементы массива
+
+        Args:
+            pos: Позиция начала массива
+            on_item: Обработчик (позиция элемента) -> позиция после элемента
+
+        Returns:
+            int: Позиция после массива
+        """
+        buffer = self.buffer
+        pos = self.skip_whitespace(self._expect(pos, b"["))
+        if buffer[pos:pos + 1] == b"]":
+            return pos + 1
+        while True:
+            pos = self.skip_whitespace(on_item(pos))
+            c = buffer[pos:pos + 1]
+            if c == b"]":
+                return pos + 1
+            if c != b",":
+                raise self._error("Ожидался символ , или ]", pos)
+            pos += 1
+
+
+class LazyModule(Module):
+    """
+    Модуль, файлы которого загружаются из JSON при первом обращении к files
+    """
+
+    _files_loader: Optional[Callable[[], Dict[str, FileInfo]]] = None
+
+    @property
+    def files(self) -> Dict[str, FileInfo]:
+        if self._files_loader is not None:
+            loader = self._files_loader
+            self._files_loader = None
+            self._files = loader()
+        return self._files
+
+    @files.setter
+    def files(self, value: Dict[str, FileInfo]) -> None:
+        self._files_loader = None
+        self._files = value
+
+    @property
+    def files_loaded(self) -> bool:
+        """Загружены ли уже файлы модуля"""
+        return self._files_loader is None
 
 
 class JsonDeserializer:
     """Класс для десериализации JSON в объекты Project"""
 
     @staticmethod
-    def deserialize_file_info(data: Dict[str, List[str]]) -> Dict[str, FileInfo]:
+    def deserialize_file_info(data: Dict[str, list],
+                              decoder: Optional[RelativePathDecoder] = None) -> Dict[str, FileInfo]:
         """
         Десериализует информацию о файлах из JSON
         
         Args:
             data: Словарь {имя_файла: список_путей}
+            decoder: Декодер путей для path_encoding = "relative"
             
         Returns:
             Dict[str, FileInfo]: Словарь {имя: информация о файле}
         """
-        logging.debug(f"Начало десериализации информации о файлах. Количество файлов: {len(data)}")
+        if decoder is None:
+            return {name: FileInfo(name, paths) for name, paths in data.items()}
         result = {}
-        for name, paths in data.items():
-            file_info = FileInfo(name=name)
-            for path in paths:
-                file_info.add_path(Path(path))
-                logging.debug(f"Добавлен путь {path} для файла {name}")
-            result[name] = file_info
-        logging.debug(f"Завершена десериализация информации о файлах. Обработано файлов: {len(result)}")
+        for name, entries in data.items():
+            file_info = result[name] = FileInfo(name)
+            for entry in entries:
+                file_info.add_ref(decoder.decode(entry, name))
         return result
 
+    @staticmethod
+    def _path_decoder(data: dict) -> Optional[RelativePathDecoder]:
+        """Декодер путей по полям проекта, если пути закодированы"""
+        encoding = data.get("path_encoding")
+        if encoding is None:
+            return None
+        if encoding != RELATIVE_PATH_ENCODING:
+            raise ValueError(f"Неизвестная кодировка путей: {encoding}")
+        # path_root - абсолютный корень кодирования; в файлах без него берется root_directory
+        root = data.get("path_root") or data.get("root_directory", "")
+        return RelativePathDecoder(root, data.get("directories", []))
+
     @classmethod
-    def deserialize_module(cls, data: dict) -> Module:
+    def deserialize_module(cls, data: dict, decoder: Optional[RelativePathDecoder] = None) -> Module:
         """
         Десериализует модуль из JSON
         
         Args:
             data: Словарь с данными модуля
+            decoder: Декодер путей для path_encoding = "relative"
             
         Returns:
             Module: Объект модуля
         """
-        module_name = data.get("name", "Unnamed Module")
-        logging.debug(f"Начало десериализации модуля: {module_name}")
-        
-        # Создаем множество путей
-        paths = set(data.get("paths", []))
-        logging.debug(f"Модуль {module_name}: найдено {len(paths)} путей")
-        
-        # Десериализуем подмодули, если они есть
-        submodules = []
-        if "submodules" in data:
-            logging.debug(f"Суб Модуль {module_name}: начало десериализации подмодулей")
-            submodules = [cls.deserialize_module(submodule) for submodule in data["submodules"]]
-            logging.debug(f"Суб Модуль {module_name}: десериализовано {len(submodules)} подмодулей")
-        
-        # Десериализуем файлы
-        logging.debug(f"Модуль {module_name}: начало десериализации файлов")
-        files = cls.deserialize_file_info(data.get("files", {}))
-        logging.debug(f"Модуль {module_name}: десериализовано {len(files)} файлов")
-        
-        # Создаем модуль
-        module = Module(
-            name=module_name,
-            paths=paths,
+        submodules = [cls.deserialize_module(submodule, decoder) for submodule in data.get("submodules", [])]
+        return Module(
+            name=data.get("name", "Unnamed Module"),
+            paths=set(data.get("paths", [])),
             owners=data.get("owners"),
             description=data.get("description"),
             submodules=submodules,
-            files=files
+            files=cls.deserialize_file_info(data.get("files", {}), decoder),
+            exclude=data.get("exclude")
         )
-        
-        owners = data.get("owners", [])
-        if owners:
-            logging.debug(f"Модуль {module_name}: владельцы: {', '.join(owners)}")
-        
-        logging.debug(f"Завершена десериализация модуля {module_name}")
-        return module
+
+    @staticmethod
+    def _read_span(json_path: Path, start: int, end: int) -> dict:
+        """Читает из файла и разбирает только указанный фрагмент документа"""
+        with open(json_path, "rb") as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    @classmethod
+    def _read_lazy_module(cls, scanner: _JsonScanner, pos: int,
+                          load_files: Callable[[int, int], Dict[str, FileInfo]],
+                          modules: List[Module]) -> int:
+        """
+        Читает модуль структурным проходом; files запоминаются границами в файле
+
+        Returns:
+            int: Позиция после объекта модуля
+        """
+        data = {}
+        submodules: List[Module] = []
+        files_span: Optional[Tuple[int, int]] = None
+
+        def on_value(key: str, pos: int) -> int:
+            nonlocal files_span
+            if key == "files":
+                start = scanner.skip_whitespace(pos)
+                end = scanner.skip_value(start)
+                files_span = (start, end)
+                return end
+            if key == "submodules":
+                return scanner.parse_array(
+                    pos, lambda item: cls._read_lazy_module(scanner, item, load_files, submodules))
+            data[key], end = scanner.load_value(pos)
+            return end
+
+        end = scanner.parse_object(pos, on_value)
+        module = LazyModule(
+            name=data.get("name", "Unnamed Module"),
+            paths=set(data.get("paths", [])),
+            owners=data.get("owners"),
+            description=data.get("description"),
+            submodules=submodules,
+            files={},
+            exclude=data.get("exclude")
+        )
+        if files_span is not None:
+            module._files_loader = partial(load_files, *files_span)
+        modules.append(module)
+        return end
+
+    @classmethod
+    def _deserialize_lazy(cls, json_path: Path) -> Project:
+        """Строит дерево модулей, не загружая файлы модулей"""
+        with open(json_path, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            scanner = _JsonScanner(buffer)
+            data = {}
+            modules: List[Module] = []
+            decoder: Optional[RelativePathDecoder] = None
+
+            # Таблица директорий может идти после modules, поэтому декодер
+            # берется в момент загрузки файлов, а не при чтении дерева
+            def load_files(start: int, end: int) -> Dict[str, FileInfo]:
+                with PROFILER.span("deserialize.lazy_files"):
+                    return cls.deserialize_file_info(cls._read_span(json_path, start, end), decoder)
+
+            def on_value(key: str, pos: int) -> int:
+                if key == "modules":
+                    return scanner.parse_array(
+                        pos, lambda item: cls._read_lazy_module(scanner, item, load_files, modules))
+                data[key], end = scanner.load_value(pos)
+                return end
+
+            scanner.parse_object(0, on_value)
+            decoder = cls._path_decoder(data)
+
+        project = Project(
+            name=data.get("name", "Unnamed Project"),
+            root_directory=data.get("root_directory", ""),
+            modules=[]
+        )
+        for module in modules:
+            project.add_module(module)
+        return project
 
     @classmethod
-    def deserialize(cls, json_path: str | Path) -> Project:
+    def _deserialize_eager(cls, json_path: Path) -> Project:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        project = Project(
+            name=data.get("name", "Unnamed Project"),
+            root_directory=data.get("root_directory", ""),
+            modules=[]
+        )
+        decoder = cls._path_decoder(data)
+        for module_data in data.get("modules", []):
+            project.add_module(cls.deserialize_module(module_data, decoder))
+        return project
+
+    @classmethod
+    def deserialize(cls, json_path: str | Path, lazy: bool = False) -> Project:
         """
         Десериализует проект из JSON файла
         
         Args:
             json_path: Путь к JSON файлу
+            lazy: Загружать файлы модулей только при первом обращении к module.files.
+                Документ не читается в память целиком: дерево модулей строится
+                структурным проходом по файлу, а объект files каждого модуля
+                читается из файла отдельно по запомненным границам.
             
         Returns:
             Project: Объект проекта
@@ -97,46 +338,20 @@ class JsonDeserializer:
         
         json_path = Path(json_path)
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logging.debug(f"Размер загруженного JSON: {len(str(data))} байт")
+            with PROFILER.span("deserialize"):
+                project = cls._deserialize_lazy(json_path) if lazy else cls._deserialize_eager(json_path)
         except FileNotFoundError:
             logging.error(f"Файл {json_path} не найден")
             raise
         except json.JSONDecodeError as e:
             logging.error(f"Ошибка при разборе JSON: {e}")
             raise
-            
-        logging.info("JSON файл успешно загружен")
-        
-        try:
-            # Создаем проект
-            project_name = data.get("name", "Unnamed Project")
-            root_directory = data.get("root_directory", "")
-            logging.debug(f"Создание проекта: {project_name}, корневая директория: {root_directory}")
-            
-            project = Project(
-                name=project_name,
-                root_directory=root_directory,
-                modules=[]
-            )
-            
-            # Десериализуем модули
-            modules_data = data.get("modules", [])
-            logging.info(f"Начало десериализации {len(modules_data)} модулей")
-            
-            for i, module_data in enumerate(modules_data, 1):
-                logging.debug(f"Десериализация модуля {i}/{len(modules_data)}")
-                module = cls.deserialize_module(module_data)
-                project.add_module(module)
-                logging.debug(f"Десериализован модуль {module.name} с {len(module.files)} файлами и {len(module.submodules or [])} подмодулями")
-            
-            logging.info(f"Проект {project.name} успешно десериализован с {len(project.modules)} модулями")
-            return project
-            
         except KeyError as e:
             logging.error(f"Отсутствует обязательное поле в JSON: {e}")
             raise
         except Exception as e:
             logging.error(f"Ошибка при десериализации: {e}")
-            raise 
\ No newline at end of file
+            raise
+
+        logging.info(f"Проект {project.name} успешно десериализован с {len(project.modules)} модулями")
+        return project
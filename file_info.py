@@ -1,33 +1,112 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
-from typing import Set
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional
 from pathlib import Path
 
+from path_table import PATH_TABLE, PathTable
+
+
+class FilePaths:
+    """Представление путей FileInfo; объекты Path создаются при итерации"""
+
+    __slots__ = ("_refs", "_table")
+
+    def __init__(self, refs: array, table: PathTable):
+        self._refs = refs
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def __iter__(self) -> Iterator[Path]:
+        to_path = self._table.to_path
+        return (to_path(ref) for ref in self._refs)
+
+    def __contains__(self, path: object) -> bool:
+        if not isinstance(path, (str, Path)):
+            return False
+        ref = self._table.lookup(path)
+        return ref is not None and _contains(self._refs, ref)
+
+    def strings(self) -> Iterator[str]:
+        """Пути строками, без создания объектов Path"""
+        to_str = self._table.to_str
+        return (to_str(ref) for ref in self._refs)
+
+
+def _contains(refs: array, ref: int) -> bool:
+    index = bisect_left(refs, ref)
+    return index < len(refs) and refs[index] == ref
+
 
-@dataclass
 class FileInfo:
-    """Информация о файле"""
-    name: str                  # Имя файла без расширения
-    paths: Set[Path] = field(default_factory=set)  # Множество путей к файлам с этим именем
-    
+    """
+    Информация о файле
+
+    Пути хранятся отсортированным массивом идентификаторов из общей
+    таблицы путей (PATH_TABLE), а не множеством объектов Path.
+    """
+
+    __slots__ = ("name", "refs")
+
+    def __init__(self, name: str, paths: Optional[Iterable[str | Path]] = None):
+        self.name = name            # Имя файла
+        self.refs = array("Q")      # Отсортированные идентификаторы путей к файлам с этим именем
+        for path in paths or ():
+            self.add_path(path)
+
     @classmethod
     def from_path(cls, path: Path) -> FileInfo:
         """Создает объект FileInfo из пути к файлу"""
-        return cls(
-            name=path.stem,
-            paths={path}
-        )
-    
-    def add_path(self, path: Path) -> None:
+        return cls(name=path.stem, paths=[path])
+
+    @property
+    def paths(self) -> FilePaths:
+        """Множество путей к файлам с этим именем (объекты Path создаются по запросу)"""
+        return FilePaths(self.refs, PATH_TABLE)
+
+    def add_path(self, path: str | Path) -> None:
         """Добавляет путь к файлу с тем же именем"""
-        self.paths.add(path)
-    
+        self.add_ref(PATH_TABLE.intern(path))
+
+    def add_ref(self, ref: int) -> None:
+        """Добавляет путь по идентификатору из таблицы путей"""
+        refs = self.refs
+        # Пути обычно приходят по порядку, поэтому сначала проверяем конец массива
+        if not refs or refs[-1] < ref:
+            refs.append(ref)
+            return
+        index = bisect_left(refs, ref)
+        if index == len(refs) or refs[index] != ref:
+            refs.insert(index, ref)
+
+    def copy(self) -> FileInfo:
+        """Создает независимую копию"""
+        result = FileInfo(self.name)
+        result.refs = array("Q", self.refs)
+        return result
+
+    def contains_all(self, other: FileInfo) -> bool:
+        """Содержит ли этот FileInfo все пути other"""
+        return all(_contains(self.refs, ref) for ref in other.refs)
+
+    def merge(self, other: FileInfo) -> None:
+        """Добавляет пути other"""
+        if not other.refs:
+            return
+        merged = sorted(set(self.refs).union(other.refs))
+        self.refs = array("Q", merged)
+
+    def __repr__(self) -> str:
+        return f"FileInfo(name={self.name!r}, paths={sorted(self.paths.strings())!r})"
+
     def __hash__(self) -> int:
         """Хеш для использования в множествах"""
         return hash(self.name)
-    
+
     def __eq__(self, other: object) -> bool:
         """Сравнение для использования в множествах"""
         if not isinstance(other, FileInfo):
             return NotImplemented
-        return self.name == other.name 
\ No newline at end of file
+        return self.name == other.name
@@ -9,16 +9,19 @@ from pathlib import Path
 import random
 
 from deserializer import JsonDeserializer
+from profiling import PROFILER, add_profile_argument, profile_session
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('graph_generation.log'),
-        logging.StreamHandler()
-    ]
-)
+
+def configure_logging() -> None:
+    """Настройка логирования (вызывается из main, а не при импорте модуля)"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('graph_generation.log'),
+            logging.StreamHandler()
+        ]
+    )
 
 def generate_new_color(index, is_submodule=False):
     """Генерирует уникальный цвет для модулей."""
@@ -60,7 +63,7 @@ def process_module_hierarchy(module, hierarchy):
     
     # Обрабатываем текущий уровень
     files = {
-        file.name: str(next(iter(file.paths)))
+        file.name: next(file.paths.strings())
         for file in module.files.values()
         if file.paths and any(
             file.name.startswith(current_level['full_path'])
@@ -82,6 +85,7 @@ def process_module_hierarchy(module, hierarchy):
         "submodules": submodules
     }
 
+@PROFILER.profiled("graph.edges")
 def generate_file_graph(modules):
     """Генерирует граф на основе файлов."""
     graph_data = {
@@ -104,7 +108,7 @@ def generate_file_graph(modules):
                 if not file.paths:
                     continue
                     
-                file_path = str(next(iter(file.paths)))
+                file_path = next(file.paths.strings())
                 if file_path not in all_files:
                     # Определяем тип файла по расширению
                     ext = os.path.splitext(file_path)[1].lower()
@@ -188,6 +192,7 @@ def generate_file_graph(modules):
     
     return graph_data
 
+@PROFILER.profiled("html.render")
 def generate_html_with_improvements(graph_data, template_path, output_path):
     """Генерирует HTML файл с визуализацией на основе шаблона и данных."""
     with open(template_path, "r", encoding="utf-8") as file:
@@ -399,7 +404,7 @@ def main():
     
     # Загружаем данные о модулях
     try:
-        project = JsonDeserializer.deserialize("result.json")
+        project = JsonDeserializer.deserialize("result.json", lazy=True)
         logging.info(f"Loaded project with {len(project.modules)} modules")
         
         # Группируем модули по иерархии
@@ -432,4 +437,12 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Генерация графа файлов модулей.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    configure_logging()
+    with profile_session(args.profile):
+        main() 
\ No newline at end of file
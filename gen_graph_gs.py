@@ -7,7 +7,10 @@ import subprocess
 from collections import Counter
 from datetime import datetime, timedelta
 import re
-from deserializer import JsonDeserializer
+from snapshot import load_project_snapshot
+import history_db
+from path_index import PathTrie
+from profiling import PROFILER, add_profile_argument, profile_session
 
 def generate_new_color(index):
     """Генерирует уникальный цвет для верхнеуровневых модулей."""
@@ -62,9 +65,24 @@ def load_modules(file_path):
     return module_colors
 
 
+def build_path_trie(paths):
+    """
+    Строит префиксное дерево, в котором каждый путь указывает сам на себя.
+
+    Префиксы сравниваются по сегментам пути, а не по строке: папка "src/core"
+    содержит "src/core/a.py", но не "src/core2/a.py".
+    """
+    trie = PathTrie()
+    for path in paths:
+        trie.insert(path, path)
+    return trie
+
+
 def is_file_in_folders(file_path, folders):
-    """Проверяет, принадлежит ли файл одной из папок."""
-    return any(file_path.startswith(folder) for folder in folders)
+    """Проверяет, принадлежит ли файл одной из папок (folders - список или PathTrie)."""
+    if not isinstance(folders, PathTrie):
+        folders = build_path_trie(folders)
+    return folders.has_prefix(file_path)
 
 
 def get_repository_url():
@@ -114,39 +132,56 @@ def parse_datetime(date_str):
             return datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
 
 
-def query_graph_data_new(database, since, until):
-    """Запрашивает данные для графа из базы данных."""
-    # Формируем условия для фильтрации по времени
-    time_conditions = []
-    if since:
-        time_conditions.append(f"commit_date >= '{since}'")
-    if until:
-        time_conditions.append(f"commit_date <= '{until}'")
-    
-    # Объединяем условия в SQL
-    time_filter = " AND ".join(time_conditions) if time_conditions else ""
+def commit_conditions(since=None, until=None, repository=None):
+    """Условие SQL и параметры для коммитов: окно по времени (по индексу commits.commit_time) и репозиторий"""
+    time_filter, time_params = history_db.time_window(since, until)
+    repository_filter, repository_params = history_db.repository_filter(repository)
+    return time_filter + repository_filter, time_params + repository_params
+
 
-    conn = sqlite3.connect(database)
+def file_path_sql(conn, repository=None):
+    """
+    Выражение SQL для пути файла в графе
+
+    Если в базе несколько репозиториев и репозиторий не выбран, путь
+    начинается с имени репозитория, чтобы одинаковые пути разных
+    репозиториев были разными узлами.
+    """
+    if repository or conn.execute("SELECT COUNT(*) FROM repositories").fetchone()[0] <= 1:
+        return "files.path"
+    return "(SELECT name FROM repositories WHERE repositories.id = files.repo_id) || '/' || files.path"
+
+
+def query_graph_data_new(database, since, until, repository=None):
+    """Запрашивает данные для графа из базы данных."""
+    laps = PROFILER.laps()
+    conn = history_db.connect(database)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
+    commit_filter, commit_params = commit_conditions(since, until, repository)
 
     # Запрашиваем все коммиты и файлы с учетом фильтра по времени
     cursor.execute(f"""
-        SELECT commit_id, filename
-        FROM commit_files
-        JOIN commits ON commit_files.commit_id = commits.id
-        WHERE 1 = 1 {f"AND {time_filter}" if time_filter else ""}
-    """)
+        SELECT commits.id AS commit_key, commits.hash AS commit_id, {file_path_sql(conn, repository)} AS filename
+        FROM commits
+        JOIN commit_files ON commit_files.commit_id = commits.id
+        JOIN files ON files.id = commit_files.file_id
+        WHERE 1 = 1 {commit_filter}
+    """, commit_params)
 
     rows = cursor.fetchall()
+    laps.lap("graph.query")
 
     file_map = {}
     edges = {}
 
     commit_files_map = {}
+    commit_hashes = {}
     for row in rows:
-        # Сокращаем хеш коммита до 15 символов
-        commit_id = row["commit_id"][:15]
+        # Коммиты группируются по ключу строки: один хеш может быть
+        # в нескольких репозиториях (форки). Хеш сокращаем до 15 символов
+        commit_id = row["commit_key"]
+        commit_hashes[commit_id] = row["commit_id"][:15]
         filename = row["filename"]
 
         if commit_id not in commit_files_map:
@@ -193,7 +228,7 @@ def query_graph_data_new(database, since, until):
                 }
 
             # Добавляем текущий сокращённый commit_id в список коммитов файла
-            file_map[file]["commits"].append(commit_id)
+            file_map[file]["commits"].append(commit_hashes[commit_id])
 
     for commit_id, files in commit_files_map.items():
         if commit_id not in commits_with_matching_files:
@@ -226,6 +261,7 @@ def query_graph_data_new(database, since, until):
                 module_commit_impact[file_a] *= 0.8
                 module_commit_impact[file_b] *= 0.8
 
+    laps.lap("graph.edges")
     conn.close()
 
     nodes = []
@@ -235,28 +271,23 @@ def query_graph_data_new(database, since, until):
     links = [edge for edge in edges.values() if edge["weight"] >= connection_threshold]
 
     # Извлечем все commit_ids и их время
-    conn = sqlite3.connect(database)
+    conn = history_db.connect(database)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     cursor.execute(f"""
-            SELECT id, commit_date, author_name, summary
+            SELECT commits.hash AS id, commits.commit_time, authors.name AS author_name, commits.summary
             FROM commits
-            WHERE 1 = 1 {f"AND {time_filter}" if time_conditions else ""}
-        """)
+            LEFT JOIN authors ON authors.id = commits.author_id
+            WHERE commits.commit_time IS NOT NULL {commit_filter}
+        """, commit_params)
     commit_rows = cursor.fetchall()
 
     commit_times = []
     teams_data = {}  # Собираем команды во временный словарь
 
     for row in commit_rows:
-        commit_date = row["commit_date"]
         author_name = row["author_name"]
-
-        try:
-            commit_time = parse_datetime(commit_date)
-            commit_times.append(commit_time)
-        except ValueError:
-            continue
+        commit_times.append(row["commit_time"])
 
         # Инициализируем команду, если её ещё нет
         team_name = "Unknown"
@@ -285,8 +316,7 @@ def query_graph_data_new(database, since, until):
         start_opacity = 0.3
         # Нормализуем время в диапазон [0.1, 1]
         def normalize_time(commit_time):
-            normalized = (commit_time - first_commit_time).total_seconds() / (
-                    last_commit_time - first_commit_time).total_seconds()
+            normalized = (commit_time - first_commit_time) / (last_commit_time - first_commit_time)
             return start_opacity + (normalized * (1.0 - start_opacity))
 
         for node in nodes:
@@ -295,7 +325,7 @@ def query_graph_data_new(database, since, until):
                 filtered_rows = [row for row in commit_rows if row["id"][:15] in node["commits"]]
 
                 latest_commit_time = max(
-                    parse_datetime(row["commit_date"])
+                    row["commit_time"]
                     for row in commit_rows if row["id"][:15] in node["commits"]
                 )
                 author_commit_counts = Counter(row["author_name"] for row in filtered_rows)
@@ -334,7 +364,7 @@ def query_graph_data_new(database, since, until):
             if common_commits:
                 # Выбираем последнее время из общего набора
                 latest_common_commit_time = max(
-                    parse_datetime(row["commit_date"])
+                    row["commit_time"]
                     for row in commit_rows if row["id"][:15] in common_commits
                 )
 
@@ -361,22 +391,21 @@ def query_graph_data_new(database, since, until):
     commit_time_map = {}
     for row in commit_rows:
         commit_id = row["id"][:15]  # Урезаем commit_id до 15 символов
-        try:
-            # Конвертируем `commit_date` в объект datetime
-            commit_time = parse_datetime(row["commit_date"])
-            commit_time_map[commit_id] = commit_time
-        except ValueError:
-            # Если есть ошибки в формате времени, просто пропускаем
-            continue
+        # Время коммита в секундах Unix
+        commit_time_map[commit_id] = row["commit_time"]
 
     # Сортируем коммиты в каждом узле на основании commit_time_map
     for node in nodes:
         if node["commits"]:
             node["commits"].sort(
-                key=lambda commit: commit_time_map.get(commit["id"], datetime.min),
+                key=lambda commit: commit_time_map.get(commit["id"], 0),
                 reverse=True  # Сортировка от самого нового к старому
             )
 
+    laps.lap("graph.enrich")
+    PROFILER.count("graph.nodes", len(nodes))
+    PROFILER.count("graph.links", len(links))
+
     return {
         "nodes": nodes,
         "links": links,
@@ -387,59 +416,66 @@ def query_graph_data_new(database, since, until):
 
 
 def query_graph_data(database, connection_threshold=1, max_files_per_commit=21, folders=None,
-                     modules_file='modules.csv', repository_url="None", since=None, until=None, team_filter=None):
+                     modules_file='modules.csv', repository_url="None", since=None, until=None, team_filter=None,
+                     repository=None):
 
+    laps = PROFILER.laps()
     # Загрузка цветов модулей
     module_colors = load_modules(modules_file)
+    # Поиск модуля файла по самому длинному префиксу за O(глубина пути)
+    module_trie = build_path_trie(module_colors.keys())
+    folders_trie = build_path_trie(folders) if folders else None
 
-    # Формируем условия для фильтрации по времени
-    time_conditions = []
-    if since:
-        time_conditions.append(f"author_when >= '{since}'")
-    if until:
-        time_conditions.append(f"author_when <= '{until}'")
     # Если указана команда, добавляем соответствующее условие
     team_condition = ""
+    team_params = []
     if team_filter:
-        team_condition = f"AND author_team = '{team_filter}'"
+        team_condition = "AND commits.author_team = ?"
+        team_params = [team_filter]
 
     team_name = team_filter
-    # Объединяем условия в SQL
-    time_filter = " AND ".join(time_conditions)
 
-    conn = sqlite3.connect(database)
+    conn = history_db.connect(database)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
+    commit_filter, commit_params = commit_conditions(since, until, repository)
+    file_path = file_path_sql(conn, repository)
 
     # Включаем фильтрацию времени в запрос
     cursor.execute(f"""
-        SELECT commit_id, filename
-        FROM commit_files
-        JOIN commits ON commit_files.commit_id = commits.id
-        WHERE 1 = 1 {f"AND {time_filter}" if time_conditions else ""} {team_condition}
-    """)
+        SELECT {file_path} AS filename
+        FROM commits
+        JOIN commit_files ON commit_files.commit_id = commits.id
+        JOIN files ON files.id = commit_files.file_id
+        WHERE 1 = 1 {commit_filter} {team_condition}
+    """, commit_params + team_params)
 
     team_files = {row["filename"] for row in cursor.fetchall()}
     # Берём все коммиты и файлы без дополнительной фильтрации по команде
     cursor.execute(f"""
-        SELECT commit_id, filename
-        FROM commit_files
-        JOIN commits ON commit_files.commit_id = commits.id
-        WHERE 1 = 1 {f"AND {time_filter}" if time_filter else ""}
-    """)
+        SELECT commits.id AS commit_key, commits.hash AS commit_id, {file_path} AS filename
+        FROM commits
+        JOIN commit_files ON commit_files.commit_id = commits.id
+        JOIN files ON files.id = commit_files.file_id
+        WHERE 1 = 1 {commit_filter}
+    """, commit_params)
 
     if not team_files and team_filter:
         print(f"Нет коммитов команды {team_name}")
         return
     rows = cursor.fetchall()
+    laps.lap("graph.query")
 
     file_map = {}
     edges = {}
 
     commit_files_map = {}
+    commit_hashes = {}
     for row in rows:
-        # Сокращаем хеш коммита до 15 символов
-        commit_id = row["commit_id"][:15]
+        # Коммиты группируются по ключу строки: один хеш может быть
+        # в нескольких репозиториях (форки). Хеш сокращаем до 15 символов
+        commit_id = row["commit_key"]
+        commit_hashes[commit_id] = row["commit_id"][:15]
         filename = row["filename"]
 
         if team_files and filename not in team_files:
@@ -453,7 +489,7 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
     if folders:
         commits_with_matching_files = {
             commit_id for commit_id, files in commit_files_map.items()
-            if any(is_file_in_folders(file, folders) for file in files)
+            if any(is_file_in_folders(file, folders_trie) for file in files)
         }
     else:
         commits_with_matching_files = set(commit_files_map.keys())
@@ -469,18 +505,14 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
 
         for file in files:
             # Определить модуль для файла
-            module_path = None
-            for mp in module_colors.keys():
-                if file.startswith(mp):
-                    if module_path is None or len(mp) > len(module_path):
-                        module_path = mp
+            module_path = module_trie.longest_prefix(file)
 
             # Если ничего не найдено, назначаем модуль "Unknown"
             if not module_path:
                 module_path = "Unknown"
 
             # Определение цвета файла
-            if folders and is_file_in_folders(file, folders):
+            if folders and is_file_in_folders(file, folders_trie):
                 node_color = "green"  # Цвет остаётся зелёным для файлов в папках `--folders`
                 module_name = "Current"  # Все файлы из переданных папок считаются модулем 'Current'
             else:
@@ -504,7 +536,7 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
                 }
 
             # Добавляем текущий сокращённый commit_id в список коммитов файла
-            file_map[file]["commits"].append(commit_id)
+            file_map[file]["commits"].append(commit_hashes[commit_id])
 
     for commit_id, files in commit_files_map.items():
         if commit_id not in commits_with_matching_files:
@@ -537,6 +569,7 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
                 module_commit_impact[file_a] *= 0.8
                 module_commit_impact[file_b] *= 0.8
 
+    laps.lap("graph.edges")
     conn.close()
 
     nodes = []
@@ -548,29 +581,25 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
     links = [edge for edge in edges.values() if edge["weight"] >= connection_threshold]
 
     # Извлечем все commit_ids и их время
-    conn = sqlite3.connect(database)
+    conn = history_db.connect(database)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     cursor.execute(f"""
-            SELECT id, author_when, author_name, author_team, summary
+            SELECT commits.hash AS id, commits.commit_time, authors.name AS author_name,
+                   commits.author_team, commits.summary
             FROM commits
-            WHERE 1 = 1 {f"AND {time_filter}" if time_conditions else ""}
-        """)
+            LEFT JOIN authors ON authors.id = commits.author_id
+            WHERE commits.commit_time IS NOT NULL {commit_filter}
+        """, commit_params)
     commit_rows = cursor.fetchall()
 
     commit_times = []
     teams_data = {}  # Собираем команды во временный словарь
 
     for row in commit_rows:
-        author_when = row["author_when"]
         team_name = row["author_team"]
         author_name = row["author_name"]
-
-        try:
-            commit_time = parse_datetime(author_when)
-            commit_times.append(commit_time)
-        except ValueError:
-            continue
+        commit_times.append(row["commit_time"])
 
         # Если команда не указана, заменяем на Unknown
         if not team_name:
@@ -602,8 +631,7 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
         start_opacity = 0.3
         # Нормализуем время в диапазон [0.1, 1]
         def normalize_time(commit_time):
-            normalized = (commit_time - first_commit_time).total_seconds() / (
-                    last_commit_time - first_commit_time).total_seconds()
+            normalized = (commit_time - first_commit_time) / (last_commit_time - first_commit_time)
             return start_opacity + (normalized * (1.0 - start_opacity))
 
         for node in nodes:
@@ -612,7 +640,7 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
                 filtered_rows = [row for row in commit_rows if row["id"][:15] in node["commits"]]
 
                 latest_commit_time = max(
-                    parse_datetime(row["author_when"])
+                    row["commit_time"]
                     for row in commit_rows if row["id"][:15] in node["commits"]
                 )
                 author_commit_counts = Counter(row["author_name"] for row in filtered_rows)
@@ -651,7 +679,7 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
             if common_commits:
                 # Выбираем последнее время из общего набора
                 latest_common_commit_time = max(
-                    parse_datetime(row["author_when"])
+                    row["commit_time"]
                     for row in commit_rows if row["id"][:15] in common_commits
                 )
 
@@ -689,22 +717,21 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
     commit_time_map = {}
     for row in commit_rows:
         commit_id = row["id"][:15]  # Урезаем commit_id до 15 символов
-        try:
-            # Конвертируем `author_when` в объект datetime
-            commit_time = parse_datetime(row["author_when"])
-            commit_time_map[commit_id] = commit_time
-        except ValueError:
-            # Если есть ошибки в формате времени, просто пропускаем
-            continue
+        # Время коммита в секундах Unix
+        commit_time_map[commit_id] = row["commit_time"]
 
     # Сортируем коммиты в каждом узле на основании commit_time_map
     for node in nodes:
         if node["commits"]:
             node["commits"].sort(
-                key=lambda commit: commit_time_map.get(commit["id"], datetime.min),
+                key=lambda commit: commit_time_map.get(commit["id"], 0),
                 reverse=True  # Сортировка от самого нового к старому
             )
 
+    laps.lap("graph.enrich")
+    PROFILER.count("graph.nodes", len(nodes))
+    PROFILER.count("graph.links", len(links))
+
     return {
         "nodes": nodes,
         "links": links,
@@ -714,6 +741,7 @@ def query_graph_data(database, connection_threshold=1, max_files_per_commit=21,
     }
 
 
+@PROFILER.profiled("html.render")
 def generate_html_with_improvements(graph_data, template_path, output_path):
     with open(template_path, "r", encoding="utf-8") as file:
         html_template = file.read()
@@ -769,14 +797,15 @@ def gen_report_new(
         connection_threshold,
         max_files_per_commit,
         until,
-        since):
+        since,
+        repository=None):
     
     # print(module)
     # print(output_file)
     print(since)
     print(until)    
 
-    graph_data = query_graph_data_new(database, until, since)
+    graph_data = query_graph_data_new(database, until, since, repository)
     generate_html_with_improvements(graph_data, template, output_html)
 
     # Преобразуем "человеческие" строки для `since` и `until` в объекты datetime
@@ -806,7 +835,7 @@ def gen_report_new(
 
 def gen_report(database="git_log.db", template="template.html", output_html="graph.html", connection_threshold=1,
          max_files_per_commit=21, folders=None, modules_file='modules.csv', repository_url=None,
-         since=None, until=None, team=None
+         since=None, until=None, team=None, repository=None
          ):
     # Преобразуем "человеческие" строки для `since` и `until` в объекты datetime
     if since:
@@ -830,7 +859,7 @@ def gen_report(database="git_log.db", template="template.html", output_html="gra
         repository_url = "Unknown"
 
     graph_data = query_graph_data(database, connection_threshold, max_files_per_commit, folders,
-                                  modules_file, repository_url, since, until, team)
+                                  modules_file, repository_url, since, until, team, repository)
     generate_html_with_improvements(graph_data, template, output_html)
 
 
@@ -857,6 +886,9 @@ if __name__ == "__main__":
 
     # args = parser.parse_args()
 
+    parser = argparse.ArgumentParser(description="Генерация интерактивного графа.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
 
     database="git_history.db"
     template="template_gs.html"
@@ -870,22 +902,28 @@ if __name__ == "__main__":
     since = "2025-04-12"
     until = "2025-04-01"
 
-    try:
-        project = JsonDeserializer.deserialize("result.json")
-        print(f"Loaded project with {len(project.modules)} modules")
-    except Exception as e:
-        print(f"Error loading project: {e}")
-        sys.exit(1)
-
-    gen_report_new(
-        database = database,
-        template = template,
-        output_html = output_html,
-        connection_threshold = connection_threshold,
-        max_files_per_commit = max_files_per_commit,
-        until = until,
-        since = since
-    )
+    with profile_session(args.profile):
+        try:
+            project = load_project_snapshot("result.snapshot", "result.json")
+            print(f"Loaded project with {len(project.modules)} modules")
+        except Exception as e:
+            print(f"Error loading project: {e}")
+            sys.exit(1)
+
+        try:
+            gen_report_new(
+                database = database,
+                template = template,
+                output_html = output_html,
+                connection_threshold = connection_threshold,
+                max_files_per_commit = max_files_per_commit,
+                until = until,
+                since = since
+            )
+        except (FileNotFoundError, RuntimeError) as e:
+            # База отсутствует или не обновлена git2sqlite.py
+            print(f"Error opening history database: {e}")
+            sys.exit(1)
 
     # gen_report(
     #     database = database,
@@ -8,15 +8,23 @@ import argparse
 import re
 import sys
 import csv
+import multiprocessing
+from contextlib import contextmanager
 from sqlite3 import Connection
 from threading import Lock
 import datetime
+import time
 import json
-from typing import List, Dict, Optional
+from typing import List, Dict, NamedTuple, Optional, Tuple
 from pathlib import Path
 
+import churn
+import history_db
+from profiling import PROFILER, add_profile_argument, profile_session
+
 USERS_FILE = "users.csv"
 UNKNOWN_USERS_FILE = "unknown_users.csv"
+MODULES_FILE = "modules.csv"
 
 # Структуры для кеширования данных
 user_mapping = {}
@@ -29,9 +37,44 @@ lock = Lock()
 # Глобальная мапа для отслеживания переименований файлов
 file_renames = {}
 
+# Модули файлов для сводок изменений (modules.csv)
+module_mapper = churn.ModuleMapper()
+
+# Загружать ли merge-коммиты (--include-merges); по умолчанию они
+# пропускаются (git log/rev-list --no-merges) при любом способе загрузки
+include_merges = False
+
 # Счётчик прогресса (общее количество обработанных коммитов)
 progress_counter = 0
 
+# Количество коммитов в одной транзакции пакетной загрузки
+BULK_BATCH_SIZE = 5000
+
+# PRAGMA на время пакетной загрузки: без fsync после каждой транзакции,
+# кеш страниц 256 МБ (отрицательное значение задается в КиБ),
+# временные таблицы и индексы в памяти
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": -262144,
+    "temp_store": "MEMORY",
+}
+
+# Параллельная загрузка: шардов на процесс и минимальный размер шарда в коммитах
+SHARDS_PER_JOB = 4
+SHARD_MIN_COMMITS = 200
+
+# Формат заголовка коммита в git log: \x1e начинает запись коммита,
+# поля разделены \x1f (эти символы не встречаются в хешах, именах и email)
+GIT_LOG_FORMAT = "--pretty=format:%x1e%H%x1f%an%x1f%ae%x1f%at%x1f%s"
+_RECORD_SEPARATOR = b"\x1e"
+_NUMSTAT = re.compile(rb"(\d+|-)\t(\d+|-)\t(.*)", re.S)
+
+# Размер блока при чтении вывода git log
+GIT_LOG_CHUNK_SIZE = 1 << 20
+
+# Ограничение SQLite на количество параметров в запросе (для старых версий)
+SQLITE_MAX_VARIABLES = 999
+
 # Сохраняем директорию, из которой был вызван скрипт
 ORIGINAL_DIRECTORY = os.getcwd()
 
@@ -41,7 +84,7 @@ def load_users_csv(users_file):
     Формат: {email_wildcard: (name, team)}
     """
     users_file = os.path.join(ORIGINAL_DIRECTORY, users_file)
-    global user_mapping
+    global user_mapping, _team_resolver
     if not os.path.exists(users_file):
         print(f"Ошибка: файл {users_file} не найден.")
         return
@@ -54,6 +97,15 @@ def load_users_csv(users_file):
             team = row['team'].strip()
 
             user_mapping[email_wildcard] = (name, team)
+    _team_resolver = None
+
+def load_modules_csv(modules_file):
+    """
+    Загружает modules.csv (path, module) для сводок изменений по модулям.
+    """
+    global module_mapper
+    module_mapper = churn.ModuleMapper.from_csv(os.path.join(ORIGINAL_DIRECTORY, modules_file))
+    print(f"Модули для сводок изменений: {module_mapper.size} путей из {modules_file}")
 
 def save_unknown_users(unknown_users_file):
     """
@@ -71,6 +123,61 @@ def save_unknown_users(unknown_users_file):
 
 
 
+class TeamResolver:
+    """
+    Сопоставление email с пользователем и командой из users.csv.
+
+    Шаблон из users.csv без "*" по краям ищется как подстрока email без учета
+    регистра, при нескольких совпадениях побеждает первый шаблон файла.
+    Шаблоны компилируются один раз в словари по длине, поэтому поиск
+    перебирает подстроки email, а не весь список шаблонов. Результат
+    кешируется для каждого email.
+    """
+
+    def __init__(self, mapping):
+        """
+        Args:
+            mapping: {email_wildcard: (name, team)} в порядке users.csv
+        """
+        self._patterns = {}  # длина -> {подстрока: (порядковый номер, name, team)}
+        for order, (email_wildcard, (name, team)) in enumerate(mapping.items()):
+            key = email_wildcard.strip("*").lower()
+            self._patterns.setdefault(len(key), {}).setdefault(key, (order, name, team))
+        self._lengths = sorted(self._patterns)
+        self._cache = {}
+
+    def resolve(self, email) -> Optional[Tuple[str, str]]:
+        """(name, team) первого подходящего шаблона или None"""
+        lower_email = email.lower()
+        try:
+            return self._cache[lower_email]
+        except KeyError:
+            pass
+
+        best = None
+        for length in self._lengths:
+            if length > len(lower_email):
+                break
+            patterns = self._patterns[length]
+            for start in range(len(lower_email) - length + 1):
+                match = patterns.get(lower_email[start:start + length])
+                if match is not None and (best is None or match[0] < best[0]):
+                    best = match
+        result = self._cache[lower_email] = best[1:] if best else None
+        return result
+
+
+# Скомпилированный user_mapping; сбрасывается при загрузке users.csv
+_team_resolver = None
+
+
+def get_team_resolver() -> TeamResolver:
+    global _team_resolver
+    if _team_resolver is None:
+        _team_resolver = TeamResolver(user_mapping)
+    return _team_resolver
+
+
 def resolve_user_and_team(original_name, original_email):
     """
     Ищет пользователя по email в users.csv через wildcard (*).
@@ -81,16 +188,11 @@ def resolve_user_and_team(original_name, original_email):
     Если не найден:
         - Добавляет в unknown_users_list (сохраняя порядок).
     """
-    global user_mapping, unknown_users_list, unknown_users_set
+    global unknown_users_list, unknown_users_set
 
-    # Приведение original_email к нижнему регистру для сравнения
-    lower_email = original_email.lower()
-
-    # Поиск совпадения по wildcard в user_mapping
-    for email_wildcard, (name, team) in user_mapping.items():
-        # Приводим wildcard тоже к нижнему регистру
-        if email_wildcard.strip("*").lower() in lower_email:
-            return name, team
+    user = get_team_resolver().resolve(original_email)
+    if user is not None:
+        return user
 
     # Если пользователь не найден, добавляем в unknown_users_list и unknown_users_set
     unknown_user_tuple = (original_name, original_email)
@@ -147,32 +249,14 @@ def ensure_git_root():
 def create_database(filename: str) -> sqlite3.Connection:
     """
     Создаёт SQLite базу данных и таблицы.
+
+    Схема описана в history_db; база в исходной схеме (текстовые ключи
+    коммитов, даты строками) переносится в нее автоматически.
     """
     db_connection = sqlite3.connect(filename)
     db_connection.execute("PRAGMA journal_mode=WAL;")
-    
-    # Создаем таблицу для коммитов
-    db_connection.execute("""
-        CREATE TABLE IF NOT EXISTS commits (
-            id TEXT UNIQUE,
-            summary TEXT,
-            author_name TEXT,
-            author_email TEXT,
-            commit_date TEXT
-        );
-    """)
-    
-    # Создаем таблицу для измененных файлов
-    db_connection.execute("""
-        CREATE TABLE IF NOT EXISTS commit_files (
-            commit_id TEXT,
-            filename TEXT,
-            added INT,
-            deleted INT,
-            FOREIGN KEY (commit_id) REFERENCES commits(id)
-        );
-    """)
-    
+    history_db.ensure_schema(db_connection)
+
     print(f"База данных создана: {filename}")
     return db_connection
 
@@ -203,148 +287,692 @@ def parse_file_rename(line):
     # Если не найдено переименование
     return None, None
 
-def add_commit_to_db(connection, commit_id, author_name, author_email, date, summary):
+def resolve_name(file_name, renames=None):
+    renames = file_renames if renames is None else renames
+    if file_name in renames:
+        file_name = renames[file_name]
+    return file_name
 
-    cursor = connection.cursor()
-    cursor.execute("SELECT 1 FROM commits WHERE id = ?", (commit_id,))
-    if cursor.fetchone():
-        print(f"Коммит {commit_id} уже существует в базе. Останавливаем обработку.")
-        return False  # Прекращаем чтение
 
-    resolved_name, resolved_team = resolve_user_and_team(author_name, author_email)
+def collapse_renames(renames, final=None):
     """
-    Добавляет информацию о коммите в таблицу commits.
+    Сжимает цепочки переименований в отображение "старое имя -> итоговое имя".
+    Вместо имен могут быть идентификаторы файлов.
+
+    Переименования перечисляются в порядке git log, от новых к старым:
+    для "a => b" итоговым становится уже известное итоговое имя b.
+    Имя b после этого снимается: раньше переименования в b под этим именем
+    жил другой файл.
+
+    Args:
+        renames: Пары (old_name, new_name)
+        final: Отображение, которое нужно дополнить (по умолчанию новое)
     """
-    connection.execute("""
-        INSERT INTO commits (id, summary, author_name, author_email, commit_date)
-        VALUES (?, ?, ?, ?, ?)
-    """, (commit_id, summary, resolved_name, author_email, date))
-    return True
+    if final is None:
+        final = {}
+    for old_name, new_name in renames:
+        final[old_name] = final.pop(new_name, new_name)
+    return final
 
-def resolve_name(file_name):
-    if file_name in file_renames:
-        file_name = file_renames[file_name]
-    return file_name
-def add_files_to_db(connection, commit_id, files):
-    """
-    Добавляет в базу данных файлы, связанные с коммитом. Исправляет их имена.
-    """
-    global file_renames
-    for file in files:
-        original_filename = file["name"]
-        if "=>" in original_filename:
-            old_name, new_name = parse_file_rename(original_filename)
-            # Переименование всех вхождений старого имени файла в базе данных
-
-            corrected_filename = new_name
-            if new_name in file_renames:
-                corrected_filename = file_renames[new_name]
-                del file_renames[new_name]
-            file_renames[old_name] = corrected_filename
-            connection.execute("""
-                UPDATE commit_files
-                SET filename = ?
-                WHERE filename = ?;
-            """, (corrected_filename, old_name))
-            connection.commit()
-        else:
-            corrected_filename = resolve_name(original_filename)
 
-        connection.execute("""
-            INSERT INTO commit_files (commit_id, filename, added, deleted)
-            VALUES (?, ?, ?, ?)
-        """, (commit_id, corrected_filename, file["added"], file["deleted"]))
+def resolve_file_rename(original_filename, rename=None, renames=None):
+    """
+    Исправляет имя файла с учетом переименований.
 
+    Для строки вида "old => new" запоминает переименование в file_renames.
 
-def process_commit_block(commit_block, connection):
-    global progress_counter
+    Args:
+        original_filename: Имя файла из git log --numstat
+        rename: Уже разобранная пара (old_name, new_name), если есть
+        renames: Отображение переименований репозитория (по умолчанию file_renames)
 
-    connection.execute("PRAGMA journal_mode=WAL;")
+    Returns:
+        (corrected_filename, rename): rename - пара (old_name, new_name),
+        если строка описывает переименование, иначе None
+    """
+    renames = file_renames if renames is None else renames
+    if rename is None:
+        if "=>" not in original_filename:
+            return resolve_name(original_filename, renames), None
+        rename = parse_file_rename(original_filename)
 
-    commit_info = None
-    files = []
+    old_name, new_name = rename
+    collapse_renames([(old_name, new_name)], renames)
+    return renames[old_name], (old_name, new_name)
+
+
+@contextmanager
+def bulk_load_pragmas(connection):
+    """
+    Включает BULK_LOAD_PRAGMAS на время блока и восстанавливает прежние значения.
+    Незавершенная транзакция перед восстановлением фиксируется.
+    """
+    previous = {name: connection.execute(f"PRAGMA {name}").fetchone()[0] for name in BULK_LOAD_PRAGMAS}
+    for name, value in BULK_LOAD_PRAGMAS.items():
+        connection.execute(f"PRAGMA {name}={value}")
+    try:
+        yield connection
+    finally:
+        connection.commit()
+        for name, value in previous.items():
+            connection.execute(f"PRAGMA {name}={value}")
+
+
+class CommitBatchWriter:
+    """
+    Пакетная запись коммитов в SQLite.
+
+    Разобранные коммиты копятся в буфере и каждые batch_size коммитов
+    записываются через executemany одной транзакцией. Наличие коммитов
+    в базе проверяется одним запросом на пачку: первый уже известный коммит
+    останавливает загрузку (git log идет от новых к старым), а с
+    skip_existing=True просто пропускается.
+
+    Идентификаторы авторов, файлов и коммитов назначаются здесь же по
+    справочникам, загруженным в память при создании, поэтому строки всех
+    таблиц пишутся без промежуточных запросов.
+
+    Файлы коммитов текущей загрузки получают итоговые имена сразу
+    (file_renames). Переименования записываются в таблицу renames, а строки,
+    загруженные раньше, переименовываются одним UPDATE в finish().
+
+    Писатель относится к одному репозиторию: коммиты, строки commit_files
+    и файлы получают его repo_id, пути файлов уникальны в его пределах.
+
+    Писатель запоминает сутки новых коммитов и строк, переименованных
+    в finish(), и пересчитывает за них сводки изменений (модуль churn).
+    """
 
-    for line in commit_block:
-        line = line.strip()
-        if re.match(r"^[a-f0-9]+\|.*", line):
-            parts = line.split("|", 4)
-            commit_id = parts[0]
-            author_name = parts[1]
-            author_email = parts[2]
-            date = parts[3]
-            summary = parts[4]
-            commit_info = (commit_id, author_name, author_email, date, summary)
-            files = []
-        elif re.match(r"^\d+\s+\d+\s+.+", line):
-            parts = line.split("\t")
-            if len(parts) >= 3:
-                added, deleted, filename = parts[0], parts[1], parts[2]
-
-                files.append({
-                    "name": filename,
-                    "added": int(added) if added.isdigit() else 0,
-                    "deleted": int(deleted) if deleted.isdigit() else 0
-                })
-
-    if commit_info and files:
-        if not add_commit_to_db(connection, *commit_info):
+    def __init__(self, connection, batch_size=BULK_BATCH_SIZE, skip_existing=False, repo_id=None,
+                 renames=None):
+        """
+        Args:
+            repo_id: Репозиторий в базе (по умолчанию history_db.DEFAULT_REPOSITORY)
+            renames: Отображение переименований репозитория (по умолчанию file_renames)
+        """
+        self.connection = connection
+        self.batch_size = batch_size
+        self.skip_existing = skip_existing
+        self.stopped = False
+        self.repo_id = repo_id if repo_id is not None else history_db.register_repository(connection)
+        self.renames = file_renames if renames is None else renames
+        self._pending = []  # (commit_info, files)
+        self._days = set()  # Сутки, сводки за которые нужно пересчитать
+        self._author_ids = dict(connection.execute("SELECT email, id FROM authors"))
+        self._file_ids = dict(connection.execute("SELECT path, id FROM files WHERE repo_id = ?", (self.repo_id,)))
+        self._next_author_id = self._max_id("authors") + 1
+        self._next_file_id = self._max_id("files") + 1
+        self._next_commit_id = self._max_id("commits") + 1
+        # Строки commit_files и renames до этой отметки записаны прошлыми загрузками
+        self._files_watermark = self._max_id("commit_files", "rowid")
+        self._renames_watermark = self._max_id("renames", "rowid")
+
+    def _max_id(self, table, column="id"):
+        return self.connection.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}").fetchone()[0]
+
+    def add(self, commit_info, files):
+        """
+        Добавляет коммит в буфер.
+
+        Returns:
+            False, если загрузку нужно остановить
+        """
+        if self.stopped:
             return False
-        add_files_to_db(connection, commit_info[0], files)
+        self._pending.append((commit_info, files))
+        if len(self._pending) >= self.batch_size:
+            return self.flush()
+        return True
+
+    def _existing_hashes(self, hashes):
+        existing = set()
+        chunk_size = SQLITE_MAX_VARIABLES - 1  # один параметр занимает repo_id
+        for start in range(0, len(hashes), chunk_size):
+            chunk = hashes[start:start + chunk_size]
+            cursor = self.connection.execute(
+                f"SELECT hash FROM commits WHERE repo_id = ? AND hash IN ({','.join('?' * len(chunk))})",
+                [self.repo_id, *chunk])
+            existing.update(row[0] for row in cursor)
+        return existing
+
+    def _author(self, author_name, author_email, author_rows):
+        """Идентификатор автора и его команда по users.csv на момент загрузки"""
+        resolved_name, resolved_team = resolve_user_and_team(author_name, author_email)
+        author_id = self._author_ids.get(author_email)
+        if author_id is None:
+            author_id = self._author_ids[author_email] = self._next_author_id
+            self._next_author_id += 1
+            author_rows.append((author_id, resolved_name, author_email, resolved_team))
+        return author_id, resolved_team
+
+    def _file_id(self, path, file_rows):
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            file_id = self._file_ids[path] = self._next_file_id
+            self._next_file_id += 1
+            file_rows.append((file_id, self.repo_id, path))
+        return file_id
+
+    def flush(self):
+        """
+        Записывает буфер одной транзакцией.
+
+        Returns:
+            False, если загрузка остановлена на уже известном коммите
+        """
+        global progress_counter
+        pending, self._pending = self._pending, []
+        if not pending:
+            return not self.stopped
+
+        with PROFILER.span("sqlite.insert"):
+            existing = self._existing_hashes([commit_info[0] for commit_info, _ in pending])
+            author_rows = []
+            path_rows = []
+            commit_rows = []
+            file_rows = []
+            rename_rows = []
+            for (commit_hash, author_name, author_email, date, summary), files in pending:
+                if commit_hash in existing:
+                    if self.skip_existing:
+                        continue
+                    print(f"\nКоммит {commit_hash} уже существует в базе. Останавливаем обработку.")
+                    self.stopped = True
+                    break
+
+                commit_id = self._next_commit_id
+                self._next_commit_id += 1
+                existing.add(commit_hash)
+                author_id, author_team = self._author(author_name, author_email, author_rows)
+                commit_time = history_db.to_epoch(date)
+                if commit_time is not None:
+                    self._days.add(churn.day_start(commit_time))
+                commit_rows.append((commit_id, commit_hash, summary, author_id, author_team,
+                                    commit_time, self.repo_id))
+                for file in files:
+                    corrected_filename, rename = resolve_file_rename(file.name, file.rename, self.renames)
+                    if rename is not None:
+                        rename_rows.append((commit_id, *(self._file_id(name, path_rows) for name in rename)))
+                    file_rows.append((commit_id, self._file_id(corrected_filename, path_rows),
+                                      file.added, file.deleted, self.repo_id))
+
+            self.connection.executemany("""
+                INSERT INTO authors (id, name, email, team)
+                VALUES (?, ?, ?, ?)
+            """, author_rows)
+            self.connection.executemany("INSERT INTO files (id, repo_id, path) VALUES (?, ?, ?)", path_rows)
+            self.connection.executemany("""
+                INSERT INTO commits (id, hash, summary, author_id, author_team, commit_time, repo_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, commit_rows)
+            self.connection.executemany("""
+                INSERT INTO commit_files (commit_id, file_id, added, deleted, repo_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, file_rows)
+            self.connection.executemany("""
+                INSERT INTO renames (commit_id, old_file_id, new_file_id)
+                VALUES (?, ?, ?)
+            """, rename_rows)
+            self.connection.commit()
+
+        PROFILER.count("sqlite.commits", len(commit_rows))
+        PROFILER.count("sqlite.files", len(file_rows))
+        PROFILER.count("sqlite.renames", len(rename_rows))
+        progress_counter += len(commit_rows)
+        sys.stdout.write(f"\rОбработано коммитов: {progress_counter}")
+        sys.stdout.flush()
+        return not self.stopped
+
+    def finish(self):
+        """
+        Записывает остаток буфера, применяет переименования к ранее загруженным
+        строкам и обновляет сводки изменений
+        """
+        self.flush()
+        self.apply_renames()
+        churn.update_rollups(self.connection, self._days, module_mapper)
+
+    @PROFILER.profiled("sqlite.renames")
+    def apply_renames(self):
+        """
+        Переименовывает файлы в строках commit_files прошлых загрузок.
+
+        Переименования этой загрузки читаются из renames, сжимаются
+        в отображение "старый файл -> итоговый" и применяются одним
+        UPDATE через временную таблицу (строки находятся по индексу file_id).
+        """
+        cursor = self.connection.execute(
+            "SELECT old_file_id, new_file_id FROM renames WHERE rowid > ? ORDER BY rowid",
+            (self._renames_watermark,))
+        final = {old_id: new_id for old_id, new_id in collapse_renames(cursor).items() if old_id != new_id}
+        if not final or not self._files_watermark:
+            return
+
+        self.connection.execute("CREATE TEMP TABLE rename_map (old_file_id INTEGER PRIMARY KEY, new_file_id INTEGER)")
+        try:
+            self.connection.executemany("INSERT INTO temp.rename_map VALUES (?, ?)", final.items())
+            # Сутки переименованных строк: модули их файлов в сводках меняются
+            self._days.update(day for day, in self.connection.execute(f"""
+                SELECT DISTINCT {churn.DAY_SQL}
+                FROM commit_files
+                JOIN commits ON commits.id = commit_files.commit_id
+                WHERE commit_files.file_id IN (SELECT old_file_id FROM temp.rename_map)
+                  AND commit_files.rowid <= ? AND commits.commit_time IS NOT NULL
+            """, (self._files_watermark,)))
+            updated = self.connection.execute("""
+                UPDATE commit_files
+                SET file_id = (SELECT new_file_id FROM temp.rename_map WHERE old_file_id = commit_files.file_id)
+                WHERE file_id IN (SELECT old_file_id FROM temp.rename_map) AND rowid <= ?
+            """, (self._files_watermark,)).rowcount
+            self.connection.commit()
+        finally:
+            self.connection.execute("DROP TABLE temp.rename_map")
+        print(f"\nПереименовано строк прошлых загрузок: {updated}")
+
+
+class FileChange(NamedTuple):
+    """Изменение файла в коммите (строка git log --numstat)"""
+    name: str
+    added: int
+    deleted: int
+    rename: Optional[Tuple[str, str]] = None  # (old_name, new_name) для переименования
 
-    progress_counter += 1
-    sys.stdout.write(f"\rОбработано коммитов: {progress_counter}")
-    sys.stdout.flush()
-    return True
 
+def _merge_options():
+    """Опции git log и git rev-list для отбора merge-коммитов (см. include_merges)"""
+    return [] if include_merges else ["--no-merges"]
 
-def parse_git_log(connection, params_extr, patterns=None):
 
-    git_command = [
-        "git", "log",
-        "--pretty=format:%H|%an|%ae|%aI|%s",
-        "--numstat",
-        "--no-merges",
-    ]
+def git_log_command(params_extr=None, patterns=None, revisions=(), stdin=False):
+    """
+    Команда git log в формате, который разбирает iter_git_log.
 
+    Args:
+        params_extr: Окно по времени (since/until)
+        patterns: Ограничение по путям
+        revisions: Ревизии для обхода
+        stdin: Взять список коммитов из stdin (без обхода истории)
+    """
+    params_extr = params_extr or {}
+    git_command = ["git", "log", "-z", "--numstat", GIT_LOG_FORMAT]
+    if stdin:
+        git_command.extend(["--no-walk=unsorted", "--stdin"])
+    else:
+        git_command.extend(_merge_options())
     if params_extr.get("since"):
         git_command.append(f"--since={params_extr['since']}")
     if params_extr.get("until"):
         git_command.append(f"--until={params_extr['until']}")
-
+    git_command.extend(revisions)
     if patterns:
         git_command.append("--")
         git_command.extend(patterns)
+    return git_command
+
+
+def _decode(value):
+    return value.decode("utf-8", "replace")
+
+
+def parse_commit_record(record):
+    """
+    Разбирает запись одного коммита из вывода git log -z --numstat.
+
+    Запись - заголовок с полями через \x1f до перевода строки, затем строки
+    numstat, каждая завершается \0. У переименованного файла путь пустой,
+    а старое и новое имя идут следующими двумя полями.
+
+    Returns:
+        (commit_info, files): commit_info - (хеш, имя, email, время в секундах Unix, summary)
+    """
+    header, _, body = record.partition(b"\n")
+    commit_hash, author_name, author_email, timestamp, summary = _decode(header).split("\x1f", 4)
+    files = []
+    fields = iter(body.split(b"\0"))
+    for field in fields:
+        match = _NUMSTAT.fullmatch(field)
+        if match is None:
+            continue
+        added, deleted, path = match.groups()
+        added = int(added) if added != b"-" else 0
+        deleted = int(deleted) if deleted != b"-" else 0
+        if path:
+            files.append(FileChange(_decode(path), added, deleted))
+        else:
+            old_name, new_name = _decode(next(fields, b"")), _decode(next(fields, b""))
+            files.append(FileChange(new_name, added, deleted, (old_name, new_name)))
+    return (commit_hash, author_name, author_email, int(timestamp), summary), files
+
+
+def iter_git_log(git_command, repo_path=None, input=None, chunk_size=GIT_LOG_CHUNK_SIZE):
+    """
+    Потоково разбирает вывод git log (см. git_log_command).
 
+    Вывод читается блоками по chunk_size байт, в памяти держится только
+    незавершенная запись. Если генератор закрыт раньше конца вывода,
+    процесс git завершается.
+
+    Yields:
+        (commit_info, files) в порядке вывода git log
+    """
+    process = subprocess.Popen(git_command, cwd=repo_path,
+                               stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     try:
-        process = subprocess.Popen(
-            git_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-
-        current_block = []
-
-        for line in process.stdout:
-            if re.match(r"^[a-f0-9]+\|.*", line):
-                if current_block:
-                    sys.stdout.flush()
-                    if not process_commit_block(current_block, connection):
-                        try:
-                            process.terminate()
-                            process.wait(timeout=5)
-                        except subprocess.TimeoutExpired:
-                            print("Процесс завершился некорректно. Принудительная остановка...")
-                            process.kill()  # Принудительное завершение
-                        break
-                    current_block = []
-            current_block.append(line)
+        if input is not None:
+            process.stdin.write(input.encode("utf-8"))
+            process.stdin.close()
+
+        pending = b""
+        while True:
+            chunk = process.stdout.read(chunk_size)
+            if not chunk:
+                break
+            records = (pending + chunk).split(_RECORD_SEPARATOR)
+            pending = records.pop()
+            for record in records:
+                if record:
+                    yield parse_commit_record(record)
+        if pending:
+            yield parse_commit_record(pending)
+
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, git_command,
+                                                stderr=_decode(process.stderr.read()))
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+@PROFILER.profiled("git_log.parse")
+def parse_git_log(connection, params_extr, patterns=None, batch_size=BULK_BATCH_SIZE):
+
+    try:
+        writer = CommitBatchWriter(connection, batch_size)
+        with bulk_load_pragmas(connection):
+            for commit_info, files in iter_git_log(git_log_command(params_extr, patterns)):
+                if files and not writer.add(commit_info, files):
+                    break
+            writer.finish()
 
-        connection.commit()
         connection.close()
     except Exception as e:
         print(f"\nОшибка: {e}")
 
+def list_commits(params_extr, patterns=None, repo_path=None, revisions=("HEAD",)):
+    """
+    Хеши коммитов от новых к старым (git rev-list); merge-коммиты - только
+    с include_merges.
+
+    Args:
+        revisions: Ревизии для git rev-list; "^hash" исключает коммит и его предков
+    """
+    git_command = ["git", "rev-list", *_merge_options()]
+    if params_extr.get("since"):
+        git_command.append(f"--since={params_extr['since']}")
+    if params_extr.get("until"):
+        git_command.append(f"--until={params_extr['until']}")
+    git_command.extend(revisions)
+    if patterns:
+        git_command.append("--")
+        git_command.extend(patterns)
+
+    result = subprocess.run(git_command, cwd=repo_path, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def split_into_shards(commit_hashes, jobs):
+    """
+    Делит список коммитов на последовательные шарды.
+
+    Шардов больше, чем процессов, чтобы неравные по размеру коммиты
+    не оставляли процессы без работы в конце загрузки.
+    """
+    if not commit_hashes:
+        return []
+    shard_count = max(1, min(jobs * SHARDS_PER_JOB, len(commit_hashes) // SHARD_MIN_COMMITS))
+    shard_size = -(-len(commit_hashes) // shard_count)
+    return [commit_hashes[start:start + shard_size] for start in range(0, len(commit_hashes), shard_size)]
+
+
+def parse_shard(shard):
+    """
+    Разбирает коммиты шарда в процессе-обработчике.
+
+    Args:
+        shard: (repo_path, хеши коммитов, patterns)
+
+    Returns:
+        Список (commit_info, files) в порядке хешей шарда
+    """
+    repo_path, commit_hashes, patterns = shard
+    git_command = git_log_command(patterns=patterns, stdin=True)
+    # С --no-walk пути не отбирают коммиты, только файлы в них: коммиты без
+    # файлов по patterns отбрасываются. Без patterns коммиты без файлов
+    # (merge-коммиты, пустые коммиты) остаются, как в последовательной загрузке
+    return [(commit_info, files)
+            for commit_info, files in iter_git_log(git_command, repo_path, "".join(f"{h}\n" for h in commit_hashes))
+            if files or not patterns]
+
+
+def ingest_commits(connection, commit_hashes, patterns=None, jobs=1, repo_path=None,
+                   batch_size=BULK_BATCH_SIZE, skip_existing=False, repo_id=None):
+    """
+    Разбирает и записывает в базу перечисленные коммиты.
+
+    Список делится на шарды, каждый шард разбирается через
+    git log --no-walk --stdin: при jobs > 1 - в отдельных процессах.
+    Результаты шардов принимаются по порядку, и единственный писатель
+    в основном процессе видит коммиты в том же порядке, что и при
+    последовательной загрузке, поэтому переименования разрешаются так же,
+    как в parse_git_log.
+
+    Returns:
+        False, если загрузка остановлена на уже известном коммите
+    """
+    return ingest_batches(connection, [(repo_id, repo_path, commit_hashes)], patterns, jobs,
+                          batch_size, skip_existing)
+
+
+def ingest_batches(connection, batches, patterns=None, jobs=1, batch_size=BULK_BATCH_SIZE,
+                   skip_existing=False):
+    """
+    Разбирает и записывает в базу коммиты нескольких репозиториев (см. ingest_commits).
+
+    Шарды всех репозиториев разбираются общим пулом процессов, поэтому
+    git log разных репозиториев выполняется одновременно. В базу пишет
+    основной процесс: репозитории по очереди, каждый своим CommitBatchWriter
+    со своими переименованиями.
+
+    Args:
+        batches: Список (repo_id, repo_path, хеши коммитов)
+
+    Returns:
+        False, если загрузка остановлена на уже известном коммите
+    """
+    tasks = []
+    owners = []  # Номер элемента batches для каждого шарда
+    for index, (_, repo_path, commit_hashes) in enumerate(batches):
+        shards = split_into_shards(commit_hashes, jobs)
+        tasks.extend((repo_path, shard, patterns) for shard in shards)
+        owners.extend([index] * len(shards))
+    print(f"Коммитов: {sum(len(batch[2]) for batch in batches)}, шардов: {len(tasks)}, процессов: {jobs}")
+
+    writer = None
+    pool = multiprocessing.Pool(jobs) if jobs > 1 and len(tasks) > 1 else None
+    try:
+        results = pool.imap(parse_shard, tasks) if pool else map(parse_shard, tasks)
+        with bulk_load_pragmas(connection):
+            if len(batches) == 1:
+                writer = CommitBatchWriter(connection, batch_size, skip_existing, batches[0][0])
+            current = 0
+            for index, commits in zip(owners, results):
+                if writer is None or index != current:
+                    if writer is not None:
+                        writer.finish()
+                    writer = CommitBatchWriter(connection, batch_size, skip_existing, batches[index][0], {})
+                    current = index
+                PROFILER.count("git_log.commits", len(commits))
+                if not all(writer.add(commit_info, files) for commit_info, files in commits):
+                    break
+            if writer is not None:
+                writer.finish()
+    finally:
+        if pool:
+            pool.terminate()
+    print()
+    return writer is None or not writer.stopped
+
+
+@PROFILER.profiled("git_log.parse")
+def parse_git_log_parallel(connection, params_extr, patterns=None, jobs=None, repo_path=None,
+                           batch_size=BULK_BATCH_SIZE):
+    """
+    Загружает историю, разбирая git log в нескольких процессах.
+
+    Список коммитов берется из git rev-list и делится на шарды (см. ingest_commits).
+    Коммиты, уже записанные в базу, пропускаются, как в load_git_history.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    commit_hashes = list_commits(params_extr, patterns, repo_path)
+    ingest_commits(connection, commit_hashes, patterns, jobs, repo_path, batch_size, skip_existing=True)
+
+
+def _git_output(git_command, repo_path=None, input=None):
+    return subprocess.run(git_command, cwd=repo_path, input=input, capture_output=True,
+                          text=True, check=True).stdout.strip()
+
+
+def _existing_git_commits(commit_hashes, repo_path=None):
+    """Коммиты из списка, которые еще есть в репозитории (git cat-file --batch-check)"""
+    if not commit_hashes:
+        return []
+    output = _git_output(["git", "cat-file", "--batch-check"], repo_path,
+                         "".join(f"{commit_hash}\n" for commit_hash in commit_hashes))
+    return [commit_hash for commit_hash, line in zip(commit_hashes, output.splitlines())
+            if line.split()[1:2] == ["commit"]]
+
+
+def _incremental_commits(connection, repo_id, ref="HEAD", params_extr=None, patterns=None, repo_path=None):
+    """
+    Коммиты ref, появившиеся после прошлой загрузки репозитория (см. ingest_incremental).
+
+    Returns:
+        (ref_name, tip, хеши коммитов); хешей нет (None), если ref не изменился
+    """
+    tip = _git_output(["git", "rev-parse", "--verify", f"{ref}^{{commit}}"], repo_path)
+    ref_name = _git_output(["git", "rev-parse", "--symbolic-full-name", ref], repo_path) or ref
+
+    state = dict(connection.execute("SELECT ref, tip FROM ingest_state WHERE repo_id = ?", (repo_id,)))
+    if state.get(ref_name) == tip:
+        print(f"Новых коммитов в {ref_name} нет ({tip[:12]})")
+        return ref_name, tip, None
+
+    known_tips = _existing_git_commits(sorted(set(state.values())), repo_path)
+    if known_tips:
+        print(f"Загрузка {ref_name}: {tip[:12]} без истории {', '.join(t[:12] for t in known_tips)}")
+        commit_hashes = list_commits({}, patterns, repo_path, [tip] + [f"^{t}" for t in known_tips])
+    else:
+        print(f"Сохраненного состояния нет, загрузка {ref_name} за окно {params_extr or 'вся история'}")
+        commit_hashes = list_commits(params_extr or {}, patterns, repo_path, [tip])
+    return ref_name, tip, commit_hashes
+
+
+def _save_ingest_state(connection, repo_id, ref_name, tip):
+    connection.execute("INSERT OR REPLACE INTO ingest_state (repo_id, ref, tip, updated_at) VALUES (?, ?, ?, ?)",
+                       (repo_id, ref_name, tip, int(time.time())))
+    connection.commit()
+
+
+@PROFILER.profiled("git_log.incremental")
+def ingest_incremental(connection, ref="HEAD", params_extr=None, patterns=None, jobs=1, repo_path=None,
+                       batch_size=BULK_BATCH_SIZE, repo_id=None):
+    """
+    Загружает только коммиты, появившиеся после прошлой загрузки.
+
+    В таблице ingest_state хранится последний загруженный коммит каждой
+    ветки. Загружаются коммиты, достижимые из ref и недостижимые ни из
+    одного сохраненного коммита (git rev-list ref ^tip...), поэтому время
+    обновления пропорционально числу новых коммитов. Ветки, перебазирования
+    и пропуски обрабатываются так же: коммиты, которые уже есть в базе,
+    пропускаются по хешу. Сохраненные коммиты, исчезнувшие из репозитория
+    (например, после перебазирования и gc), не учитываются.
+
+    Без сохраненного состояния загружается история в окне params_extr
+    (since/until), как при обычной загрузке.
+
+    Returns:
+        Количество коммитов в загруженном диапазоне
+    """
+    if repo_id is None:
+        repo_id = history_db.register_repository(connection)
+    ref_name, tip, commit_hashes = _incremental_commits(connection, repo_id, ref, params_extr, patterns, repo_path)
+    if commit_hashes is None:
+        return 0
+
+    ingest_commits(connection, commit_hashes, patterns, jobs, repo_path, batch_size, skip_existing=True,
+                   repo_id=repo_id)
+    _save_ingest_state(connection, repo_id, ref_name, tip)
+    return len(commit_hashes)
+
+
+def parse_repository_spec(spec):
+    """
+    Разбирает описание репозитория из --repos: "NAME=PATH" или "PATH".
+
+    Returns:
+        (name, path); без имени берется имя директории репозитория
+    """
+    name, separator, path = spec.partition("=")
+    if not separator:
+        name, path = os.path.basename(os.path.normpath(os.path.abspath(spec))), spec
+    return name, path
+
+
+@PROFILER.profiled("git_log.repositories")
+def ingest_repositories(connection, repositories, params_extr, patterns=None, jobs=1,
+                        batch_size=BULK_BATCH_SIZE, ref=None):
+    """
+    Загружает историю нескольких репозиториев в одну базу.
+
+    Каждый репозиторий регистрируется в таблице repositories, его коммиты
+    и файлы получают repo_id. Списки коммитов собираются по всем
+    репозиториям, после чего шарды разбираются общим пулом процессов
+    (см. ingest_batches). Коммиты, уже записанные в базу, пропускаются.
+
+    Args:
+        repositories: Список (name, path)
+        ref: Ветка для инкрементальной загрузки (см. ingest_incremental);
+            без нее загружается окно params_extr
+
+    Returns:
+        Количество коммитов в загруженных диапазонах
+    """
+    batches = []
+    states = []
+    for name, repo_path in repositories:
+        repo_id = history_db.register_repository(connection, name, os.path.abspath(repo_path))
+        print(f"Репозиторий {name}: {repo_path}")
+        if ref:
+            ref_name, tip, commit_hashes = _incremental_commits(connection, repo_id, ref, params_extr,
+                                                                patterns, repo_path)
+            if commit_hashes is None:
+                continue
+            states.append((repo_id, ref_name, tip))
+        else:
+            commit_hashes = list_commits(params_extr, patterns, repo_path)
+        batches.append((repo_id, repo_path, commit_hashes))
+
+    if batches:
+        ingest_batches(connection, batches, patterns, jobs, batch_size, skip_existing=True)
+    for state in states:
+        _save_ingest_state(connection, *state)
+    return sum(len(commit_hashes) for _, _, commit_hashes in batches)
+
+
 def show_usage_and_exit():
     usage_message = (
         "По умолчанию имя БД git_log.db\n"
@@ -355,188 +983,168 @@ def show_usage_and_exit():
     print(usage_message)
     sys.exit(1)
 
+def _since_date(days):
+    return (datetime.datetime.now() - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+@PROFILER.profiled("git_log.parse")
 def get_git_history(days: int = 30, repo_path: Optional[str] = None) -> List[Dict]:
     """
     Получает историю Git-репозитория за указанное количество дней.
+
+    Возвращает все коммиты списком; для загрузки в базу без накопления
+    истории в памяти используется load_git_history.
     """
     print(f"\nНачало получения истории Git за последние {days} дней")
     print(f"Путь к репозиторию: {repo_path if repo_path else 'текущая директория'}")
-    
-    since_date = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
-    print(f"Дата начала анализа: {since_date}")
-    
-    # Сохраняем текущую директорию
-    original_dir = os.getcwd()
-    print(f"Текущая директория: {original_dir}")
-    
-    try:
-        # Если указан путь к репозиторию, переходим в него
-        if repo_path:
-            print(f"Переход в директорию репозитория: {repo_path}")
-            os.chdir(repo_path)
-            print(f"Текущая директория после перехода: {os.getcwd()}")
-        
-        # Используем другой формат для git log, который не требует JSON парсинга
-        cmd = ['git', 'log', 
-               '--since', since_date,
-               '--pretty=format:%H|%an|%ae|%ad|%s',
-               '--date=iso',
-               '--numstat']
-        
-        print(f"\nВыполнение команды: {' '.join(cmd)}")
-        result = subprocess.run(cmd, 
-                              capture_output=True, 
-                              text=True, 
-                              check=True)
-        
-        print(f"Команда выполнена успешно. Размер вывода: {len(result.stdout)} символов")
-        
-        commits = []
-        current_commit = None
-        current_files = []
-        total_lines = len(result.stdout.strip().split('\n'))
-        processed_lines = 0
-        
-        print("\nНачало обработки вывода git log")
-        for line in result.stdout.strip().split('\n'):
-            processed_lines += 1
-            if processed_lines % 100 == 0:
-                print(f"Обработано строк: {processed_lines}/{total_lines}")
-            
-            if '|' in line:
-                # Если это новый коммит, сохраняем предыдущий
-                if current_commit:
-                    current_commit['files'] = current_files
-                    commits.append(current_commit)
-                    print(f"Обработан коммит: {current_commit['commit'][:8]}... ({len(current_files)} файлов)")
-                
-                # Парсим информацию о коммите
-                try:
-                    commit_id, author, email, date, message = line.split('|', 4)
-                    current_commit = {
-                        'commit': commit_id,
-                        'author': author,
-                        'email': email,
-                        'date': date,
-                        'message': message
-                    }
-                    current_files = []
-                except ValueError as e:
-                    print(f"Ошибка при разборе строки коммита: {line}")
-                    print(f"Ошибка: {e}")
-                    continue
-            elif line.strip():
-                # Обрабатываем статистику файлов
-                parts = line.split('\t')
-                if len(parts) >= 3:
-                    added, deleted, filename = parts[0], parts[1], parts[2]
-                    try:
-                        current_files.append({
-                            'name': filename,
-                            'added': int(added) if added != '-' else 0,
-                            'deleted': int(deleted) if deleted != '-' else 0
-                        })
-                    except ValueError as e:
-                        print(f"Ошибка при разборе статистики файла: {line}")
-                        print(f"Ошибка: {e}")
-                        continue
-        
-        # Добавляем последний коммит
-        if current_commit:
-            current_commit['files'] = current_files
-            commits.append(current_commit)
-            print(f"Обработан последний коммит: {current_commit['commit'][:8]}... ({len(current_files)} файлов)")
-        
-        print(f"\nОбработка завершена. Всего коммитов: {len(commits)}")
-        return commits
-    
-    except subprocess.CalledProcessError as e:
-        print(f"\nОшибка при выполнении git log: {e}")
-        print(f"Команда: {' '.join(cmd)}")
-        print(f"Вывод ошибки: {e.stderr}")
-        return []
-    except Exception as e:
-        print(f"\nНеожиданная ошибка: {e}")
-        print(f"Строка, вызвавшая ошибку: {line}")
-        return []
-    finally:
-        # Возвращаемся в исходную директорию
-        print(f"\nВозврат в исходную директорию: {original_dir}")
-        os.chdir(original_dir)
 
-def save_to_database(connection: sqlite3.Connection, commits: List[Dict]) -> None:
+    commits = []
+    for (commit_id, author, email, date, message), files in iter_git_log(
+            git_log_command({"since": _since_date(days)}), repo_path):
+        commits.append({
+            'commit': commit_id,
+            'author': author,
+            'email': email,
+            'date': date,
+            'message': message,
+            'files': [file._asdict() for file in files]
+        })
+
+    print(f"Обработка завершена. Всего коммитов: {len(commits)}")
+    PROFILER.count("git_log.commits", len(commits))
+    return commits
+
+
+@PROFILER.profiled("git_log.parse")
+def load_git_history(connection: sqlite3.Connection, params_extr, patterns=None, repo_path: Optional[str] = None,
+                     batch_size: int = BULK_BATCH_SIZE) -> int:
+    """
+    Загружает историю в базу потоком: git log -> разбор -> CommitBatchWriter.
+
+    В памяти одновременно находится не больше batch_size коммитов,
+    независимо от длины истории. Коммиты, уже записанные в базу, пропускаются.
+
+    Returns:
+        Количество разобранных коммитов
+    """
+    writer = CommitBatchWriter(connection, batch_size, skip_existing=True)
+    count = 0
+    with bulk_load_pragmas(connection):
+        for commit_info, files in iter_git_log(git_log_command(params_extr, patterns), repo_path):
+            count += 1
+            writer.add(commit_info, files)
+        writer.finish()
+    print()
+    PROFILER.count("git_log.commits", count)
+    return count
+
+
+def save_to_database(connection: sqlite3.Connection, commits: List[Dict],
+                     batch_size: int = BULK_BATCH_SIZE) -> None:
     """
     Сохраняет коммиты и информацию о файлах в базу данных.
+
+    Запись идет через CommitBatchWriter; коммиты, уже записанные в базу,
+    пропускаются.
     """
-    cursor = connection.cursor()
-    
-    for commit in commits:
-        # Сохраняем информацию о коммите
-        cursor.execute("""
-            INSERT OR IGNORE INTO commits (id, summary, author_name, author_email, commit_date)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            commit['commit'],
-            commit['message'],
-            commit['author'],
-            commit['email'],
-            commit['date']
-        ))
-        
-        # Сохраняем информацию о файлах
-        for file in commit.get('files', []):
-            cursor.execute("""
-                INSERT INTO commit_files (commit_id, filename, added, deleted)
-                VALUES (?, ?, ?, ?)
-            """, (
-                commit['commit'],
-                file['name'],
-                file['added'],
-                file['deleted']
-            ))
-    
-    connection.commit()
+    writer = CommitBatchWriter(connection, batch_size, skip_existing=True)
+    with bulk_load_pragmas(connection):
+        for commit in commits:
+            files = [FileChange(file['name'], file['added'], file['deleted'], file.get('rename'))
+                     for file in commit.get('files', [])]
+            writer.add((commit['commit'], commit['author'], commit['email'], commit['date'], commit['message']),
+                       files)
+        writer.finish()
+    print()
 
 def main():
     # Создаем парсер аргументов
-    # parser = argparse.ArgumentParser(description='Анализ истории Git-репозитория')
-    # parser.add_argument('--repo-path', type=str, help='Путь к Git-репозиторию')
-    # parser.add_argument('--days', type=int, default=30, help='Количество дней для анализа (по умолчанию 30)')
-    # parser.add_argument('--db-file', type=str, default='git_history.db', help='Имя файла базы данных (по умолчанию git_history.db)')
-    
-    # args = parser.parse_args()
-    
+    parser = argparse.ArgumentParser(description='Анализ истории Git-репозитория')
+    parser.add_argument('--repo-path', type=str, help='Путь к Git-репозиторию')
+    parser.add_argument('--days', type=int, default=30, help='Количество дней для анализа (по умолчанию 30)')
+    parser.add_argument('--db-file', type=str, default='git_history.db', help='Имя файла базы данных (по умолчанию git_history.db)')
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE,
+                        help=f'Commits per transaction during bulk load (default: {BULK_BATCH_SIZE})')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Worker processes for parsing git log; 0 - one per CPU (default: 1)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Load only commits added since the previous --incremental run '
+                             '(the first run loads the --days window)')
+    parser.add_argument('--ref', default='HEAD', help='Branch or revision for --incremental (default: HEAD)')
+    parser.add_argument('--modules-file', default=MODULES_FILE,
+                        help=f'Path-to-module mapping for churn rollups (default: {MODULES_FILE})')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help='Rebuild churn rollups over the whole history, e.g. after editing the modules file')
+    parser.add_argument('--repos', nargs='+', metavar='[NAME=]PATH',
+                        help='Ingest several repositories into one database; NAME defaults to the directory name')
+    parser.add_argument('--include-merges', action='store_true',
+                        help='Also load merge commits (by default they are skipped, as with git log --no-merges)')
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    global include_merges
+    include_merges = args.include_merges
+
     # Проверяем, является ли указанный путь Git-репозиторием
-    repo_path = "/Users/sergeykanaykin/Documents/Work/homescapes"
-    db_file = "git_history.db"
-    days = 50
-    if repo_path:
-        if not os.path.exists(os.path.join(repo_path, '.git')):
-            print(f"Ошибка: {repo_path} не является Git-репозиторием")
+    repo_path = args.repo_path
+    db_file = args.db_file
+    days = args.days
+    repositories = [parse_repository_spec(spec) for spec in args.repos or []]
+    for path in [repo_path] if repo_path else [path for _, path in repositories]:
+        if not os.path.exists(os.path.join(path, '.git')):
+            print(f"Ошибка: {path} не является Git-репозиторием")
             sys.exit(1)
-    
-    # Создаем базу данных
-    connection = create_database(db_file)
-    
-    # Получаем историю Git
-    commits = get_git_history(days, repo_path)
-    
-    # Сохраняем в базу данных
-    save_to_database(connection, commits)
-    
-    # Выводим статистику
-    cursor = connection.cursor()
-    cursor.execute("SELECT COUNT(*) FROM commits")
-    commit_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM commit_files")
-    file_count = cursor.fetchone()[0]
-    
-    print(f"\nСтатистика:")
-    print(f"Количество коммитов: {commit_count}")
-    print(f"Количество измененных файлов: {file_count}")
-    
-    connection.close()
+    names = [name for name, _ in repositories]
+    if len(set(names)) != len(names):
+        parser.error("--repos: repository names must be unique")
+
+    with profile_session(args.profile):
+        # Команды авторов по users.csv, если он есть рядом со скриптом запуска
+        if os.path.exists(os.path.join(ORIGINAL_DIRECTORY, USERS_FILE)):
+            load_users_csv(USERS_FILE)
+        if os.path.exists(os.path.join(ORIGINAL_DIRECTORY, args.modules_file)):
+            load_modules_csv(args.modules_file)
+
+        # Создаем базу данных
+        connection = create_database(db_file)
+
+        since_date = _since_date(days)
+        if repositories:
+            ingest_repositories(connection, repositories, {"since": since_date}, jobs=args.jobs or os.cpu_count() or 1,
+                                batch_size=args.batch_size, ref=args.ref if args.incremental else None)
+        else:
+            # Без --repos история пишется в репозиторий по умолчанию
+            history_db.register_repository(connection, path=os.path.abspath(repo_path or "."))
+            if args.incremental:
+                ingest_incremental(connection, args.ref, {"since": since_date}, jobs=args.jobs or os.cpu_count() or 1,
+                                   repo_path=repo_path, batch_size=args.batch_size)
+            elif args.jobs == 1:
+                # Загружаем историю Git потоком
+                load_git_history(connection, {"since": since_date}, repo_path=repo_path, batch_size=args.batch_size)
+            else:
+                parse_git_log_parallel(connection, {"since": since_date}, jobs=args.jobs or None,
+                                       repo_path=repo_path, batch_size=args.batch_size)
+
+        if args.rebuild_rollups:
+            churn.rebuild_rollups(connection, module_mapper)
+        else:
+            # Сводки базы, обновленной со старой схемы, строятся даже без новых коммитов
+            churn.update_rollups(connection, (), module_mapper)
+
+        # Выводим статистику
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM commits")
+        commit_count = cursor.fetchone()[0]
+
+        cursor.execute("SELECT COUNT(*) FROM commit_files")
+        file_count = cursor.fetchone()[0]
+
+        print(f"\nСтатистика:")
+        print(f"Количество коммитов: {commit_count}")
+        print(f"Количество измененных файлов: {file_count}")
+
+        connection.close()
+        if user_mapping:
+            save_unknown_users(UNKNOWN_USERS_FILE)
 
 if __name__ == "__main__":
     main()
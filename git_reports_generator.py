@@ -1,12 +1,13 @@
 import os
 import csv
-import sqlite3
 import sys
 from pathlib import Path
 from argparse import ArgumentParser
 from gen_graph_gs import gen_report_new  # Предполагается, что `main` – это основная функция из `gen_graph.py`
 
-from deserializer import JsonDeserializer
+from snapshot import load_project_snapshot
+import history_db
+from profiling import add_profile_argument, profile_session
 from project import Project
 from module import Module
 
@@ -121,7 +122,7 @@ def get_teams_from_db(database_path):
         print(f"Ошибка: Не удалось найти базу данных {database_path}.")
         sys.exit(1)
 
-    conn = sqlite3.connect(database_path)
+    conn = history_db.connect(database_path)
     cursor = conn.cursor()
     cursor.execute("SELECT DISTINCT author_team FROM commits WHERE author_team IS NOT NULL AND author_team != '';")
     teams = [row[0] for row in cursor.fetchall()]
@@ -194,6 +195,9 @@ if __name__ == "__main__":
 
 # Получаем аргументы
     # args = parser.parse_args()
+    parser = ArgumentParser(description="Генерация отчетов для модулей из Git-репозитория.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
 
     # Получаем значения аргументов
     # modules_file = args.modules_file
@@ -214,19 +218,20 @@ if __name__ == "__main__":
     # Проверяем файл modules.csv
     # validate_modules_file(modules_file)
 
-    # Загружаем данные о модулях
-    try:
-        project = JsonDeserializer.deserialize("result.json")
-        print(f"Loaded project with {len(project.modules)} modules")
-    except Exception as e:
-        print(f"Error loading project: {e}")
-        sys.exit(1)
+    with profile_session(args.profile):
+        # Загружаем данные о модулях
+        try:
+            project = load_project_snapshot("result.snapshot", "result.json")
+            print(f"Loaded project with {len(project.modules)} modules")
+        except Exception as e:
+            print(f"Error loading project: {e}")
+            sys.exit(1)
 
-    # Создаём директорию отчётов
-    create_output_dir(output_dir)
+        # Создаём директорию отчётов
+        create_output_dir(output_dir)
 
-    # Обрабатываем модули из файла modules.csv
-    process_modules_file(project, output_dir, since, until)
+        # Обрабатываем модули из файла modules.csv
+        process_modules_file(project, output_dir, since, until)
 
     # Генерируем итоговый HTML-отчёт (общий граф)
     # generate_index_report(output_dir, git_root, since, until)
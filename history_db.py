@@ -0,0 +1,404 @@
+from __future__ import annotations
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+import sqlite3
+import logging
+
+# Версия схемы базы истории (PRAGMA user_version). Версия 1 - исходная
+# схема git2sqlite: хеш коммита как ключ, дата строкой, имя файла в каждой строке
+SCHEMA_VERSION = 7
+
+# Репозиторий, в который пишет загрузка без явного имени репозитория
+# и в который переносятся данные баз до версии 5
+DEFAULT_REPOSITORY = "default"
+
+# Таблицы схемы: авторы и файлы вынесены в справочники, ключи целочисленные,
+# время коммита хранится в секундах Unix (UTC). commits.author_team - команда
+# автора по users.csv на момент загрузки коммита. Коммиты, файлы и состояние
+# загрузки привязаны к репозиторию (repo_id), пути файлов и хеши коммитов
+# уникальны в его пределах: форк может содержать те же коммиты
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS repositories (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE,
+        path TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS authors (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        email TEXT UNIQUE,
+        team TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        repo_id INTEGER,
+        path TEXT,
+        UNIQUE (repo_id, path),
+        FOREIGN KEY (repo_id) REFERENCES repositories(id)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS commits (
+        id INTEGER PRIMARY KEY,
+        hash TEXT,
+        summary TEXT,
+        author_id INTEGER,
+        author_team TEXT,
+        commit_time INTEGER,
+        repo_id INTEGER,
+        UNIQUE (repo_id, hash),
+        FOREIGN KEY (author_id) REFERENCES authors(id),
+        FOREIGN KEY (repo_id) REFERENCES repositories(id)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS commit_files (
+        commit_id INTEGER,
+        file_id INTEGER,
+        added INT,
+        deleted INT,
+        repo_id INTEGER,
+        FOREIGN KEY (commit_id) REFERENCES commits(id),
+        FOREIGN KEY (file_id) REFERENCES files(id)
+    );
+    """,
+    # Переименования файлов в порядке загрузки (от новых коммитов к старым)
+    """
+    CREATE TABLE IF NOT EXISTS renames (
+        commit_id INTEGER,
+        old_file_id INTEGER,
+        new_file_id INTEGER,
+        FOREIGN KEY (commit_id) REFERENCES commits(id)
+    );
+    """,
+    # Последний загруженный коммит каждой ветки для инкрементальной загрузки
+    """
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        repo_id INTEGER,
+        ref TEXT,
+        tip TEXT,
+        updated_at INTEGER,
+        PRIMARY KEY (repo_id, ref)
+    );
+    """,
+    # Сводки изменений (churn): суммы строк и число коммитов по файлу и дню,
+    # модулю и дню, автору, модулю и неделе. day и week - начало суток и
+    # недели (понедельник) UTC в секундах Unix. Заполняются модулем churn
+    """
+    CREATE TABLE IF NOT EXISTS churn_file_day (
+        file_id INTEGER,
+        day INTEGER,
+        added INTEGER,
+        deleted INTEGER,
+        commits INTEGER,
+        PRIMARY KEY (file_id, day)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS churn_module_day (
+        repo_id INTEGER,
+        module TEXT,
+        day INTEGER,
+        added INTEGER,
+        deleted INTEGER,
+        commits INTEGER,
+        PRIMARY KEY (repo_id, module, day)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS churn_author_module_week (
+        author_id INTEGER,
+        repo_id INTEGER,
+        module TEXT,
+        week INTEGER,
+        added INTEGER,
+        deleted INTEGER,
+        commits INTEGER,
+        PRIMARY KEY (author_id, repo_id, module, week)
+    ) WITHOUT ROWID;
+    """,
+]
+
+# Индексы: окно по времени, история файла и состав коммита. Индекс по
+# commit_time содержит rowid (id) коммита, а индексы commit_files - обе
+# стороны связи, поэтому соединения читают только индексы
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS commits_time ON commits (commit_time);",
+    "CREATE INDEX IF NOT EXISTS commits_repo_time ON commits (repo_id, commit_time);",
+    "CREATE INDEX IF NOT EXISTS commit_files_file ON commit_files (file_id, commit_id);",
+    "CREATE INDEX IF NOT EXISTS commit_files_commit ON commit_files (commit_id, file_id);",
+    # Выборка сводок за период
+    "CREATE INDEX IF NOT EXISTS churn_file_day_day ON churn_file_day (day);",
+    "CREATE INDEX IF NOT EXISTS churn_module_day_day ON churn_module_day (day);",
+    "CREATE INDEX IF NOT EXISTS churn_author_module_week_week ON churn_author_module_week (week);",
+]
+
+
+def to_epoch(value) -> Optional[int]:
+    """
+    Переводит время в секунды Unix
+
+    Принимает число, datetime или строку: ISO 8601 (git log --date=iso-strict, %aI),
+    формат git log --date=iso ("2025-04-11 17:21:53 +0200"), дату или дату со
+    временем без часового пояса (считается локальным временем).
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    text = str(value).strip()
+    if text.lstrip("-").isdigit():
+        return int(text)
+    try:
+        return int(datetime.strptime(text, "%Y-%m-%d %H:%M:%S %z").timestamp())
+    except ValueError:
+        return int(datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp())
+
+
+def time_window(since=None, until=None, column: str = "commits.commit_time") -> Tuple[str, List[int]]:
+    """
+    Условие SQL для окна по времени коммита
+
+    Returns:
+        Tuple[str, List[int]]: Фрагмент вида " AND column >= ?" (пустой, если
+            границ нет) и параметры для него
+    """
+    condition = ""
+    params = []
+    if since:
+        condition += f" AND {column} >= ?"
+        params.append(to_epoch(since))
+    if until:
+        condition += f" AND {column} <= ?"
+        params.append(to_epoch(until))
+    return condition, params
+
+
+def repository_filter(repository=None, column: str = "commits.repo_id") -> Tuple[str, List[str]]:
+    """
+    Условие SQL для выбора одного репозитория по имени
+
+    Returns:
+        Tuple[str, List[str]]: Фрагмент вида " AND column = (...)" (пустой, если
+            репозиторий не указан) и параметры для него
+    """
+    if not repository:
+        return "", []
+    return f" AND {column} = (SELECT id FROM repositories WHERE name = ?)", [repository]
+
+
+def register_repository(connection: sqlite3.Connection, name: str = DEFAULT_REPOSITORY,
+                        path: Optional[str] = None) -> int:
+    """
+    Идентификатор репозитория по имени; новый репозиторий добавляется
+
+    Args:
+        name: Имя репозитория в базе
+        path: Путь к рабочей копии; если указан, сохраняется в repositories.path
+    """
+    row = connection.execute("SELECT id, path FROM repositories WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        repo_id = connection.execute("INSERT INTO repositories (name, path) VALUES (?, ?)", (name, path)).lastrowid
+    else:
+        repo_id = row[0]
+        if path and path != row[1]:
+            connection.execute("UPDATE repositories SET path = ? WHERE id = ?", (path, repo_id))
+    connection.commit()
+    return repo_id
+
+
+def _table_columns(connection: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+
+
+def schema_version(connection: sqlite3.Connection) -> int:
+    """Версия схемы базы: 0 - пустая база, 1 - исходная схема git2sqlite"""
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0:
+        columns = _table_columns(connection, "commits")
+        if "commit_date" in columns or "author_when" in columns:
+            return 1
+    return version
+
+
+def _migrate_from_v1(connection: sqlite3.Connection) -> None:
+    """Переносит данные из исходной схемы в нормализованную"""
+    commit_columns = _table_columns(connection, "commits")
+    date_column = "commit_date" if "commit_date" in commit_columns else "author_when"
+    team_column = "MAX(author_team)" if "author_team" in commit_columns else "NULL"
+    has_renames = bool(_table_columns(connection, "renames"))
+
+    connection.create_function("to_epoch", 1, to_epoch, deterministic=True)
+    connection.execute("ALTER TABLE commits RENAME TO commits_v1")
+    connection.execute("ALTER TABLE commit_files RENAME TO commit_files_v1")
+    if has_renames:
+        connection.execute("ALTER TABLE renames RENAME TO renames_v1")
+    for statement in TABLES:
+        connection.execute(statement)
+
+    connection.execute(f"""
+        INSERT INTO authors (name, email, team)
+        SELECT MAX(author_name), author_email, {team_column}
+        FROM commits_v1
+        GROUP BY author_email
+    """)
+    connection.execute("""
+        INSERT INTO files (path)
+        SELECT DISTINCT filename FROM commit_files_v1
+    """)
+    commit_team = "c.author_team" if "author_team" in commit_columns else "a.team"
+    connection.execute(f"""
+        INSERT INTO commits (hash, summary, author_id, author_team, commit_time)
+        SELECT c.id, c.summary, a.id, {commit_team}, to_epoch(c.{date_column})
+        FROM commits_v1 c
+        LEFT JOIN authors a ON a.email = c.author_email
+        ORDER BY c.rowid
+    """)
+    connection.execute("""
+        INSERT INTO commit_files (commit_id, file_id, added, deleted)
+        SELECT c.id, f.id, cf.added, cf.deleted
+        FROM commit_files_v1 cf
+        JOIN commits c ON c.hash = cf.commit_id
+        JOIN files f ON f.path = cf.filename
+        ORDER BY cf.rowid
+    """)
+    if has_renames:
+        connection.execute("""
+            INSERT INTO files (path)
+            SELECT name FROM (SELECT old_name AS name FROM renames_v1 UNION SELECT new_name FROM renames_v1)
+            WHERE name NOT IN (SELECT path FROM files)
+        """)
+        connection.execute("""
+            INSERT INTO renames (commit_id, old_file_id, new_file_id)
+            SELECT c.id, old_file.id, new_file.id
+            FROM renames_v1 r
+            JOIN commits c ON c.hash = r.commit_id
+            JOIN files old_file ON old_file.path = r.old_name
+            JOIN files new_file ON new_file.path = r.new_name
+            ORDER BY r.rowid
+        """)
+        connection.execute("DROP TABLE renames_v1")
+    connection.execute("DROP TABLE commit_files_v1")
+    connection.execute("DROP TABLE commits_v1")
+
+
+def _add_author_team(connection: sqlite3.Connection) -> None:
+    """Версия 4: команда автора в commits, для старых коммитов - из authors"""
+    connection.execute("ALTER TABLE commits ADD COLUMN author_team TEXT")
+    connection.execute("""
+        UPDATE commits
+        SET author_team = (SELECT team FROM authors WHERE authors.id = commits.author_id)
+    """)
+
+
+def _rebuild_table(connection: sqlite3.Connection, table: str, select: str) -> None:
+    """Пересоздает таблицу по описанию из TABLES, перенося строки запросом select"""
+    statement = next(statement for statement in TABLES if f"EXISTS {table} (" in statement)
+    connection.execute(statement.replace(f"EXISTS {table} (", f"EXISTS {table}_new ("))
+    connection.execute(f"INSERT INTO {table}_new {select}")
+    connection.execute(f"DROP TABLE {table}")
+    connection.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+def _add_repositories(connection: sqlite3.Connection) -> None:
+    """
+    Версия 5: repo_id в commits, commit_files, files и ingest_state
+
+    Уникальность путей файлов и ключ ingest_state включают репозиторий,
+    поэтому эти таблицы пересоздаются.
+    """
+    connection.execute("ALTER TABLE commits ADD COLUMN repo_id INTEGER")
+    connection.execute("ALTER TABLE commit_files ADD COLUMN repo_id INTEGER")
+    _rebuild_table(connection, "files", "(id, path) SELECT id, path FROM files")
+    if _table_columns(connection, "ingest_state"):
+        _rebuild_table(connection, "ingest_state",
+                       "(ref, tip, updated_at) SELECT ref, tip, updated_at FROM ingest_state")
+
+
+def _scope_commit_hashes(connection: sqlite3.Connection) -> None:
+    """Версия 7: хеш коммита уникален в пределах репозитория, а не всей базы"""
+    _rebuild_table(connection, "commits",
+                   "(id, hash, summary, author_id, author_team, commit_time, repo_id) "
+                   "SELECT id, hash, summary, author_id, author_team, commit_time, repo_id FROM commits")
+
+
+def _assign_default_repository(connection: sqlite3.Connection) -> None:
+    """Относит данные, загруженные до версии 5, к репозиторию по умолчанию"""
+    if connection.execute("SELECT 1 FROM commits WHERE repo_id IS NULL LIMIT 1").fetchone() is None:
+        return
+    connection.execute("INSERT OR IGNORE INTO repositories (name) VALUES (?)", (DEFAULT_REPOSITORY,))
+    repo_id = connection.execute("SELECT id FROM repositories WHERE name = ?", (DEFAULT_REPOSITORY,)).fetchone()[0]
+    for table in ("commits", "commit_files", "files", "ingest_state"):
+        connection.execute(f"UPDATE {table} SET repo_id = ? WHERE repo_id IS NULL", (repo_id,))
+
+
+def ensure_schema(connection: sqlite3.Connection) -> None:
+    """
+    Создает таблицы и индексы или обновляет схему существующей базы
+
+    Миграция выполняется одной транзакцией: при ошибке база остается
+    в исходной схеме. Таблицы и индексы, появившиеся в более поздних
+    версиях схемы, создаются при обновлении с любой версии.
+    """
+    version = schema_version(connection)
+    if version == SCHEMA_VERSION:
+        return
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Версия схемы базы истории {version} новее поддерживаемой ({SCHEMA_VERSION})")
+
+    try:
+        connection.execute("BEGIN")
+        if version == 1:
+            logging.info("Миграция базы истории на схему версии %d", SCHEMA_VERSION)
+            _migrate_from_v1(connection)
+        elif version > 1:
+            if "author_team" not in _table_columns(connection, "commits"):
+                _add_author_team(connection)
+            if "repo_id" not in _table_columns(connection, "commits"):
+                _add_repositories(connection)
+            if version < 7:
+                _scope_commit_hashes(connection)
+        for statement in TABLES:
+            connection.execute(statement)
+        if version > 0:
+            _assign_default_repository(connection)
+        for statement in INDEXES:
+            connection.execute(statement)
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+def connect(database: str | Path) -> sqlite3.Connection:
+    """
+    Открывает базу истории только для чтения (для отчетов)
+
+    База не создается и не обновляется: создание и миграция схемы
+    выполняются только загрузкой (git2sqlite.py, ensure_schema).
+
+    Raises:
+        FileNotFoundError: Базы нет
+        RuntimeError: Версия схемы базы отличается от SCHEMA_VERSION
+    """
+    path = Path(database)
+    if not path.is_file():
+        raise FileNotFoundError(f"База истории {database} не найдена")
+    connection = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    version = schema_version(connection)
+    if version != SCHEMA_VERSION:
+        connection.close()
+        if version == 0:
+            raise RuntimeError(f"{database} не является базой истории git2sqlite.py")
+        raise RuntimeError(f"Версия схемы базы истории {database}: {version}, поддерживается {SCHEMA_VERSION}; "
+                           f"обновите базу запуском git2sqlite.py")
+    return connection
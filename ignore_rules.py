@@ -0,0 +1,199 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+import os
+import re
+import logging
+
+GITIGNORE = ".gitignore"
+
+# Директории, которые не сканируются никогда
+DEFAULT_PATTERNS = [".git/"]
+
+
+def _translate(pattern: str) -> str:
+    """Переводит glob-шаблон .gitignore в регулярное выражение"""
+    result = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                at_start = i == 0 or pattern[i - 1] == "/"
+                if at_start and pattern.startswith("**/", i):
+                    # "**/" - ноль или больше директорий
+                    result.append("(?:.*/)?")
+                    i += 3
+                    continue
+                if at_start and i + 2 == n:
+                    # "/**" в конце - все внутри
+                    result.append(".*")
+                    i += 2
+                    continue
+                result.append("[^/]*")
+                i += 2
+                continue
+            result.append("[^/]*")
+        elif c == "?":
+            result.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern.startswith("[!", i) or pattern.startswith("[^", i) else i + 1)
+            if end == -1:
+                result.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                result.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(c))
+        i += 1
+    return "".join(result)
+
+
+class IgnorePattern:
+    """Одно скомпилированное правило в формате .gitignore"""
+
+    __slots__ = ("negate", "dir_only", "anchored", "regex")
+
+    def __init__(self, negate: bool, dir_only: bool, anchored: bool, regex: re.Pattern):
+        self.negate = negate
+        self.dir_only = dir_only
+        self.anchored = anchored
+        self.regex = regex
+
+    @classmethod
+    def parse(cls, line: str) -> Optional[IgnorePattern]:
+        """Разбирает строку .gitignore; возвращает None для пустых строк и комментариев"""
+        line = line.rstrip("\n\r")
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if not line or line.startswith("#"):
+            return None
+
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\!") or line.startswith("\\#"):
+            line = line[1:]
+
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+
+        # Шаблон со слешем в начале или в середине привязан к базовой директории,
+        # без слеша - сравнивается с именем на любой глубине
+        anchored = "/" in line
+        line = line.lstrip("/")
+        return cls(negate, dir_only, anchored, re.compile(_translate(line) + r"\Z"))
+
+    def matches(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            return self.regex.match(rel_path) is not None
+        return self.regex.match(name) is not None
+
+
+class IgnoreRules:
+    """
+    Набор правил .gitignore, привязанный к базовой директории.
+
+    Правила применяются к путям внутри base; внутри набора побеждает
+    последнее совпавшее правило, как в git.
+    """
+
+    def __init__(self, base: str | Path, patterns: Iterable[str]):
+        """
+        Args:
+            base: Директория, относительно которой заданы шаблоны
+            patterns: Строки в формате .gitignore
+        """
+        self.base = os.path.normpath(str(base))
+        self._prefix = self.base.rstrip(os.sep) + os.sep
+        parsed = (IgnorePattern.parse(line) for line in patterns)
+        # Храним в обратном порядке, чтобы первое совпадение было последним правилом
+        self._patterns: List[IgnorePattern] = [p for p in parsed if p is not None][::-1]
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> IgnoreRules:
+        """Читает правила из файла .gitignore (база - директория файла)"""
+        path = Path(path)
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return cls(path.parent, f.readlines())
+        except OSError as e:
+            logging.warning(f"Не удалось прочитать {path}: {e}")
+            return cls(path.parent, [])
+
+    def __bool__(self) -> bool:
+        return bool(self._patterns)
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Проверяет путь по правилам набора
+
+        Args:
+            path: Нормализованный абсолютный путь
+            is_dir: Является ли путь директорией
+
+        Returns:
+            Optional[bool]: True - игнорировать, False - явно включен (!шаблон),
+                None - правила набора к пути не относятся
+        """
+        if not path.startswith(self._prefix):
+            return None
+        rel_path = path[len(self._prefix):]
+        if os.sep != "/":
+            rel_path = rel_path.replace(os.sep, "/")
+        name = rel_path.rsplit("/", 1)[-1]
+        for pattern in self._patterns:
+            if pattern.matches(rel_path, name, is_dir):
+                return not pattern.negate
+        return None
+
+
+def is_ignored(rules: Sequence[IgnoreRules], path: str, is_dir: bool) -> bool:
+    """
+    Проверяет путь по цепочке наборов правил
+
+    Наборы идут от внешних директорий к вложенным: решение более глубокого
+    .gitignore перекрывает решение внешнего.
+    """
+    for rule_set in reversed(rules):
+        decision = rule_set.match(path, is_dir)
+        if decision is not None:
+            return decision
+    return False
+
+
+def load_parent_gitignores(root_dir: str, directory: str) -> Tuple[IgnoreRules, ...]:
+    """
+    Загружает .gitignore из root_dir и всех директорий между ним и directory
+    (саму directory не включая)
+    """
+    root_dir = os.path.normpath(root_dir)
+    directory = os.path.normpath(directory)
+    if directory != root_dir and not directory.startswith(root_dir.rstrip(os.sep) + os.sep):
+        return ()
+    parents = []
+    current = os.path.dirname(directory)
+    while directory != root_dir and current.startswith(root_dir):
+        parents.append(current)
+        if current == root_dir:
+            break
+        current = os.path.dirname(current)
+    rules = []
+    for parent in reversed(parents):
+        gitignore = os.path.join(parent, GITIGNORE)
+        if os.path.isfile(gitignore):
+            rule_set = IgnoreRules.from_file(gitignore)
+            if rule_set:
+                rules.append(rule_set)
+    return tuple(rules)
@@ -11,16 +11,24 @@ from datetime import datetime
 from project import Project
 from module import Module
 from file_info import FileInfo
-from visitors import TextVisitor, JsonVisitor, DetailedTextVisitor
+from visitors import TextVisitor, JsonVisitor, DetailedTextVisitor, StreamingJsonVisitor
+from snapshot import SnapshotVisitor
+from project_diff import diff_files
+from profiling import PROFILER, add_profile_argument, profile_session
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+# Файл кеша сканирования по умолчанию (рядом с architecture.json)
+DEFAULT_SCAN_CACHE = "scan_cache.db"
+
+
+def configure_logging(verbose: bool = False) -> None:
+    """Настройка логирования; DEBUG только по --verbose"""
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler()
+        ]
+    )
 
 def find_modules_by_owner(project: Project, owner: str) -> List[Module]:
     """Находит все модули, принадлежащие указанному владельцу"""
@@ -75,11 +83,12 @@ def get_files_data(project: Project, module_filter: Optional[str] = None) -> dic
     # Используем JsonVisitor для получения данных
     visitor = JsonVisitor()
     project.accept(visitor)
-    result = json.loads(visitor.get_result())
+    result = visitor.get_data()
     logging.debug(f"Собрано модулей: {len(result.get('modules', []))}")
     return result
 
 
+@PROFILER.profiled("architecture.load")
 def load_project(json_path: str) -> Project:
     logging.info(f"Загрузка проекта из файла: {json_path}")
     # Если путь не абсолютный, ищем относительно директории скрипта
@@ -116,20 +125,71 @@ def load_project(json_path: str) -> Project:
     return project
 
 
+def run_diff(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Сравнивает два снимка проекта и выводит разницу"""
+    if len(args.snapshots) != 2:
+        parser.error("diff requires two snapshot files: OLD NEW")
+    if args.format not in ("text", "json"):
+        parser.error("diff supports only text and json formats")
+    old_path, new_path = args.snapshots
+    logging.info(f"Сравнение снимков {old_path} и {new_path}")
+    diff = diff_files(old_path, new_path)
+
+    if args.format == "json":
+        result = json.dumps(diff.to_dict(), indent=None if args.compact else 2, ensure_ascii=False)
+    else:
+        result = diff.format_text()
+
+    if args.output:
+        logging.info(f"Сохранение результата в файл: {args.output}")
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result)
+    else:
+        print(result)
+
+
 def main():
-    logging.info("Запуск программы")
     parser = argparse.ArgumentParser(description="Architecture analysis tool")
-    parser.add_argument("command", choices=["files"], help="Command to execute")
-    parser.add_argument("--format", choices=["text", "json", "detailed"], default="text", 
-                      help="Output format (text=simple format, detailed=detailed format, json=JSON format)")
+    parser.add_argument("command", choices=["files", "diff"], help="Command to execute")
+    parser.add_argument("snapshots", nargs="*", metavar="SNAPSHOT",
+                      help="Old and new result.json or snapshot files (diff command only)")
+    parser.add_argument("--format", choices=["text", "json", "detailed", "snapshot"], default="text", 
+                      help="Output format (text=simple format, detailed=detailed format, json=JSON format, "
+                           "snapshot=binary memory-mappable snapshot)")
     parser.add_argument("--output", help="Output file path")
-    
-    # Отладочный вывод
-    print("sys.argv:", sys.argv)
-    
+    parser.add_argument("--compact", action="store_true",
+                      help="Write JSON without indentation (json format only)")
+    parser.add_argument("--relative-paths", action="store_true",
+                      help="Store file paths relative to root_directory through a shared directory table "
+                           "(json format only)")
+    parser.add_argument("--jobs", type=int, default=1,
+                      help="Number of threads used to list directories while scanning (default: 1)")
+    parser.add_argument("--backend", choices=["fs", "git"], default="fs",
+                      help="File enumeration backend (fs=walk the filesystem, git=tracked files from git ls-files)")
+    parser.add_argument("--no-gitignore", action="store_true",
+                      help="Do not prune directories and files matched by .gitignore rules")
+    parser.add_argument("--scan-cache", nargs="?", const=DEFAULT_SCAN_CACHE, default=None,
+                      help=f"Reuse directory listings from a persistent scan cache "
+                           f"(default file when no path is given: {DEFAULT_SCAN_CACHE} next to architecture.json)")
+    parser.add_argument("--verbose", action="store_true", help="Enable DEBUG logging")
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    configure_logging(args.verbose)
+    logging.info("Запуск программы")
+    # Отладочный вывод: в stderr, stdout может занимать бинарный снимок
+    logging.debug(f"sys.argv: {sys.argv}")
     logging.info(f"Аргументы командной строки: {args}")
-    
+
+    with profile_session(args.profile):
+        if args.command == "diff":
+            run_diff(parser, args)
+        else:
+            run_files(args)
+
+
+def run_files(args: argparse.Namespace) -> None:
+    """Сканирует модули из architecture.json и выводит результат"""
     # Load project
     project = load_project("architecture.json")
     logging.info(f"Проект загружен: {project.name}")
@@ -138,17 +198,61 @@ def main():
     root_dir = Path(project.root_directory) if hasattr(project, 'root_directory') else Path.cwd()
     logging.debug(f"Корневая директория: {root_dir}")
     
-    # Scan files in all modules
+    # Scan files in all modules and submodules with a single walk
     logging.info("Начало сканирования файлов")
-    for module in project.modules:
-        logging.debug(f"Сканирование файлов для модуля: {module.name}")
-        module.scan_files(root_dir)
-    
+    cache_path = None
+    if args.scan_cache:
+        cache_path = Path(args.scan_cache)
+        if not cache_path.is_absolute():
+            cache_path = Path(__file__).parent / cache_path
+        logging.info(f"Используется кеш сканирования: {cache_path}")
+    project.scan_files(root_dir, jobs=args.jobs, cache_path=cache_path, backend=args.backend,
+                       use_gitignore=not args.no_gitignore)
+
+    write_output(project, args, root_dir)
+    logging.info("Программа завершена")
+
+
+@PROFILER.profiled("output")
+def write_output(project: Project, args: argparse.Namespace, root_dir: Path) -> None:
+    """Выводит просканированный проект в выбранном формате"""
+    indent = None if args.compact else 2
+
+    # JSON пишется потоково прямо в файл или stdout, не собираясь в памяти целиком
+    if args.format == "json":
+        logging.info("Потоковая запись JSON")
+        if args.output:
+            logging.info(f"Сохранение результата в файл: {args.output}")
+            with open(args.output, "w", encoding="utf-8") as f:
+                visitor = StreamingJsonVisitor(f, indent=indent, relative_paths=args.relative_paths)
+                project.accept(visitor)
+                visitor.get_result()
+        else:
+            logging.info("Вывод результата в консоль")
+            visitor = StreamingJsonVisitor(sys.stdout, indent=indent, relative_paths=args.relative_paths)
+            project.accept(visitor)
+            visitor.get_result()
+            print()
+        return
+
+    # Бинарный снимок для быстрой загрузки в генераторах отчетов
+    if args.format == "snapshot":
+        if args.output:
+            logging.info(f"Сохранение снимка в файл: {args.output}")
+            with open(args.output, "wb") as f:
+                visitor = SnapshotVisitor(f)
+                project.accept(visitor)
+                visitor.get_result()
+        else:
+            visitor = SnapshotVisitor(sys.stdout.buffer)
+            project.accept(visitor)
+            visitor.get_result()
+            sys.stdout.buffer.flush()
+        return
+
     # Create appropriate visitor
     logging.info(f"Создание visitor'а для формата: {args.format}")
-    if args.format == "json":
-        visitor = JsonVisitor()
-    elif args.format == "detailed":
+    if args.format == "detailed":
         visitor = DetailedTextVisitor(root_dir)
     else:
         visitor = TextVisitor()
@@ -168,8 +272,6 @@ def main():
         logging.info("Вывод результата в консоль")
         print(result)
 
-    logging.info("Программа завершена")
-
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
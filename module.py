@@ -4,6 +4,7 @@ from typing import List, Optional, Dict, Set
 from pathlib import Path
 
 from file_info import FileInfo
+from path_table import PATH_TABLE
 import logging
 
 
@@ -16,6 +17,18 @@ class Module:
     description: Optional[str] = None
     submodules: List[Module] = None
     files: Dict[str, FileInfo] = field(default_factory=dict)  # Словарь {имя: информация о файле}
+    exclude: Optional[List[str]] = None  # Шаблоны в формате .gitignore относительно путей модуля
+
+    # Родитель и закешированные агрегаты по поддереву; сбрасываются при изменении
+    # файлов, путей или подмодулей любого модуля поддерева
+    _parent: Optional[Module] = field(default=None, init=False, repr=False, compare=False)
+    _project: Optional[object] = field(default=None, init=False, repr=False, compare=False)  # Только у модулей верхнего уровня
+    _all_files_cache: Optional[Dict[str, FileInfo]] = field(default=None, init=False, repr=False, compare=False)
+    _all_paths_cache: Optional[List[str]] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        for submodule in self.submodules or ():
+            submodule._parent = self
 
     @classmethod
     def from_dict(cls, data: dict) -> Module:
@@ -30,70 +43,102 @@ class Module:
             owners=data.get("owners"),
             description=data.get("description"),
             submodules=submodules,
-            files={}
+            files={},
+            exclude=data.get("exclude")
         )
     
-    def scan_files(self, root_dir: Optional[Path] = None) -> None:
+    def scan_files(self, root_dir: Optional[Path] = None, jobs: int = 1) -> None:
         """
-        Сканирует файлы в путях модуля
+        Сканирует файлы в путях модуля и его подмодулей
         
         Args:
             root_dir: Корневая директория проекта (опционально)
+            jobs: Количество потоков для чтения директорий
         """
-        if root_dir is None:
-            root_dir = Path.cwd()
-        
-        for path_str in self.paths:
-            path = Path(path_str)
-            if not path.is_absolute():
-                path = root_dir / path
-            
-            if path.is_file():
-                self._add_file(path)
-            elif path.is_dir():
-                for file_path in path.rglob("*"):
-                    if file_path.is_file():
-                        self._add_file(file_path)
-
-    def _add_file(self, path: Path) -> None:
+        from scanner import ProjectScanner
+
+        ProjectScanner([self], root_dir, jobs=jobs).scan()
+
+    def _add_file(self, path: str | Path, check_exists: bool = True) -> None:
         """
         Добавляет файл в словарь файлов модуля
         
         Args:
             path: Путь к файлу
+            check_exists: Проверять ли существование файла (сканер уже знает, что файл есть)
         """
-        if not path or not path.exists():
+        if not path or (check_exists and not Path(path).exists()):
             logging.warning(f"Attempted to add invalid path: {path}")
             return
 
-        file_name = path.name
-        if file_name not in self.files:
-            self.files[file_name] = FileInfo(file_name)
-        self.files[file_name].add_path(path)
+        ref = PATH_TABLE.intern(path)
+        file_name = PATH_TABLE.name(ref)
+        file_info = self.files.get(file_name)
+        if file_info is None:
+            file_info = self.files[file_name] = FileInfo(file_name)
+        file_info.add_ref(ref)
+        self._invalidate()
         logging.debug(f"Added file {file_name} with path {path} to module {self.name}")
 
+    def _invalidate(self) -> None:
+        """Сбрасывает закешированные агрегаты модуля и всех его предков"""
+        module = self
+        # Агрегат родителя строится из агрегатов детей, поэтому если у модуля кеша
+        # нет, то его нет и выше по дереву
+        while module is not None and (module._all_files_cache is not None or module._all_paths_cache is not None):
+            module._all_files_cache = None
+            module._all_paths_cache = None
+            module = module._parent
+
+    def release_files_cache(self) -> None:
+        """
+        Освобождает закешированный агрегат файлов модуля
+
+        Для обходов, которым агрегат нужен один раз (потоковая запись JSON).
+        Вызывать в прямом порядке обхода, после родителя: агрегат родителя
+        строится из агрегатов детей, и без кеша у модуля его не должно быть
+        и выше по дереву (см. _invalidate).
+        """
+        self._all_files_cache = None
+
     def get_all_files(self) -> Dict[str, FileInfo]:
         """
         Возвращает все файлы модуля и его подмодулей
         
+        Результат кешируется до следующего изменения поддерева и разделяется
+        между вызовами, поэтому изменять его нельзя. Объекты FileInfo модуля и
+        подмодулей не изменяются: при совпадении имен создается новый FileInfo.
+        
         Returns:
             Dict[str, FileInfo]: Словарь {имя_файла: информация_о_файле}
         """
+        if self._all_files_cache is not None:
+            return self._all_files_cache
+
         result = self.files.copy()
+        merged = set()  # Имена, для которых в result уже лежит собственная копия FileInfo
         if self.submodules:
             for submodule in self.submodules:
                 for name, file_info in submodule.get_all_files().items():
-                    if name in result:
-                        for path in file_info.paths:
-                            result[name].add_path(path)
-                        else:
-                            result[name] = file_info
+                    current = result.get(name)
+                    if current is None:
+                        result[name] = file_info
+                    elif current is not file_info and not current.contains_all(file_info):
+                        if name not in merged:
+                            current = result[name] = current.copy()
+                            merged.add(name)
+                        current.merge(file_info)
+        self._all_files_cache = result
         return result
     
     def get_files_count(self) -> int:
         """
-        Возвращает количество уникальных файлов (по имени) в модуле и его подмодулях
-        
+        Возвращает количество файлов (по имени) в модуле и его подмодулях
+
+        Количества модулей суммируются: имя, встречающееся в нескольких
+        модулях поддерева, считается в каждом из них (в отличие от
+        len(get_all_files())). Агрегат файлов при этом не строится.
+
         Returns:
             int: Количество файлов
         """
@@ -117,11 +162,13 @@ class Module:
 
     def get_all_paths(self) -> List[str]:
         """Получает все пути текущего модуля и его подмодулей"""
-        result = list(self.paths)
-        if self.submodules:
-            for submodule in self.submodules:
-                result.extend(submodule.get_all_paths())
-        return result
+        if self._all_paths_cache is None:
+            result = list(self.paths)
+            if self.submodules:
+                for submodule in self.submodules:
+                    result.extend(submodule.get_all_paths())
+            self._all_paths_cache = result
+        return list(self._all_paths_cache)
 
     def get_module_hierarchy(self, level: int = 0) -> str:
         """Возвращает строковое представление иерархии модулей"""
@@ -159,11 +206,35 @@ class Module:
                 result.extend(submodule.find_by_owner(owner_email))
         return result
 
+    def _owning_project(self):
+        """Проект, в индексах которого находится модуль (через модуль верхнего уровня)"""
+        root = self
+        while root._parent is not None:
+            root = root._parent
+        return root._project
+
     def add_path(self, path: str) -> None:
+        if path in self.paths:
+            return
         self.paths.add(path)
+        self._invalidate()
+
+        # Новый путь должен попасть в индекс "путь -> модуль" проекта
+        project = self._owning_project()
+        if project is not None:
+            project._path_index.add_path(self, path)
         
     def add_submodule(self, module: 'Module') -> None:
+        if self.submodules is None:
+            self.submodules = []
         self.submodules.append(module)
+        module._parent = self
+        self._invalidate()
+
+        # Сообщаем проекту о новом поддереве, чтобы обновить его индексы
+        project = self._owning_project()
+        if project is not None:
+            project._register(module)
         
     def accept(self, visitor) -> None:
         visitor.visit_module(self) 
\ No newline at end of file
@@ -0,0 +1,186 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import os
+
+from module import Module
+
+T = TypeVar("T")
+
+
+def split_path(path: str | Path) -> List[str]:
+    """
+    Разбивает путь на сегменты
+
+    Разделители "/" и os.sep равнозначны, пустые сегменты и "." отбрасываются,
+    ".." снимает предыдущий сегмент. Для абсолютного пути первым сегментом
+    идет корень ("/" или диск).
+    """
+    path = str(path)
+    if os.sep != "/":
+        path = path.replace(os.sep, "/")
+    segments = []
+    if path.startswith("/"):
+        segments.append("/")
+    else:
+        drive, _ = os.path.splitdrive(path)
+        if drive:
+            segments.append(drive)
+            path = path[len(drive):]
+    for segment in path.split("/"):
+        if not segment or segment == ".":
+            continue
+        if segment == ".." and len(segments) > 0 and segments[-1] not in ("/", ".."):
+            segments.pop()
+            continue
+        segments.append(segment)
+    return segments
+
+
+class PathTrieNode(Generic[T]):
+    """Узел префиксного дерева путей"""
+
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: Dict[str, PathTrieNode[T]] = {}
+        self.values: List[T] = []
+
+    def child(self, segment: str) -> Optional[PathTrieNode[T]]:
+        return self.children.get(segment)
+
+
+class PathTrie(Generic[T]):
+    """
+    Префиксное дерево по сегментам пути.
+
+    Поиск владельца пути идет по сегментам сверху вниз и занимает
+    O(глубина пути) независимо от количества сохраненных путей.
+    """
+
+    def __init__(self):
+        self.root: PathTrieNode[T] = PathTrieNode()
+
+    def insert(self, path: str | Path, value: T) -> None:
+        """Привязывает значение к пути"""
+        node = self.root
+        for segment in split_path(path):
+            next_node = node.children.get(segment)
+            if next_node is None:
+                next_node = node.children[segment] = PathTrieNode()
+            node = next_node
+        node.values.append(value)
+
+    def find_node(self, path: str | Path) -> Optional[PathTrieNode[T]]:
+        """Возвращает узел, соответствующий пути, или None"""
+        node = self.root
+        for segment in split_path(path):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def iter_prefixes(self, path: str | Path) -> Iterator[Tuple[int, List[T]]]:
+        """
+        Перебирает значения всех сохраненных путей, являющихся префиксами path
+
+        Yields:
+            Tuple[int, List[T]]: Глубина префикса и привязанные к нему значения
+                (от внешних путей к вложенным)
+        """
+        node = self.root
+        if node.values:
+            yield 0, node.values
+        for depth, segment in enumerate(split_path(path), 1):
+            node = node.children.get(segment)
+            if node is None:
+                return
+            if node.values:
+                yield depth, node.values
+
+    def longest_prefix(self, path: str | Path) -> Optional[T]:
+        """Значение самого глубокого сохраненного префикса пути (последнее привязанное)"""
+        result = None
+        for _, values in self.iter_prefixes(path):
+            result = values[-1]
+        return result
+
+    def all_prefixes(self, path: str | Path) -> List[T]:
+        """Значения всех сохраненных префиксов пути, от внешних к вложенным"""
+        result = []
+        for _, values in self.iter_prefixes(path):
+            result.extend(values)
+        return result
+
+    def has_prefix(self, path: str | Path) -> bool:
+        """Есть ли среди сохраненных путей префикс path"""
+        return next(self.iter_prefixes(path), None) is not None
+
+    def iter_items(self) -> Iterator[Tuple[Tuple[str, ...], PathTrieNode[T]]]:
+        """Перебирает узлы со значениями в лексикографическом порядке сегментов"""
+        stack: List[Tuple[Tuple[str, ...], PathTrieNode[T]]] = [((), self.root)]
+        while stack:
+            segments, node = stack.pop()
+            if node.values:
+                yield segments, node
+            for name in sorted(node.children, reverse=True):
+                stack.append((segments + (name,), node.children[name]))
+
+
+class ModuleIndex:
+    """
+    Индекс "путь -> модуль" по всем paths модулей и подмодулей проекта.
+
+    Пути модулей задаются относительно root_directory, так же как имена
+    файлов в commit_files из git2sqlite. Абсолютные пути внутри root_directory
+    тоже принимаются.
+    """
+
+    def __init__(self, modules: Iterable[Module], root_dir: Optional[str | Path] = None):
+        """
+        Args:
+            modules: Модули верхнего уровня (подмодули обходятся автоматически)
+            root_dir: Корневая директория проекта для разрешения абсолютных путей
+        """
+        self._trie: PathTrie[Module] = PathTrie()
+        self._root = split_path(root_dir) if root_dir else []
+        for module in modules:
+            self.add(module)
+
+    def add(self, module: Module) -> None:
+        """Добавляет в индекс модуль и все его подмодули"""
+        # Обход в прямом порядке: подмодуль с тем же путем, что и родитель,
+        # окажется в узле позже и будет выбран как более глубокий владелец
+        stack = [module]
+        while stack:
+            module = stack.pop()
+            for path in sorted(module.paths):
+                self._trie.insert(self._relative(path), module)
+            if module.submodules:
+                stack.extend(reversed(module.submodules))
+
+    def add_path(self, module: Module, path: str | Path) -> None:
+        """Добавляет в индекс новый путь уже проиндексированного модуля"""
+        self._trie.insert(self._relative(path), module)
+
+    @classmethod
+    def from_project(cls, project) -> ModuleIndex:
+        """Строит индекс по всем модулям проекта"""
+        return cls(project.modules, project.root_directory or None)
+
+    def _relative(self, path: str | Path) -> str | Path:
+        """Отрезает root_directory у абсолютного пути"""
+        if not self._root or not os.path.isabs(str(path)):
+            return path
+        segments = split_path(path)
+        if segments[:len(self._root)] == self._root:
+            return "/".join(segments[len(self._root):])
+        return path
+
+    def resolve(self, path: str | Path) -> Optional[Module]:
+        """Самый глубокий модуль, которому принадлежит путь"""
+        return self._trie.longest_prefix(self._relative(path))
+
+    def resolve_all(self, path: str | Path) -> List[Module]:
+        """Все модули, которым принадлежит путь, от внешних к вложенным"""
+        return self._trie.all_prefixes(self._relative(path))
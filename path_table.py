@@ -0,0 +1,195 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Optional
+import os
+
+# Идентификатор пути упакован в одно 64-битное число: старшие 32 бита -
+# идентификатор директории, младшие - идентификатор имени файла
+_NAME_BITS = 32
+_NAME_MASK = (1 << _NAME_BITS) - 1
+
+
+class PathTable:
+    """
+    Таблица интернированных путей.
+
+    Каждая директория и каждое имя файла хранятся один раз, а путь
+    представляется целым числом (id директории, id имени). Объекты Path
+    создаются только по запросу при выводе.
+    """
+
+    __slots__ = ("_dirs", "_dir_ids", "_names", "_name_ids")
+
+    def __init__(self):
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._dirs) + len(self._names)
+
+    def clear(self) -> None:
+        """
+        Очищает таблицу
+
+        Выданные ранее идентификаторы становятся недействительными; нужна для
+        независимых замеров, где каждый запуск начинается с пустой таблицы.
+        """
+        self._dirs.clear()
+        self._dir_ids.clear()
+        self._names.clear()
+        self._name_ids.clear()
+
+    def _intern_name(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def _intern_dir(self, directory: str) -> int:
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self._dirs)
+            self._dirs.append(directory)
+        return dir_id
+
+    def intern_directory(self, directory: str) -> int:
+        """Возвращает идентификатор директории, добавляя ее в таблицу при необходимости"""
+        return self._intern_dir(directory)
+
+    def make_ref(self, dir_id: int, name: str) -> int:
+        """Идентификатор пути по идентификатору директории и имени файла"""
+        return (dir_id << _NAME_BITS) | self._intern_name(name)
+
+    def intern(self, path: str | Path) -> int:
+        """Возвращает идентификатор пути, добавляя его в таблицу при необходимости"""
+        directory, name = os.path.split(str(path))
+        return (self._intern_dir(directory) << _NAME_BITS) | self._intern_name(name)
+
+    def lookup(self, path: str | Path) -> Optional[int]:
+        """Возвращает идентификатор пути или None, если путь в таблицу не попадал"""
+        directory, name = os.path.split(str(path))
+        dir_id = self._dir_ids.get(directory)
+        name_id = self._name_ids.get(name)
+        if dir_id is None or name_id is None:
+            return None
+        return (dir_id << _NAME_BITS) | name_id
+
+    def name(self, ref: int) -> str:
+        """Имя файла (интернированная строка)"""
+        return self._names[ref & _NAME_MASK]
+
+    def directory(self, ref: int) -> str:
+        """Директория файла"""
+        return self._dirs[ref >> _NAME_BITS]
+
+    def to_str(self, ref: int) -> str:
+        """Полный путь строкой"""
+        return os.path.join(self._dirs[ref >> _NAME_BITS], self._names[ref & _NAME_MASK])
+
+    def to_path(self, ref: int) -> Path:
+        """Полный путь объектом Path"""
+        return Path(self.to_str(ref))
+
+
+# Общая таблица путей проекта
+PATH_TABLE = PathTable()
+
+# Ссылка на корневую директорию проекта в таблице директорий RelativePathEncoder
+ROOT_DIRECTORY = -1
+
+
+def _normalize_root(root: Optional[str]) -> str:
+    # Абсолютный путь без "..", как у путей файлов из ProjectScanner
+    return os.path.abspath(root) if root else ""
+
+
+class RelativePathEncoder:
+    """
+    Кодирует пути файлов относительно корневой директории проекта.
+
+    Каждая директория записывается в общую таблицу один раз парой
+    [индекс родителя, имя], где родитель ROOT_DIRECTORY - корень проекта,
+    а None - директория вне корня, записанная целиком. Путь файла кодируется
+    индексом директории, если имя файла совпадает с ключом в files, иначе
+    парой [индекс директории, имя].
+    """
+
+    def __init__(self, root: Optional[str], table: PathTable = PATH_TABLE):
+        """
+        Args:
+            root: Корневая директория проекта; относительный путь берется
+                от текущей директории, как при сканировании
+            table: Таблица путей, из которой берутся идентификаторы
+        """
+        self._root = _normalize_root(root)
+        self._prefix = self._root.rstrip(os.sep) + os.sep if self._root else ""
+        self._table = table
+        self.directories: List[list] = []
+        self._indexes: Dict[str, int] = {self._root: ROOT_DIRECTORY}
+        self._by_dir_id: Dict[int, int] = {}
+
+    @property
+    def root(self) -> str:
+        """Абсолютная корневая директория, относительно которой кодируются пути"""
+        return self._root
+
+    def _is_inside(self, directory: str) -> bool:
+        return directory == self._root or directory.startswith(self._prefix)
+
+    def directory(self, directory: str) -> int:
+        """Индекс директории в таблице (добавляет ее и родителей при необходимости)"""
+        index = self._indexes.get(directory)
+        if index is not None:
+            return index
+        parent, name = os.path.split(directory)
+        if name and os.path.join(parent, name) == directory and \
+                parent != directory and self._is_inside(parent):
+            entry = [self.directory(parent), name]
+        else:
+            entry = [None, directory]
+        index = self._indexes[directory] = len(self.directories)
+        self.directories.append(entry)
+        return index
+
+    def encode(self, ref: int, key: str) -> int | list:
+        """Кодирует путь из таблицы путей для файла с ключом key"""
+        dir_id = ref >> _NAME_BITS
+        index = self._by_dir_id.get(dir_id)
+        if index is None:
+            index = self._by_dir_id[dir_id] = self.directory(self._table.directory(ref))
+        name = self._table.name(ref)
+        return index if name == key else [index, name]
+
+
+class RelativePathDecoder:
+    """Восстанавливает пути, закодированные RelativePathEncoder"""
+
+    def __init__(self, root: Optional[str], directories: List[list], table: PathTable = PATH_TABLE):
+        """
+        Args:
+            root: Корневая директория проекта
+            directories: Таблица директорий из RelativePathEncoder
+            table: Таблица путей, в которую интернируются восстановленные пути
+        """
+        root = _normalize_root(root)
+        self._table = table
+        self._root_id = table.intern_directory(root)
+        full: List[str] = []
+        for parent, name in directories:
+            if parent is None:
+                full.append(name)
+            else:
+                full.append(os.path.join(root if parent == ROOT_DIRECTORY else full[parent], name))
+        self._dir_ids = [table.intern_directory(directory) for directory in full]
+
+    def decode(self, entry: int | list, key: str) -> int:
+        """Идентификатор пути в таблице путей для записи файла с ключом key"""
+        if isinstance(entry, int):
+            index, name = entry, key
+        else:
+            index, name = entry
+        dir_id = self._root_id if index == ROOT_DIRECTORY else self._dir_ids[index]
+        return self._table.make_ref(dir_id, name)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+from typing import Callable, Dict, Iterator, List, Optional
+import json
+import sys
+import time
+
+# Значение --profile без имени файла: текстовая сводка в stderr
+PROFILE_STDERR = "-"
+
+
+class _NullSpan:
+    """Пустой span для выключенного профилировщика"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler: Profiler, name: str):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self._profiler._record(self._name, time.perf_counter() - self._start)
+
+
+class _NullLaps:
+    __slots__ = ()
+
+    def lap(self, name: str) -> None:
+        return None
+
+
+_NULL_LAPS = _NullLaps()
+
+
+class _Laps:
+    __slots__ = ("_profiler", "_last")
+
+    def __init__(self, profiler: Profiler):
+        self._profiler = profiler
+        self._last = time.perf_counter()
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter()
+        self._profiler._record(name, now - self._last)
+        self._last = now
+
+
+class _SpanStats:
+    __slots__ = ("calls", "total", "max")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class Profiler:
+    """
+    Именованные интервалы (span) и счетчики этапов конвейера.
+
+    Пока профилировщик выключен, span() возвращает общий пустой контекстный
+    менеджер, а count() сразу выходит, поэтому инструментирование можно
+    оставлять в рабочем коде. Счетчики в циклах по файлам и коммитам
+    увеличиваются пачкой после цикла, а не на каждой итерации.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = Lock()
+        self._spans: Dict[str, _SpanStats] = {}
+        self._counters: Dict[str, int] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans = {}
+            self._counters = {}
+
+    def span(self, name: str):
+        """Контекстный менеджер, измеряющий время выполнения блока"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def laps(self):
+        """
+        Секундомер для последовательных этапов длинной функции: каждый
+        вызов lap(name) записывает время с предыдущего lap (или с создания)
+        """
+        if not self.enabled:
+            return _NULL_LAPS
+        return _Laps(self)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Увеличивает счетчик"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def profiled(self, name: str) -> Callable:
+        """Декоратор: каждый вызов функции измеряется как span с именем name"""
+        def decorator(function: Callable) -> Callable:
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Span(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record(self, name: str, elapsed: float) -> None:
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = _SpanStats()
+            stats.calls += 1
+            stats.total += elapsed
+            if elapsed > stats.max:
+                stats.max = elapsed
+
+    def summary(self) -> dict:
+        """Сводка в виде словаря: время в секундах по span'ам и значения счетчиков"""
+        with self._lock:
+            return {
+                "spans": {
+                    name: {"calls": stats.calls, "total": stats.total, "max": stats.max}
+                    for name, stats in self._spans.items()
+                },
+                "counters": dict(self._counters),
+            }
+
+    def format_text(self) -> str:
+        """Текстовая сводка: span'ы в порядке первого завершения, затем счетчики"""
+        summary = self.summary()
+        lines: List[str] = ["Profile:"]
+        if summary["spans"]:
+            width = max(len(name) for name in summary["spans"])
+            for name, stats in summary["spans"].items():
+                lines.append(f"  {name:<{width}}  {stats['total'] * 1000:10.1f} ms  "
+                             f"calls {stats['calls']:<6}  max {stats['max'] * 1000:.1f} ms")
+        if summary["counters"]:
+            lines.append("Counters:")
+            width = max(len(name) for name in summary["counters"])
+            for name, value in summary["counters"].items():
+                lines.append(f"  {name:<{width}}  {value}")
+        return "\n".join(lines)
+
+    def dump(self, target: str = PROFILE_STDERR) -> None:
+        """
+        Выводит сводку
+
+        Args:
+            target: "-" - текст в stderr; файл *.json - JSON; иначе текст в файл
+        """
+        if target == PROFILE_STDERR:
+            print(self.format_text(), file=sys.stderr)
+            return
+        with open(target, "w", encoding="utf-8") as f:
+            if target.endswith(".json"):
+                json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+            else:
+                f.write(self.format_text() + "\n")
+
+
+# Общий профилировщик процесса
+PROFILER = Profiler()
+
+
+def add_profile_argument(parser) -> None:
+    """Добавляет в argparse-парсер флаг --profile [FILE]"""
+    parser.add_argument("--profile", nargs="?", const=PROFILE_STDERR, default=None, metavar="FILE",
+                        help="Collect per-stage timings and counters and print a summary "
+                             "(to stderr by default; FILE.json for JSON, any other FILE for text)")
+
+
+@contextmanager
+def profile_session(target: Optional[str]) -> Iterator[Profiler]:
+    """
+    Включает профилировщик на время блока и выводит сводку в конце
+
+    Args:
+        target: Значение --profile; None - профилирование выключено
+    """
+    if target is None:
+        yield PROFILER
+        return
+    PROFILER.reset()
+    PROFILER.enable()
+    try:
+        with PROFILER.span("total"):
+            yield PROFILER
+    finally:
+        PROFILER.disable()
+        PROFILER.dump(target)
@@ -6,6 +6,9 @@ import json
 
 from module import Module
 from file_info import FileInfo
+from scanner import ProjectScanner, iter_modules
+from scan_cache import ScanCache
+from path_index import ModuleIndex
 
 
 @dataclass
@@ -42,11 +45,43 @@ class Project:
 
     def find_module(self, name: str) -> Optional[Module]:
         """Поиск модуля по имени во всем проекте"""
-        for module in self.modules:
-            found = module.find_module(name)
-            if found:
-                return found
-        return None
+        return self._name_index.get(name)
+
+    def find_by_path(self, path: str | Path) -> Optional[Module]:
+        """Самый глубокий модуль, которому принадлежит путь"""
+        return self._path_index.resolve(path)
+
+    def scan_files(self, root_dir: Optional[Path] = None, jobs: int = 1,
+                   cache_path: Optional[str | Path] = None, backend: str = "fs",
+                   use_gitignore: bool = True) -> int:
+        """
+        Сканирует файлы всех модулей и подмодулей за один обход файловой системы
+        
+        Args:
+            root_dir: Корневая директория проекта (по умолчанию root_directory)
+            jobs: Количество потоков для чтения директорий
+            cache_path: Путь к кешу сканирования; если задан, перечитываются
+                только директории с изменившимся mtime
+            backend: Источник списка файлов: "fs" - обход файловой системы,
+                "git" - файлы из индекса Git (git ls-files)
+            use_gitignore: Отсекать ли поддеревья по правилам .gitignore
+            
+        Returns:
+            int: Количество найденных файлов
+        """
+        if root_dir is None:
+            root_dir = Path(self.root_directory) if self.root_directory else Path.cwd()
+        if backend == "git":
+            return ProjectScanner(self.modules, root_dir).scan_git_index()
+        if backend != "fs":
+            raise ValueError(f"Неизвестный источник файлов: {backend}")
+        cache = ScanCache(cache_path) if cache_path else None
+        try:
+            return ProjectScanner(self.modules, root_dir, jobs=jobs, cache=cache,
+                                  use_gitignore=use_gitignore).scan()
+        finally:
+            if cache is not None:
+                cache.close()
 
     def get_all_paths(self) -> List[str]:
         """Получает все пути всех модулей проекта"""
@@ -68,12 +103,20 @@ class Project:
             result += module.get_module_hierarchy(1)
         return result
 
-    def find_by_owner(self, owner_email: str) -> List[Module]:
-        """Поиск всех модулей по владельцу во всем проекте"""
-        result = []
-        for module in self.modules:
-            result.extend(module.find_by_owner(owner_email))
-        return result
+    def find_by_owner(self, owner_email: str, ignore_case: bool = False) -> List[Module]:
+        """
+        Поиск всех модулей по владельцу во всем проекте
+        
+        Args:
+            owner_email: Email владельца
+            ignore_case: Сравнивать email без учета регистра
+            
+        Returns:
+            List[Module]: Модули в порядке обхода дерева (добавленные позже - в конце)
+        """
+        if ignore_case:
+            return list(self._owner_index_ci.get(owner_email.lower(), ()))
+        return list(self._owner_index.get(owner_email, ()))
 
     def get_files_info(self, module_filter: Optional[str] = None) -> Dict[str, Set[FileInfo]]:
         """
@@ -97,14 +140,47 @@ class Project:
         self.name = name
         self.root_directory = root_directory
         self.modules = modules or []
+
+        # Индексы для поиска за O(1); обновляются в add_module, Module.add_submodule
+        # и Module.add_path
+        self._name_index: Dict[str, Module] = {}
+        self._owner_index: Dict[str, List[Module]] = {}
+        self._owner_index_ci: Dict[str, List[Module]] = {}
+        self._path_index = ModuleIndex([], root_directory or None)
+        for module in self.modules:
+            module._project = self
+            self._register(module)
+
+    def _register(self, module: Module) -> None:
+        """Добавляет модуль и его подмодули в индексы проекта"""
+        for item in iter_modules([module]):
+            # При совпадении имен побеждает первый в порядке обхода, как и раньше
+            self._name_index.setdefault(item.name, item)
+            owners = item.owners or ()
+            for owner in dict.fromkeys(owners):
+                self._owner_index.setdefault(owner, []).append(item)
+            for owner in dict.fromkeys(owner.lower() for owner in owners):
+                self._owner_index_ci.setdefault(owner, []).append(item)
+        self._path_index.add(module)
         
     def add_module(self, module: Module) -> None:
         self.modules.append(module)
+        module._project = self
+        self._register(module)
         
     def get_total_files(self) -> int:
+        """
+        Сумма по модулям верхнего уровня числа файлов (по имени) в их поддеревьях
+
+        Совпадает с суммой len(module.get_all_files()), но агрегаты не строятся
+        и не кешируются: считаются только имена файлов.
+        """
         total = 0
         for module in self.modules:
-            total += len(module.get_all_files())
+            if module._all_files_cache is not None:
+                total += len(module._all_files_cache)
+            else:
+                total += len({name for item in iter_modules([module]) for name in item.files})
         return total
         
     def accept(self, visitor) -> None:
@@ -0,0 +1,195 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import os
+
+from project import Project
+from module import Module
+from path_table import PATH_TABLE
+from snapshot import load_project_snapshot
+from profiling import PROFILER
+
+# Разделитель имен в полном имени модуля ("Родитель/Подмодуль")
+MODULE_SEPARATOR = "/"
+
+
+def iter_qualified_modules(project: Project) -> Iterator[Tuple[str, Module]]:
+    """Перебирает модули проекта в прямом порядке обхода с полными именами"""
+    stack = [(module.name, module) for module in reversed(project.modules)]
+    while stack:
+        name, module = stack.pop()
+        yield name, module
+        for submodule in reversed(module.submodules or ()):
+            stack.append((name + MODULE_SEPARATOR + submodule.name, submodule))
+
+
+FileKey = Tuple[str, str]  # (директория относительно root_directory, имя файла)
+
+
+def map_files_to_modules(project: Project) -> Dict[FileKey, str]:
+    """
+    Сопоставляет каждому файлу самый глубокий модуль, в files которого он есть
+
+    Файлы идентифицируются путем относительно root_directory, поэтому снимки
+    одного репозитория из разных рабочих копий сравнимы. Относительная
+    директория вычисляется один раз на директорию таблицы путей.
+    """
+    root = os.path.normpath(project.root_directory) if project.root_directory else ""
+    prefix = root.rstrip(os.sep) + os.sep if root else ""
+    relative: Dict[str, str] = {}
+
+    def relative_directory(directory: str) -> str:
+        result = relative.get(directory)
+        if result is None:
+            if root and directory == root:
+                result = ""
+            elif prefix and directory.startswith(prefix):
+                result = directory[len(prefix):]
+            else:
+                result = directory
+            relative[directory] = result
+        return result
+
+    result: Dict[FileKey, str] = {}
+    # В result.json файлы подмодулей повторяются у родителя; при прямом
+    # обходе подмодуль идет после родителя и перезаписывает его
+    for name, module in iter_qualified_modules(project):
+        for file_info in module.files.values():
+            for ref in file_info.refs:
+                key = (relative_directory(PATH_TABLE.directory(ref)), PATH_TABLE.name(ref))
+                result[key] = name
+    return result
+
+
+def _key_to_path(key: FileKey) -> str:
+    return os.path.join(*key)
+
+
+@dataclass
+class ModuleChange:
+    """Изменение владельцев или путей модуля"""
+    module: str
+    old: List[str]
+    new: List[str]
+
+    @property
+    def added(self) -> List[str]:
+        return sorted(set(self.new) - set(self.old))
+
+    @property
+    def removed(self) -> List[str]:
+        return sorted(set(self.old) - set(self.new))
+
+
+@dataclass
+class ProjectDiff:
+    """Структурная разница между двумя снимками проекта"""
+    added_files: List[Tuple[str, str]] = field(default_factory=list)  # (путь, модуль)
+    removed_files: List[Tuple[str, str]] = field(default_factory=list)  # (путь, модуль)
+    moved_files: List[Tuple[str, str, str]] = field(default_factory=list)  # (путь, старый модуль, новый модуль)
+    added_modules: List[str] = field(default_factory=list)
+    removed_modules: List[str] = field(default_factory=list)
+    owner_changes: List[ModuleChange] = field(default_factory=list)
+    path_changes: List[ModuleChange] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.added_files or self.removed_files or self.moved_files or self.added_modules
+                    or self.removed_modules or self.owner_changes or self.path_changes)
+
+    def to_dict(self) -> dict:
+        """Данные для вывода в JSON"""
+        def change(item: ModuleChange) -> dict:
+            return {"module": item.module, "added": item.added, "removed": item.removed}
+
+        return {
+            "added_files": [{"path": path, "module": module} for path, module in self.added_files],
+            "removed_files": [{"path": path, "module": module} for path, module in self.removed_files],
+            "moved_files": [{"path": path, "from": old, "to": new} for path, old, new in self.moved_files],
+            "added_modules": self.added_modules,
+            "removed_modules": self.removed_modules,
+            "owner_changes": [change(item) for item in self.owner_changes],
+            "path_changes": [change(item) for item in self.path_changes],
+        }
+
+    def format_text(self) -> str:
+        """Текстовый отчет"""
+        lines = [
+            f"Files: +{len(self.added_files)} -{len(self.removed_files)} moved {len(self.moved_files)}",
+            f"Modules: +{len(self.added_modules)} -{len(self.removed_modules)}, "
+            f"owner changes {len(self.owner_changes)}, path changes {len(self.path_changes)}",
+        ]
+        sections = [
+            ("Added modules:", [f"  + {name}" for name in self.added_modules]),
+            ("Removed modules:", [f"  - {name}" for name in self.removed_modules]),
+            ("Owner changes:", [line for item in self.owner_changes for line in _change_lines(item)]),
+            ("Path changes:", [line for item in self.path_changes for line in _change_lines(item)]),
+            ("Added files:", [f"  + {path} [{module}]" for path, module in self.added_files]),
+            ("Removed files:", [f"  - {path} [{module}]" for path, module in self.removed_files]),
+            ("Moved files:", [f"  * {path}: {old} -> {new}" for path, old, new in self.moved_files]),
+        ]
+        for title, section in sections:
+            if section:
+                lines.append("")
+                lines.append(title)
+                lines.extend(section)
+        return "\n".join(lines)
+
+
+def _change_lines(item: ModuleChange) -> List[str]:
+    lines = [f"  {item.module}:"]
+    lines.extend(f"    + {value}" for value in item.added)
+    lines.extend(f"    - {value}" for value in item.removed)
+    return lines
+
+
+@PROFILER.profiled("diff")
+def diff_projects(old: Project, new: Project) -> ProjectDiff:
+    """
+    Сравнивает два проекта
+
+    Файлы и модули сопоставляются хеш-соединением по относительному пути
+    и полному имени модуля, поэтому время работы линейно по размеру снимков.
+
+    Args:
+        old: Старый снимок
+        new: Новый снимок
+
+    Returns:
+        ProjectDiff: Добавленные, удаленные и перемещенные между модулями файлы,
+            изменения состава модулей, их владельцев и путей
+    """
+    diff = ProjectDiff()
+
+    old_files = map_files_to_modules(old)
+    new_files = map_files_to_modules(new)
+    for key, old_module in old_files.items():
+        new_module = new_files.get(key)
+        if new_module is None:
+            diff.removed_files.append((_key_to_path(key), old_module))
+        elif new_module != old_module:
+            diff.moved_files.append((_key_to_path(key), old_module, new_module))
+    for key, new_module in new_files.items():
+        if key not in old_files:
+            diff.added_files.append((_key_to_path(key), new_module))
+    diff.added_files.sort()
+    diff.removed_files.sort()
+    diff.moved_files.sort()
+
+    old_modules = dict(iter_qualified_modules(old))
+    new_modules = dict(iter_qualified_modules(new))
+    diff.removed_modules = sorted(name for name in old_modules if name not in new_modules)
+    diff.added_modules = sorted(name for name in new_modules if name not in old_modules)
+    for name in sorted(old_modules.keys() & new_modules.keys()):
+        old_module, new_module = old_modules[name], new_modules[name]
+        old_owners, new_owners = old_module.owners or [], new_module.owners or []
+        if set(old_owners) != set(new_owners):
+            diff.owner_changes.append(ModuleChange(name, old_owners, new_owners))
+        if set(old_module.paths) != set(new_module.paths):
+            diff.path_changes.append(ModuleChange(name, sorted(old_module.paths), sorted(new_module.paths)))
+    return diff
+
+
+def diff_files(old_path: str | Path, new_path: str | Path) -> ProjectDiff:
+    """Сравнивает два снимка проекта (result.json или бинарные снимки)"""
+    return diff_projects(load_project_snapshot(old_path), load_project_snapshot(new_path))
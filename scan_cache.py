@@ -0,0 +1,118 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Tuple
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+# Разделитель имен в сохраненном листинге: символ \0 не может встречаться в имени файла
+_SEPARATOR = "\0"
+
+# Директории, измененные позже этого порога до начала сканирования, не кешируются:
+# при грубом разрешении mtime изменение в ту же секунду иначе было бы пропущено
+_RACY_WINDOW_NS = 2_000_000_000
+
+Listing = Tuple[List[str], List[str]]
+
+
+class ScanCache:
+    """
+    Персистентный кеш листингов директорий для инкрементального сканирования.
+
+    Хранит в SQLite для каждой директории ее mtime и список файлов и
+    поддиректорий. При следующем сканировании директория перечитывается
+    только если ее mtime изменился, иначе листинг берется из кеша.
+    """
+
+    def __init__(self, db_path: str | Path):
+        """
+        Args:
+            db_path: Путь к файлу кеша
+        """
+        self.db_path = Path(db_path)
+        self.hits = 0
+        self.misses = 0
+        self._scan_started_ns = time.time_ns()
+        self._connection = sqlite3.connect(str(self.db_path))
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                files TEXT,
+                subdirs TEXT
+            );
+        """)
+
+        # Кеш целиком читается в память одним запросом, чтобы потоки сканера
+        # обращались только к словарю, а не к соединению SQLite
+        self._entries: Dict[str, Tuple[int, str, str]] = {
+            path: (mtime_ns, files, subdirs)
+            for path, mtime_ns, files, subdirs in self._connection.execute(
+                "SELECT path, mtime_ns, files, subdirs FROM directories")
+        }
+        self._updated: Dict[str, Tuple[int, str, str]] = {}
+        self._removed: Set[str] = set()
+        # list_directory вызывается из потоков сканера (jobs > 1): счетчики
+        # и изменения кеша обновляются под блокировкой, чтение диска - без нее
+        self._lock = threading.Lock()
+        logging.info(f"Загружен кеш сканирования {self.db_path}: {len(self._entries)} директорий")
+
+    @staticmethod
+    def _split(names: str) -> List[str]:
+        return names.split(_SEPARATOR) if names else []
+
+    def list_directory(self, directory: str, reader: Callable[[str], Listing]) -> Listing:
+        """
+        Возвращает листинг директории из кеша или читает его заново
+
+        Args:
+            directory: Абсолютный путь к директории
+            reader: Функция чтения директории с диска
+
+        Returns:
+            Tuple[List[str], List[str]]: Имена файлов и поддиректорий
+        """
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return reader(directory)
+
+        cached = self._entries.get(directory)
+        if cached is not None and cached[0] == mtime_ns:
+            with self._lock:
+                self.hits += 1
+            return self._split(cached[1]), self._split(cached[2])
+
+        files, subdirs = reader(directory)
+        # Удаленные поддиректории вычищаются из кеша вместе со всем поддеревом
+        removed = [os.path.join(directory, name)
+                   for name in set(self._split(cached[2])) - set(subdirs)] if cached is not None else []
+        with self._lock:
+            self.misses += 1
+            self._removed.update(removed)
+            if mtime_ns < self._scan_started_ns - _RACY_WINDOW_NS:
+                self._updated[directory] = (mtime_ns, _SEPARATOR.join(files), _SEPARATOR.join(subdirs))
+        return files, subdirs
+
+    def save(self) -> None:
+        """Записывает измененные листинги и удаляет исчезнувшие поддеревья"""
+        removed = [(path, path + os.sep, path + chr(ord(os.sep) + 1)) for path in self._removed]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO directories (path, mtime_ns, files, subdirs) VALUES (?, ?, ?, ?)",
+                [(path, *entry) for path, entry in self._updated.items()]
+            )
+            self._connection.executemany(
+                "DELETE FROM directories WHERE path = ? OR (path >= ? AND path < ?)", removed
+            )
+        self._entries.update(self._updated)
+        logging.info(f"Кеш сканирования: попаданий {self.hits}, перечитано {self.misses}, "
+                     f"обновлено {len(self._updated)}, удалено поддеревьев {len(removed)}")
+        self._updated = {}
+        self._removed = set()
+        self._scan_started_ns = time.time_ns()
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,339 @@
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import os
+import subprocess
+import logging
+
+from module import Module
+from scan_cache import ScanCache
+from ignore_rules import DEFAULT_PATTERNS, GITIGNORE, IgnoreRules, is_ignored, load_parent_gitignores
+from path_index import PathTrie, PathTrieNode, split_path
+from profiling import PROFILER
+
+
+def iter_modules(modules: Iterable[Module]) -> Iterator[Module]:
+    """Обходит модули и все их подмодули в глубину"""
+    for module in modules:
+        yield module
+        if module.submodules:
+            yield from iter_modules(module.submodules)
+
+
+def read_directory(directory: str) -> Tuple[List[str], List[str]]:
+    """
+    Читает содержимое директории одним вызовом os.scandir
+
+    Returns:
+        Tuple[List[str], List[str]]: Отсортированные имена файлов и поддиректорий
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+                except OSError:
+                    continue
+    except OSError as e:
+        logging.warning(f"Не удалось прочитать директорию {directory}: {e}")
+    files.sort()
+    subdirs.sort()
+    return files, subdirs
+
+
+def list_tracked_files(root_dir: Path) -> List[str]:
+    """
+    Возвращает файлы, отслеживаемые Git, одним вызовом git ls-files
+
+    Пути совпадают с теми, что git2sqlite записывает в commit_files.filename,
+    если root_dir является корнем репозитория. Gitlink-записи (подмодули Git)
+    пропускаются, файл с конфликтом слияния (несколько стадий индекса)
+    возвращается один раз.
+
+    Args:
+        root_dir: Директория внутри Git-репозитория
+
+    Returns:
+        List[str]: Пути файлов относительно root_dir
+    """
+    process = subprocess.run(["git", "ls-files", "-z", "--stage"], cwd=str(root_dir),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"Не удалось получить список файлов Git в {root_dir}: "
+                           f"{process.stderr.decode('utf-8', errors='replace').strip()}")
+
+    result = []
+    previous = None
+    for record in process.stdout.split(b"\0"):
+        if not record:
+            continue
+        # Формат записи: "<mode> <object> <stage>\t<path>"
+        meta, _, path = record.partition(b"\t")
+        # Стадии одного пути идут подряд: вывод отсортирован по пути
+        if meta.startswith(b"160000") or path == previous:
+            continue
+        previous = path
+        result.append(os.fsdecode(path))
+    return result
+
+
+# Состояние обхода директории: (путь, активные модули, цепочка правил .gitignore,
+# узел дерева путей модулей или None, если ниже нет явно заданных путей)
+WalkState = Tuple[str, Tuple[Module, ...], Tuple[IgnoreRules, ...], Optional[PathTrieNode[Module]]]
+
+# Модули, которым принадлежит директория, и ее узел в дереве путей модулей
+DirectoryOwners = Tuple[Tuple[Module, ...], Optional[PathTrieNode[Module]]]
+
+
+def _extend(active: Tuple[Module, ...], extra: Sequence[Module]) -> Tuple[Module, ...]:
+    """Добавляет модули к активному набору без дублей (сравнение по идентичности)"""
+    added = tuple(module for module in extra if not any(module is a for a in active))
+    return active + added if added else active
+
+
+class ProjectScanner:
+    """
+    Однопроходный сканер файловой системы проекта.
+
+    Обходит каждую директорию под root_directory не более одного раза через
+    os.scandir и передает каждый найденный файл всем модулям и подмодулям,
+    в чьих paths он содержится.
+
+    Поддеревья, исключенные правилами .gitignore или списком exclude всех
+    активных модулей, отсекаются до чтения, если в них нет явно заданных
+    путей модулей.
+
+    При jobs > 1 независимые поддеревья читаются параллельно пулом потоков,
+    а раздача файлов модулям идет после чтения в том же порядке, что и при
+    последовательном обходе, поэтому результат не зависит от числа потоков.
+    """
+
+    def __init__(self, modules: Iterable[Module], root_dir: Optional[Path] = None, jobs: int = 1,
+                 cache: Optional[ScanCache] = None, use_gitignore: bool = True):
+        """
+        Args:
+            modules: Модули верхнего уровня (подмодули обходятся автоматически)
+            root_dir: Корневая директория проекта (по умолчанию текущая)
+            jobs: Количество потоков для чтения директорий
+            cache: Кеш листингов директорий (опционально)
+            use_gitignore: Учитывать ли правила из файлов .gitignore
+        """
+        if root_dir is None:
+            root_dir = Path.cwd()
+        self.root_dir = Path(root_dir).absolute()
+        self.jobs = max(1, jobs)
+        self.cache = cache
+        self.use_gitignore = use_gitignore
+        self.files_count = 0
+        self._default_rules = IgnoreRules(self.root_dir.anchor, DEFAULT_PATTERNS)
+
+        # Дерево абсолютных путей модулей: при обходе узел спускается вместе с
+        # директорией, так что поиск модулей для записи - один поиск в словаре детей.
+        # Узлы на пути к явно заданным путям модулей не отсекаются при обходе
+        self._trie: PathTrie[Module] = PathTrie()
+        self._target_paths = set()
+        # id(модуль) -> правила exclude, привязанные к каждому из его путей
+        self._excludes: Dict[int, List[IgnoreRules]] = {}
+        for module in iter_modules(modules):
+            for path_str in module.paths:
+                path = os.path.normpath(os.path.join(self.root_dir, path_str))
+                self._trie.insert(path, module)
+                self._target_paths.add(path)
+                if module.exclude:
+                    self._excludes.setdefault(id(module), []).append(IgnoreRules(path, module.exclude))
+
+    def _start_points(self) -> List[Tuple[str, PathTrieNode[Module]]]:
+        """Пути модулей, не вложенные в другие пути модулей, и их узлы в дереве"""
+        result = []
+        for path in sorted(self._target_paths):
+            depth = len(split_path(path))
+            if any(prefix_depth < depth for prefix_depth, _ in self._trie.iter_prefixes(path)):
+                continue
+            result.append((path, self._trie.find_node(path)))
+        return result
+
+    def _list_directory(self, directory: str) -> Tuple[List[str], List[str]]:
+        """Возвращает листинг директории, по возможности из кеша сканирования"""
+        if self.cache is not None:
+            return self.cache.list_directory(directory, read_directory)
+        return read_directory(directory)
+
+    def _dispatch(self, path: str, modules: Sequence[Module]) -> None:
+        """Передает файл всем модулям, которым он принадлежит"""
+        if not modules:
+            return
+        for module in modules:
+            module._add_file(path, check_exists=False)
+        self.files_count += 1
+
+    def _is_excluded(self, module: Module, path: str, is_dir: bool) -> bool:
+        """Проверяет путь по списку exclude модуля"""
+        for rule_set in self._excludes.get(id(module), ()):
+            decision = rule_set.match(path, is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+    def _filter(self, modules: Tuple[Module, ...], path: str, is_dir: bool) -> Tuple[Module, ...]:
+        """Убирает модули, исключившие путь через exclude"""
+        if not self._excludes:
+            return modules
+        return tuple(module for module in modules if not self._is_excluded(module, path, is_dir))
+
+    def _visit(self, directory: str, active: Tuple[Module, ...], rules: Tuple[IgnoreRules, ...],
+               node: Optional[PathTrieNode[Module]]) -> Tuple[List[Tuple[str, Tuple[Module, ...]]], List[WalkState]]:
+        """
+        Читает директорию и решает, что делать с ее содержимым
+
+        Returns:
+            Tuple: Файлы с модулями, которым они достаются, и состояния
+                поддиректорий для дальнейшего обхода (отсеченные поддеревья не включаются)
+        """
+        files, subdirs = self._list_directory(directory)
+        if self.use_gitignore and GITIGNORE in files:
+            rule_set = IgnoreRules.from_file(os.path.join(directory, GITIGNORE))
+            if rule_set:
+                rules = rules + (rule_set,)
+
+        dispatched = []
+        for name in files:
+            path = os.path.join(directory, name)
+            child = node.children.get(name) if node is not None else None
+            targets = child.values if child is not None else ()
+            if is_ignored(rules, path, False):
+                modules = tuple(targets)
+            else:
+                modules = _extend(self._filter(active, path, False), targets)
+            if modules:
+                dispatched.append((path, modules))
+
+        children = []
+        for name in subdirs:
+            path = os.path.join(directory, name)
+            child = node.children.get(name) if node is not None else None
+            targets = child.values if child is not None else ()
+            # Игнорируемое поддерево отсекается целиком, если в нем нет явно заданных путей модулей
+            if is_ignored(rules, path, True):
+                if child is None:
+                    continue
+                child_active = tuple(targets)
+            else:
+                child_active = _extend(self._filter(active, path, True), targets)
+            if child_active or child is not None:
+                children.append((path, child_active, rules, child))
+        return dispatched, children
+
+    def _walk_tree(self, tops: Sequence[WalkState]) -> None:
+        """Последовательно обходит поддеревья tops, раздавая файлы модулям"""
+        # Кладем в стек в обратном порядке, чтобы обход шел по алфавиту
+        stack = list(reversed(tops))
+        while stack:
+            dispatched, children = self._visit(*stack.pop())
+            for path, modules in dispatched:
+                self._dispatch(path, modules)
+            stack.extend(reversed(children))
+
+    def _walk_tree_parallel(self, tops: Sequence[WalkState]) -> None:
+        """
+        Читает поддеревья tops пулом потоков, затем раздает файлы модулям
+        в порядке последовательного обхода
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            pending = {executor.submit(self._visit, *state): state[0] for state in tops}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory = pending.pop(future)
+                    dispatched, children = future.result()
+                    results[directory] = (dispatched, children)
+                    for state in children:
+                        pending[executor.submit(self._visit, *state)] = state[0]
+
+        stack = [state[0] for state in reversed(tops)]
+        while stack:
+            dispatched, children = results.pop(stack.pop())
+            for path, modules in dispatched:
+                self._dispatch(path, modules)
+            stack.extend(state[0] for state in reversed(children))
+
+    def _modules_for_directory(self, directory: str, memo: Dict[str, DirectoryOwners]) -> DirectoryOwners:
+        """Модули, чьи paths содержат директорию, и ее узел в дереве (с мемоизацией по директориям)"""
+        entry = memo.get(directory)
+        if entry is None:
+            parent, name = os.path.split(directory)
+            if parent == directory:
+                node = self._trie.root.children.get(split_path(directory)[0]) if directory else None
+                inherited: Tuple[Module, ...] = ()
+            else:
+                inherited, parent_node = self._modules_for_directory(parent, memo)
+                node = parent_node.children.get(name) if parent_node is not None else None
+            targets = node.values if node is not None else ()
+            entry = memo[directory] = (_extend(self._filter(inherited, directory, True), targets), node)
+        return entry
+
+    @PROFILER.profiled("scan.git_index")
+    def scan_git_index(self) -> int:
+        """
+        Раздает модулям файлы из индекса Git вместо обхода файловой системы.
+
+        Не читает директории и не делает stat: build-артефакты и прочие
+        неотслеживаемые файлы в результат не попадают. Правила .gitignore
+        к отслеживаемым файлам не применяются, exclude модулей - применяются.
+
+        Returns:
+            int: Количество файлов, попавших хотя бы в один модуль
+        """
+        self.files_count = 0
+        memo: Dict[str, DirectoryOwners] = {}
+        for rel_path in list_tracked_files(self.root_dir):
+            path = os.path.normpath(os.path.join(self.root_dir, rel_path))
+            directory, name = os.path.split(path)
+            modules, node = self._modules_for_directory(directory, memo)
+            child = node.children.get(name) if node is not None else None
+            self._dispatch(path, _extend(self._filter(modules, path, False), child.values if child is not None else ()))
+        PROFILER.count("scan.files", self.files_count)
+        logging.info(f"Сканирование индекса Git завершено. Найдено файлов: {self.files_count}")
+        return self.files_count
+
+    @PROFILER.profiled("scan")
+    def scan(self) -> int:
+        """
+        Сканирует все пути модулей
+
+        Returns:
+            int: Количество найденных файлов
+        """
+        self.files_count = 0
+        tops = []
+        for start, node in self._start_points():
+            modules = tuple(node.values)
+            if os.path.isdir(start):
+                rules = (self._default_rules,)
+                if self.use_gitignore:
+                    rules += load_parent_gitignores(str(self.root_dir), start)
+                tops.append((start, modules, rules, node))
+            elif os.path.isfile(start):
+                self._dispatch(start, modules)
+            else:
+                logging.warning(f"Путь модуля не найден: {start}")
+
+        if self.jobs > 1:
+            self._walk_tree_parallel(tops)
+        else:
+            self._walk_tree(tops)
+
+        if self.cache is not None:
+            with PROFILER.span("scan.cache_save"):
+                self.cache.save()
+            PROFILER.count("scan.cache_hits", self.cache.hits)
+            PROFILER.count("scan.cache_misses", self.cache.misses)
+        PROFILER.count("scan.files", self.files_count)
+        logging.info(f"Сканирование завершено. Найдено файлов: {self.files_count}")
+        return self.files_count
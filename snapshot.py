@@ -0,0 +1,379 @@
+from __future__ import annotations
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+import mmap
+import os
+import struct
+import logging
+
+from project import Project
+from module import Module
+from file_info import FileInfo
+from visitors import ProjectVisitor
+from deserializer import JsonDeserializer, LazyModule
+from profiling import PROFILER
+
+# Формат бинарного снимка проекта (все числа little-endian):
+#   заголовок: сигнатура, версия, строки имени проекта и корневой директории,
+#              таблица секций (смещение, количество записей);
+#   STRINGS     - смещения строк в STRING_DATA (u32, записей на одну больше, чем строк);
+#   STRING_DATA - строки в UTF-8 подряд;
+#   MODULES     - модули в прямом порядке обхода (_MODULE);
+#   LISTS       - идентификаторы строк для owners, paths и exclude модулей (u32);
+#   GROUPS      - файлы модулей: имя и диапазон в PATHS (_GROUP);
+#   PATHS       - идентификаторы строк путей файлов (u32);
+#   FILE_INDEX  - пары (путь, модуль), отсортированные по байтам пути (_FILE_ENTRY).
+MAGIC = b"ATSNAP\0\0"
+VERSION = 1
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Отсутствующее значение (None) для идентификаторов и количеств
+NONE = 0xFFFFFFFF
+
+(STRINGS, STRING_DATA, MODULES, LISTS, GROUPS, PATHS, FILE_INDEX) = range(7)
+_SECTION_COUNT = 7
+
+_HEADER = struct.Struct("<8sIII" + "QQ" * _SECTION_COUNT)
+_U32 = struct.Struct("<I")
+# name, description, parent, owners (start, count), paths (start, count),
+# exclude (start, count), files (start, count)
+_MODULE = struct.Struct("<11I")
+_GROUP = struct.Struct("<3I")
+_FILE_ENTRY = struct.Struct("<2I")
+
+
+class SnapshotVisitor(ProjectVisitor):
+    """
+    Visitor, записывающий проект в бинарный снимок.
+
+    Сохраняются собственные файлы каждого модуля (module.files), агрегаты по
+    поддереву восстанавливаются при чтении (Snapshot.to_project). Снимок
+    записывается в поток в get_result().
+    """
+
+    def __init__(self, stream: BinaryIO):
+        """
+        Args:
+            stream: Бинарный поток для записи снимка
+        """
+        self._stream = stream
+        self._strings: List[bytes] = []
+        self._string_ids: Dict[str, int] = {}
+        self._project_name = NONE
+        self._root_directory = NONE
+        self._modules: List[Tuple[int, ...]] = []
+        self._lists: List[int] = []
+        self._groups: List[Tuple[int, int, int]] = []
+        self._paths: List[int] = []
+        self._file_index: List[Tuple[int, int]] = []
+        self._parents: List[int] = [NONE]
+
+    def _string(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value.encode("utf-8"))
+        return string_id
+
+    def _list(self, values: Optional[Iterable[str]]) -> Tuple[int, int]:
+        if values is None:
+            return 0, NONE
+        start = len(self._lists)
+        self._lists.extend(self._string(value) for value in values)
+        return start, len(self._lists) - start
+
+    def visit_project(self, project) -> None:
+        self._project_name = self._string(project.name)
+        self._root_directory = self._string(getattr(project, "root_directory", ""))
+
+    def visit_module(self, module) -> None:
+        index = len(self._modules)
+        groups_start = len(self._groups)
+        for name, file_info in module.files.items():
+            paths_start = len(self._paths)
+            for path in file_info.paths.strings():
+                path_id = self._string(path)
+                self._paths.append(path_id)
+                self._file_index.append((path_id, index))
+            self._groups.append((self._string(name), paths_start, len(self._paths) - paths_start))
+
+        self._modules.append((
+            self._string(module.name),
+            self._string(module.description),
+            self._parents[-1],
+            *self._list(module.owners),
+            *self._list(sorted(module.paths)),
+            *self._list(module.exclude),
+            groups_start,
+            len(self._groups) - groups_start,
+        ))
+
+        self._parents.append(index)
+        for submodule in module.submodules or ():
+            self.visit_module(submodule)
+        self._parents.pop()
+
+    @PROFILER.profiled("snapshot.write")
+    def get_result(self) -> str:
+        strings = self._strings
+        self._file_index.sort(key=lambda entry: (strings[entry[0]], entry[1]))
+
+        offsets = [0]
+        for value in strings:
+            offsets.append(offsets[-1] + len(value))
+
+        sections = [
+            (struct.pack(f"<{len(offsets)}I", *offsets), len(strings)),
+            (b"".join(strings), offsets[-1]),
+            (b"".join(_MODULE.pack(*record) for record in self._modules), len(self._modules)),
+            (struct.pack(f"<{len(self._lists)}I", *self._lists), len(self._lists)),
+            (b"".join(_GROUP.pack(*group) for group in self._groups), len(self._groups)),
+            (struct.pack(f"<{len(self._paths)}I", *self._paths), len(self._paths)),
+            (b"".join(_FILE_ENTRY.pack(*entry) for entry in self._file_index), len(self._file_index)),
+        ]
+
+        table = []
+        offset = _HEADER.size
+        for data, count in sections:
+            table.extend((offset, count))
+            offset += len(data)
+        self._stream.write(_HEADER.pack(MAGIC, VERSION, self._project_name, self._root_directory, *table))
+        for data, _ in sections:
+            self._stream.write(data)
+        logging.info(f"Записан снимок проекта: модулей {len(self._modules)}, "
+                     f"путей {len(self._paths)}, строк {len(strings)}")
+        return ""
+
+
+class Snapshot:
+    """
+    Бинарный снимок проекта, открытый через mmap.
+
+    Таблицы читаются по запросу прямо из отображенного файла: поиск модуля
+    по пути файла - двоичный поиск по FILE_INDEX, файлы модуля читаются
+    только при обращении к ним.
+    """
+
+    def __init__(self, path: str | Path):
+        """
+        Args:
+            path: Путь к файлу снимка
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._buffer) < _HEADER.size:
+            self._buffer.close()
+            raise ValueError(f"{self.path} не является снимком проекта")
+        magic, version, self._project_name, self._root_directory, *table = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or version != VERSION:
+            self._buffer.close()
+            raise ValueError(f"{self.path} не является снимком проекта версии {VERSION}")
+        self._offsets = table[0::2]
+        self._counts = table[1::2]
+
+    def close(self) -> None:
+        self._buffer.close()
+
+    def __enter__(self) -> Snapshot:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _u32(self, section: int, index: int) -> int:
+        return _U32.unpack_from(self._buffer, self._offsets[section] + 4 * index)[0]
+
+    def _string_bytes(self, string_id: int) -> bytes:
+        start, end = struct.unpack_from("<2I", self._buffer, self._offsets[STRINGS] + 4 * string_id)
+        base = self._offsets[STRING_DATA]
+        return self._buffer[base + start:base + end]
+
+    def string(self, string_id: int) -> Optional[str]:
+        """Строка по идентификатору (None для NONE)"""
+        if string_id == NONE:
+            return None
+        return self._string_bytes(string_id).decode("utf-8")
+
+    def _strings(self, start: int, count: int) -> Optional[List[str]]:
+        if count == NONE:
+            return None
+        return [self.string(self._u32(LISTS, start + i)) for i in range(count)]
+
+    def _module(self, index: int) -> Tuple[int, ...]:
+        return _MODULE.unpack_from(self._buffer, self._offsets[MODULES] + _MODULE.size * index)
+
+    @property
+    def project_name(self) -> str:
+        return self.string(self._project_name)
+
+    @property
+    def root_directory(self) -> str:
+        return self.string(self._root_directory) or ""
+
+    @property
+    def module_count(self) -> int:
+        return self._counts[MODULES]
+
+    def module_name(self, index: int) -> str:
+        return self.string(self._module(index)[0])
+
+    def module_parent(self, index: int) -> Optional[int]:
+        parent = self._module(index)[2]
+        return None if parent == NONE else parent
+
+    def find_module(self, name: str) -> Optional[int]:
+        """Индекс первого в порядке обхода модуля с таким именем"""
+        encoded = name.encode("utf-8")
+        for index in range(self.module_count):
+            if self._string_bytes(self._module(index)[0]) == encoded:
+                return index
+        return None
+
+    @PROFILER.profiled("snapshot.files")
+    def module_files(self, index: int) -> Dict[str, FileInfo]:
+        """Собственные файлы модуля (без подмодулей)"""
+        start, count = self._module(index)[9:11]
+        result = {}
+        for group in range(start, start + count):
+            name_id, paths_start, paths_count = _GROUP.unpack_from(
+                self._buffer, self._offsets[GROUPS] + _GROUP.size * group)
+            name = self.string(name_id)
+            result[name] = FileInfo(name, [self.string(self._u32(PATHS, i))
+                                           for i in range(paths_start, paths_start + paths_count)])
+        return result
+
+    def subtree_files(self, start: int, end: int) -> Dict[str, FileInfo]:
+        """
+        Файлы поддерева модуля: модули в снимке идут в прямом порядке обхода,
+        поэтому поддерево модуля start - диапазон индексов [start, end)
+        """
+        result: Dict[str, FileInfo] = {}
+        for index in range(start, end):
+            for name, file_info in self.module_files(index).items():
+                existing = result.get(name)
+                if existing is None:
+                    result[name] = file_info
+                else:
+                    existing.merge(file_info)
+        return result
+
+    def _file_entry(self, position: int) -> Tuple[int, int]:
+        return _FILE_ENTRY.unpack_from(self._buffer, self._offsets[FILE_INDEX] + _FILE_ENTRY.size * position)
+
+    def modules_for_path(self, path: str | Path) -> List[int]:
+        """
+        Индексы модулей, в файлах которых есть путь, от внешних к вложенным
+
+        Относительный путь берется относительно root_directory, а относительный
+        root_directory - от текущей директории, как при сканировании.
+        """
+        path = os.path.abspath(os.path.join(self.root_directory or "", str(path)))
+        key = path.encode("utf-8")
+
+        low, high = 0, self._counts[FILE_INDEX]
+        while low < high:
+            middle = (low + high) // 2
+            if self._string_bytes(self._file_entry(middle)[0]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        result = []
+        while low < self._counts[FILE_INDEX]:
+            path_id, module = self._file_entry(low)
+            if self._string_bytes(path_id) != key:
+                break
+            result.append(module)
+            low += 1
+        return result
+
+    def find_by_path(self, path: str | Path) -> Optional[int]:
+        """Индекс самого глубокого модуля, которому принадлежит файл"""
+        modules = self.modules_for_path(path)
+        return modules[-1] if modules else None
+
+    @PROFILER.profiled("snapshot.load")
+    def to_project(self) -> Project:
+        """
+        Строит Project из снимка
+
+        Дерево модулей читается сразу, файлы каждого модуля - при первом
+        обращении к module.files. Как и при загрузке result.json, module.files
+        содержит файлы всего поддерева модуля (JsonVisitor пишет get_all_files()),
+        поэтому смысл module.files не зависит от формата.
+        """
+        modules: List[Module] = []
+        top_level: List[Module] = []
+        # Конец поддерева каждого модуля: индекс первого модуля вне поддерева
+        ends = [self.module_count] * self.module_count
+        open_modules: List[int] = []
+        for index in range(self.module_count):
+            parent = self.module_parent(index)
+            while open_modules and open_modules[-1] != parent:
+                ends[open_modules.pop()] = index
+            open_modules.append(index)
+        for index in range(self.module_count):
+            (name, description, parent, owners_start, owners_count, paths_start, paths_count,
+             exclude_start, exclude_count, _, _) = self._module(index)
+            module = LazyModule(
+                name=self.string(name),
+                paths=set(self._strings(paths_start, paths_count) or ()),
+                owners=self._strings(owners_start, owners_count),
+                description=self.string(description),
+                submodules=[],
+                files={},
+                exclude=self._strings(exclude_start, exclude_count)
+            )
+            module._files_loader = partial(self.subtree_files, index, ends[index])
+            modules.append(module)
+            if parent == NONE:
+                top_level.append(module)
+            else:
+                modules[parent].submodules.append(module)
+                module._parent = modules[parent]
+
+        project = Project(name=self.project_name, root_directory=self.root_directory, modules=[])
+        for module in top_level:
+            project.add_module(module)
+        return project
+
+
+def write_snapshot(project: Project, path: str | Path) -> None:
+    """Записывает бинарный снимок проекта в файл"""
+    with open(path, "wb") as f:
+        visitor = SnapshotVisitor(f)
+        project.accept(visitor)
+        visitor.get_result()
+
+
+def is_snapshot(path: str | Path) -> bool:
+    """Является ли файл бинарным снимком проекта"""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_project_snapshot(*paths: str | Path) -> Project:
+    """
+    Загружает проект из самого нового из существующих файлов
+
+    Выбирается файл с наибольшим временем изменения, чтобы снимок, оставшийся
+    от прошлого запуска, не подменял пересобранный result.json; при равном
+    времени - первый в порядке предпочтения. Бинарный снимок открывается
+    через mmap, остальные файлы читаются как result.json в ленивом режиме
+    JsonDeserializer.
+
+    Args:
+        paths: Пути-кандидаты в порядке предпочтения
+    """
+    existing = [(index, Path(path)) for index, path in enumerate(paths) if Path(path).exists()]
+    if not existing:
+        raise FileNotFoundError(f"Не найден ни один из файлов проекта: {', '.join(map(str, paths))}")
+    _, path = max(existing, key=lambda item: (item[1].stat().st_mtime, -item[0]))
+    if is_snapshot(path):
+        logging.info(f"Загрузка снимка проекта {path}")
+        return Snapshot(path).to_project()
+    logging.info(f"Загрузка проекта {path}")
+    return JsonDeserializer.deserialize(path, lazy=True)
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Модули проекта импортируются по имени, как при запуске скриптов из корня
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Автор и время коммитов тестовых репозиториев
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Test Author",
+    "GIT_AUTHOR_EMAIL": "author@example.com",
+    "GIT_COMMITTER_NAME": "Test Author",
+    "GIT_COMMITTER_EMAIL": "author@example.com",
+    "GIT_CONFIG_GLOBAL": os.devnull,
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+
+class GitRepo:
+    """Тестовый Git-репозиторий с коммитами в заданное время"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._time = 1_700_000_000
+        self.git("init", "-q", "-b", "main")
+
+    def git(self, *args: str) -> str:
+        env = dict(os.environ, **GIT_ENV)
+        env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"{self._time} +0000"
+        return subprocess.run(["git", *args], cwd=self.path, env=env, capture_output=True,
+                              text=True, check=True).stdout.strip()
+
+    def write(self, name: str, text: str) -> None:
+        path = self.path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    def commit(self, message: str, **files: str) -> str:
+        """Записывает файлы (имя "a__b" - путь "a/b") и создает коммит"""
+        for name, text in files.items():
+            self.write(name.replace("__", "/"), text)
+        self._time += 3600
+        self.git("add", "-A")
+        self.git("commit", "-q", "--allow-empty", "-m", message)
+        return self.git("rev-parse", "HEAD")
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """Фабрика тестовых репозиториев в tmp_path"""
+    def make(name: str = "repo") -> GitRepo:
+        path = tmp_path / name
+        path.mkdir()
+        return GitRepo(path)
+    return make
@@ -0,0 +1,259 @@
+import sqlite3
+
+import pytest
+
+import churn
+import git2sqlite
+import history_db
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    """Глобальное состояние git2sqlite не переходит между тестами"""
+    monkeypatch.setattr(git2sqlite, "file_renames", {})
+    monkeypatch.setattr(git2sqlite, "module_mapper", churn.ModuleMapper())
+    monkeypatch.setattr(git2sqlite, "include_merges", False)
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = git2sqlite.create_database(str(tmp_path / "history.db"))
+    yield connection
+    connection.close()
+
+
+def file_history(connection, repository=None):
+    """(сообщение коммита, путь файла, added, deleted) в порядке загрузки"""
+    return connection.execute("""
+        SELECT commits.summary, files.path, commit_files.added, commit_files.deleted
+        FROM commit_files
+        JOIN commits ON commits.id = commit_files.commit_id
+        JOIN files ON files.id = commit_files.file_id
+        JOIN repositories ON repositories.id = commits.repo_id
+        WHERE ?1 IS NULL OR repositories.name = ?1
+        ORDER BY commits.commit_time, files.path
+    """, (repository,)).fetchall()
+
+
+def test_collapse_renames_follows_chains_newest_first():
+    # git log перечисляет переименования от новых к старым: b -> c, затем a -> b
+    assert git2sqlite.collapse_renames([("b", "c"), ("a", "b")]) == {"a": "c"}
+    # После переименования a -> b под именем b до него жил другой файл
+    assert git2sqlite.collapse_renames([("a", "b"), ("b", "c")]) == {"a": "b", "b": "c"}
+
+
+def test_renamed_file_history_uses_final_name(git_repo, connection):
+    repo = git_repo()
+    body = "".join(f"line {i}\n" for i in range(20))
+    repo.commit("add", **{"src__a.py": body, "other.txt": "x\n"})
+    repo.git("mv", "src/a.py", "src/b.py")
+    repo.commit("rename a", **{"src__b.py": body + "more\n"})
+    (repo.path / "lib").mkdir()
+    repo.git("mv", "src/b.py", "lib/c.py")
+    repo.commit("rename b")
+
+    git2sqlite.load_git_history(connection, {}, repo_path=str(repo.path))
+
+    assert file_history(connection) == [
+        ("add", "lib/c.py", 20, 0),
+        ("add", "other.txt", 1, 0),
+        ("rename a", "lib/c.py", 1, 0),
+        ("rename b", "lib/c.py", 0, 0),
+    ]
+
+
+def test_rename_in_later_load_updates_earlier_rows(git_repo, connection):
+    repo = git_repo()
+    body = "".join(f"line {i}\n" for i in range(20))
+    repo.commit("add", **{"src__a.py": body})
+    git2sqlite.load_git_history(connection, {}, repo_path=str(repo.path))
+    repo.git("mv", "src/a.py", "src/b.py")
+    repo.commit("rename a")
+
+    git2sqlite.load_git_history(connection, {}, repo_path=str(repo.path))
+
+    assert file_history(connection) == [
+        ("add", "src/b.py", 20, 0),
+        ("rename a", "src/b.py", 0, 0),
+    ]
+    assert churn.file_churn(connection) == [("default", "src/b.py", 20, 0, 2)]
+
+
+def ingest_state(connection):
+    """Загруженные вершины веток (без водяного знака сводок)"""
+    return dict(connection.execute("SELECT ref, tip FROM ingest_state WHERE repo_id != ?",
+                                   (churn.ROLLUP_REPO_ID,)))
+
+
+def commit_summaries(connection, repository=None):
+    return sorted(summary for summary, in connection.execute("""
+        SELECT summary FROM commits
+        WHERE ?1 IS NULL OR repo_id = (SELECT id FROM repositories WHERE name = ?1)
+    """, (repository,)))
+
+
+def test_incremental_loads_only_new_commits(git_repo, connection):
+    repo = git_repo()
+    repo.commit("one", **{"a.txt": "1\n"})
+    repo.commit("two", **{"a.txt": "2\n"})
+    path = str(repo.path)
+
+    assert git2sqlite.ingest_incremental(connection, repo_path=path) == 2
+    assert ingest_state(connection) == {"refs/heads/main": repo.git("rev-parse", "HEAD")}
+    assert git2sqlite.ingest_incremental(connection, repo_path=path) == 0
+
+    tip = repo.commit("three", **{"b.txt": "3\n"})
+    assert git2sqlite.ingest_incremental(connection, repo_path=path) == 1
+    assert ingest_state(connection) == {"refs/heads/main": tip}
+    assert commit_summaries(connection) == ["one", "three", "two"]
+
+
+def test_incremental_branch_and_rewritten_tip(git_repo, connection):
+    repo = git_repo()
+    repo.commit("one", **{"a.txt": "1\n"})
+    repo.commit("two", **{"a.txt": "2\n"})
+    path = str(repo.path)
+    git2sqlite.ingest_incremental(connection, repo_path=path)
+
+    # Ветка от уже загруженного коммита: загружается только ее коммит
+    repo.git("checkout", "-q", "-b", "side", "HEAD~1")
+    repo.commit("side", **{"c.txt": "c\n"})
+    assert git2sqlite.ingest_incremental(connection, "side", repo_path=path) == 1
+
+    # Переписанная вершина main: загружается новый коммит, старый остается
+    repo.git("checkout", "-q", "main")
+    repo.git("commit", "-q", "--amend", "-m", "two amended")
+    assert git2sqlite.ingest_incremental(connection, "main", repo_path=path) == 1
+
+    assert commit_summaries(connection) == ["one", "side", "two", "two amended"]
+    assert set(ingest_state(connection)) == {"refs/heads/main", "refs/heads/side"}
+
+
+@pytest.fixture
+def fork(git_repo):
+    """Репозиторий upstream и его клон с одним собственным коммитом"""
+    upstream = git_repo("upstream")
+    upstream.commit("one", **{"src__a.py": "1\n"})
+    upstream.commit("two", **{"src__a.py": "2\n", "README": "r\n"})
+    clone = git_repo("fork")
+    clone.git("pull", "-q", str(upstream.path), "main")
+    clone._time = upstream._time
+    clone.commit("fork only", **{"src__a.py": "3\n"})
+    return upstream, clone
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_fork_ingested_after_upstream(fork, connection, jobs):
+    upstream, clone = fork
+    repositories = [("upstream", str(upstream.path)), ("fork", str(clone.path))]
+
+    assert git2sqlite.ingest_repositories(connection, repositories, {}, jobs=jobs) == 5
+
+    assert commit_summaries(connection, "upstream") == ["one", "two"]
+    assert commit_summaries(connection, "fork") == ["fork only", "one", "two"]
+    # Одинаковые пути разных репозиториев - разные файлы
+    assert connection.execute("SELECT COUNT(*) FROM files WHERE path = 'src/a.py'").fetchone() == (2,)
+    assert [row[1:] for row in file_history(connection, "fork")] == \
+        [("src/a.py", 1, 0), ("README", 1, 0), ("src/a.py", 1, 1), ("src/a.py", 1, 1)]
+
+    # Повторная загрузка ничего не дублирует
+    git2sqlite.ingest_repositories(connection, repositories, {}, jobs=jobs)
+    assert connection.execute("SELECT COUNT(*) FROM commits").fetchone() == (5,)
+
+
+def test_repositories_match_separate_databases(fork, tmp_path):
+    upstream, clone = fork
+    shared = git2sqlite.create_database(str(tmp_path / "shared.db"))
+    git2sqlite.ingest_repositories(shared, [("upstream", str(upstream.path)), ("fork", str(clone.path))], {})
+
+    for repo in (upstream, clone):
+        single = git2sqlite.create_database(str(tmp_path / f"{repo.path.name}.db"))
+        git2sqlite.load_git_history(single, {}, repo_path=str(repo.path))
+        assert file_history(shared, repo.path.name) == file_history(single)
+        single.close()
+    shared.close()
+
+
+def test_migration_scopes_commit_hashes_by_repository(tmp_path):
+    # База версии 6: хеш коммита уникален во всей базе
+    path = tmp_path / "v6.db"
+    connection = sqlite3.connect(str(path))
+    for statement in history_db.TABLES:
+        connection.execute(statement.replace("hash TEXT,", "hash TEXT UNIQUE,")
+                           .replace("UNIQUE (repo_id, hash),", ""))
+    connection.execute("INSERT INTO repositories (id, name) VALUES (1, 'upstream'), (2, 'fork')")
+    connection.execute("INSERT INTO commits (id, hash, summary, repo_id) VALUES (1, 'abc', 'one', 1)")
+    connection.execute("PRAGMA user_version = 6")
+    connection.commit()
+
+    history_db.ensure_schema(connection)
+    connection.execute("INSERT INTO commits (id, hash, summary, repo_id) VALUES (2, 'abc', 'one', 2)")
+    with pytest.raises(sqlite3.IntegrityError):
+        connection.execute("INSERT INTO commits (id, hash, summary, repo_id) VALUES (3, 'abc', 'one', 2)")
+
+    assert history_db.schema_version(connection) == history_db.SCHEMA_VERSION
+    assert connection.execute("SELECT name FROM repositories ORDER BY id").fetchall() == [("upstream",), ("fork",)]
+    connection.close()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_rerun_on_partly_loaded_database(git_repo, tmp_path, jobs):
+    repo = git_repo()
+    for index in range(5):
+        repo.commit(f"c{index}", **{f"f{index}.txt": f"{index}\n"})
+    path = str(repo.path)
+    connection = git2sqlite.create_database(str(tmp_path / f"jobs{jobs}.db"))
+    # Первая загрузка - только два последних коммита (узкое окно)
+    git2sqlite.ingest_commits(connection, git2sqlite.list_commits({}, None, path)[:2], repo_path=path)
+
+    if jobs == 1:
+        git2sqlite.load_git_history(connection, {}, repo_path=path)
+    else:
+        git2sqlite.parse_git_log_parallel(connection, {}, jobs=jobs, repo_path=path)
+
+    assert commit_summaries(connection) == ["c0", "c1", "c2", "c3", "c4"]
+    assert file_history(connection) == [(f"c{index}", f"f{index}.txt", 1, 0) for index in range(5)]
+    connection.close()
+
+
+def test_rollups_follow_watermark_not_emptiness(git_repo, connection, monkeypatch):
+    repo = git_repo()
+    repo.commit("one", **{"src__a.py": "1\n"})
+    repo.commit("two", **{"lib__b.py": "1\n2\n"})
+    path = str(repo.path)
+    git2sqlite.ingest_incremental(connection, repo_path=path)
+    expected = churn.file_churn(connection)
+
+    refreshed = []
+    monkeypatch.setattr(churn, "_refresh_in_transaction",
+                        lambda connection, days, modules: refreshed.append(days))
+    # Окно без изменений: сводки есть, полной перестройки нет
+    connection.execute("DELETE FROM churn_file_day")
+    churn.update_rollups(connection, ())
+    assert refreshed == []
+    monkeypatch.undo()
+
+    # Коммиты, загруженные после водяного знака, учитываются без переданных суток
+    connection.execute("DELETE FROM churn_file_day")
+    connection.execute("UPDATE ingest_state SET tip = '0' WHERE ref = ?", (churn.ROLLUP_REF,))
+    churn.update_rollups(connection, ())
+    assert churn.file_churn(connection) == expected
+
+
+def test_rollup_refresh_maps_only_changed_files(git_repo, connection, monkeypatch):
+    repo = git_repo()
+    repo.commit("old", **{"src__a.py": "1\n"})
+    path = str(repo.path)
+    git2sqlite.ingest_incremental(connection, repo_path=path)
+    repo._time += 30 * churn.DAY
+    repo.commit("new", **{"lib__b.py": "1\n"})
+
+    mapped = []
+    mapper = churn.ModuleMapper([("src", "core"), ("lib", "lib")])
+    module = mapper.module
+    monkeypatch.setattr(mapper, "module", lambda file_path: mapped.append(file_path) or module(file_path))
+    monkeypatch.setattr(git2sqlite, "module_mapper", mapper)
+    git2sqlite.ingest_incremental(connection, repo_path=path)
+
+    assert mapped == ["lib/b.py"]
+    assert churn.module_churn(connection, since=repo._time) == [("lib", 1, 0, 1)]
@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+import history_db
+
+
+def test_connect_does_not_create_missing_database(tmp_path):
+    path = tmp_path / "missing.db"
+
+    with pytest.raises(FileNotFoundError):
+        history_db.connect(path)
+    assert not path.exists()
+
+
+def test_connect_is_read_only(tmp_path):
+    path = tmp_path / "history.db"
+    connection = sqlite3.connect(str(path))
+    history_db.ensure_schema(connection)
+    connection.close()
+
+    connection = history_db.connect(path)
+    assert connection.execute("SELECT COUNT(*) FROM commits").fetchone() == (0,)
+    with pytest.raises(sqlite3.OperationalError):
+        connection.execute("INSERT INTO repositories (name) VALUES ('x')")
+    connection.close()
+
+
+@pytest.mark.parametrize("version", [0, 6, history_db.SCHEMA_VERSION + 1])
+def test_connect_rejects_other_schema_versions(tmp_path, version):
+    path = tmp_path / "history.db"
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE commits (id TEXT PRIMARY KEY)")
+    connection.execute(f"PRAGMA user_version = {version}")
+    connection.close()
+
+    with pytest.raises(RuntimeError):
+        history_db.connect(path)
+
+    # База не обновлена
+    connection = sqlite3.connect(str(path))
+    assert connection.execute("PRAGMA user_version").fetchone() == (version,)
+    connection.close()
+
+
+def test_to_epoch_formats():
+    assert history_db.to_epoch("2025-04-11 17:21:53 +0200") == 1744384913
+    assert history_db.to_epoch("2025-04-11T15:21:53Z") == 1744384913
+    assert history_db.to_epoch(1744384913) == 1744384913
+    assert history_db.to_epoch("") is None
+
+
+def test_baseline_schema_is_migrated_with_data(tmp_path):
+    # Схема и строки исходной версии git2sqlite (user_version не задан)
+    connection = sqlite3.connect(str(tmp_path / "v1.db"))
+    connection.execute("""
+        CREATE TABLE commits (id TEXT UNIQUE, summary TEXT, author_name TEXT, author_email TEXT,
+                              commit_date TEXT)
+    """)
+    connection.execute("""
+        CREATE TABLE commit_files (commit_id TEXT, filename TEXT, added INT, deleted INT,
+                                   FOREIGN KEY (commit_id) REFERENCES commits(id))
+    """)
+    connection.executemany("INSERT INTO commits VALUES (?, ?, ?, ?, ?)", [
+        ("aaa", "one", "Dev", "dev@example.com", "2025-04-11 17:21:53 +0200"),
+        ("bbb", "two", "Dev", "dev@example.com", "2025-04-12 10:00:00 +0000"),
+    ])
+    connection.executemany("INSERT INTO commit_files VALUES (?, ?, ?, ?)", [
+        ("aaa", "src/a.py", 10, 0), ("aaa", "README", 1, 0), ("bbb", "src/a.py", 2, 3),
+    ])
+    connection.commit()
+    assert history_db.schema_version(connection) == 1
+
+    history_db.ensure_schema(connection)
+
+    assert history_db.schema_version(connection) == history_db.SCHEMA_VERSION
+    assert connection.execute("PRAGMA user_version").fetchone() == (history_db.SCHEMA_VERSION,)
+    assert connection.execute("""
+        SELECT commits.hash, commits.summary, authors.name, authors.email, commits.commit_time,
+               repositories.name
+        FROM commits
+        JOIN authors ON authors.id = commits.author_id
+        JOIN repositories ON repositories.id = commits.repo_id
+        ORDER BY commits.commit_time
+    """).fetchall() == [
+        ("aaa", "one", "Dev", "dev@example.com", 1744384913, history_db.DEFAULT_REPOSITORY),
+        ("bbb", "two", "Dev", "dev@example.com", 1744452000, history_db.DEFAULT_REPOSITORY),
+    ]
+    assert connection.execute("""
+        SELECT commits.hash, files.path, commit_files.added, commit_files.deleted
+        FROM commit_files
+        JOIN commits ON commits.id = commit_files.commit_id
+        JOIN files ON files.id = commit_files.file_id AND files.repo_id = commits.repo_id
+        ORDER BY commits.hash, files.path
+    """).fetchall() == [("aaa", "README", 1, 0), ("aaa", "src/a.py", 10, 0), ("bbb", "src/a.py", 2, 3)]
+    tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not tables & {"commits_v1", "commit_files_v1"}
+
+    # Повторный вызов ничего не меняет
+    history_db.ensure_schema(connection)
+    assert connection.execute("SELECT COUNT(*) FROM commit_files").fetchone() == (3,)
+    connection.close()
+
+    # Отчеты открывают обновленную базу
+    connection = history_db.connect(tmp_path / "v1.db")
+    assert connection.execute("SELECT COUNT(*) FROM commits").fetchone() == (2,)
+    connection.close()
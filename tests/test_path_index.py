@@ -0,0 +1,49 @@
+import pytest
+
+import churn
+import gen_graph_gs
+from module import Module
+from path_index import ModuleIndex, PathTrie
+
+
+def test_prefix_matches_whole_segments():
+    trie = PathTrie()
+    trie.insert("src/core", "core")
+    trie.insert("src/core/deep", "deep")
+
+    assert trie.longest_prefix("src/core") == "core"
+    assert trie.longest_prefix("src/core/a.py") == "core"
+    assert trie.longest_prefix("src/core/deep/a.py") == "deep"
+    assert trie.longest_prefix("./src//core/deep/../b.py") == "core"
+    # Строковый префикс, но другой сегмент
+    assert trie.longest_prefix("src/core2/a.py") is None
+    assert trie.longest_prefix("src/cor") is None
+
+
+@pytest.mark.parametrize("path, module", [
+    ("src/core/a.py", "core"),
+    ("src/core/deep/a.py", "deep"),
+    ("src/core2/a.py", churn.UNKNOWN_MODULE),
+    ("README.md", churn.UNKNOWN_MODULE),
+])
+def test_modules_csv_lookups_agree_with_module_index(path, module):
+    rows = [("src/core", "core"), ("src/core/deep", "deep")]
+    mapper = churn.ModuleMapper(rows)
+    module_trie = gen_graph_gs.build_path_trie(path for path, _ in rows)
+    names = dict(rows)
+    core = Module(name="core", paths={"src/core"})
+    core.add_submodule(Module(name="deep", paths={"src/core/deep"}))
+    index = ModuleIndex([core], "/repo")
+
+    assert mapper.module(path) == module
+    assert names.get(module_trie.longest_prefix(path), churn.UNKNOWN_MODULE) == module
+    resolved = index.resolve("/repo/" + path)
+    assert (resolved.name if resolved else churn.UNKNOWN_MODULE) == module
+
+
+def test_folders_filter_matches_whole_segments():
+    folders = ["src/core"]
+
+    for filter_folders in (folders, gen_graph_gs.build_path_trie(folders)):
+        assert gen_graph_gs.is_file_in_folders("src/core/a.py", filter_folders)
+        assert not gen_graph_gs.is_file_in_folders("src/core2/a.py", filter_folders)
@@ -0,0 +1,42 @@
+from module import Module
+from project import Project
+
+
+def build_project():
+    core = Module(name="core", paths={"src/core"}, owners=["Dev@Example.com"])
+    core.add_submodule(Module(name="deep", paths={"src/core/deep"}))
+    return Project("demo", "/repo", [core, Module(name="ui", paths={"src/ui"})])
+
+
+def test_indexes_follow_added_submodules():
+    project = build_project()
+    extra = Module(name="extra", paths={"src/ui/extra"}, owners=["dev@example.com"])
+    project.find_module("ui").add_submodule(extra)
+
+    assert project.find_module("extra") is extra
+    assert project.find_by_path("src/ui/extra/a.py") is extra
+    assert project.find_by_path("/repo/src/core/deep/a.py").name == "deep"
+
+
+def test_add_path_updates_path_index():
+    project = build_project()
+    deep = project.find_module("deep")
+    assert project.find_by_path("lib/tool.py") is None
+
+    deep.add_path("lib")
+
+    assert project.find_by_path("lib/tool.py") is deep
+    assert project.find_by_path("/repo/lib/tool.py") is deep
+    assert "lib" in project.find_module("core").get_all_paths()
+
+
+def test_files_count_sums_module_counts():
+    core = Module(name="core", paths={"src/core"})
+    core.add_submodule(Module(name="deep", paths={"src/core/deep"}))
+    core._add_file("src/core/a.py", check_exists=False)
+    core._add_file("src/core/b.py", check_exists=False)
+    core.submodules[0]._add_file("src/core/deep/a.py", check_exists=False)
+
+    # a.py есть и в core, и в deep: в сумме он считается дважды
+    assert core.get_files_count() == 3
+    assert len(core.get_all_files()) == 2
@@ -0,0 +1,56 @@
+import os
+
+from module import Module
+from scan_cache import ScanCache
+from scanner import ProjectScanner
+
+
+def build_tree(root, directories=20):
+    for index in range(directories):
+        directory = root / "src" / f"d{index}"
+        directory.mkdir(parents=True)
+        (directory / "a.py").write_text("")
+    # Старые mtime: директории не попадают в окно "гонки" и кешируются
+    for path, _, _ in os.walk(root):
+        os.utime(path, (1_000_000, 1_000_000))
+
+
+def scan(root, cache, jobs=4):
+    modules = [Module(name="src", paths={"src"})]
+    count = ProjectScanner(modules, root, jobs=jobs, cache=cache).scan()
+    return count, sorted(modules[0].files["a.py"].paths.strings())
+
+
+def test_cached_scan_matches_fresh_scan(tmp_path):
+    root = tmp_path / "tree"
+    build_tree(root)
+    cache = ScanCache(tmp_path / "scan.db")
+
+    first = scan(root, cache)
+    cache.save()
+    # 21 директория: src и d0..d19
+    assert (cache.hits, cache.misses) == (0, 21)
+
+    second = scan(root, cache)
+    assert second == first
+    assert (cache.hits, cache.misses) == (21, 21)
+    cache.close()
+
+
+def test_changed_directory_is_reread(tmp_path):
+    root = tmp_path / "tree"
+    build_tree(root, directories=2)
+    cache = ScanCache(tmp_path / "scan.db")
+    scan(root, cache)
+    cache.save()
+    cache.close()
+
+    (root / "src" / "d1" / "b.py").write_text("")
+    os.utime(root / "src" / "d1", (2_000_000, 2_000_000))
+    cache = ScanCache(tmp_path / "scan.db")
+    modules = [Module(name="src", paths={"src"})]
+    count = ProjectScanner(modules, root, cache=cache).scan()
+
+    assert count == 3
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.close()
@@ -0,0 +1,112 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from module import Module
+from scanner import ProjectScanner
+
+
+def build_tree(root: Path) -> None:
+    for name in ["src/core/a.py", "src/core/b.py", "src/core/deep/a.py", "src/ui/view.py",
+                 "src/ui/a.py", "docs/readme.md", "top.txt", "other/x.py"]:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+
+
+def build_modules():
+    core = Module(name="core", paths={"src/core"})
+    deep = Module(name="deep", paths={"src/core/deep"})
+    core.add_submodule(deep)
+    ui = Module(name="ui", paths={"src/ui", "top.txt"})
+    src = Module(name="src", paths={"src"})
+    return [core, ui, src, Module(name="docs", paths={"docs"})]
+
+
+def iter_modules(modules):
+    for module in modules:
+        yield module
+        yield from iter_modules(module.submodules or [])
+
+
+def module_files(modules):
+    """{модуль: {имя файла: пути}} - собственные файлы каждого модуля"""
+    return {module.name: {name: sorted(map(str, info.paths)) for name, info in module.files.items()}
+            for module in iter_modules(modules)}
+
+
+def reference_scan(modules, root: Path) -> None:
+    """Сканирование каждого модуля отдельно, как до однопроходного сканера"""
+    for module in iter_modules(modules):
+        for path_str in module.paths:
+            path = root / path_str
+            if path.is_file():
+                module._add_file(path)
+            elif path.is_dir():
+                for file_path in path.rglob("*"):
+                    if file_path.is_file():
+                        module._add_file(file_path)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_scan_matches_per_module_walk(tmp_path, jobs):
+    build_tree(tmp_path)
+    expected = build_modules()
+    reference_scan(expected, tmp_path)
+
+    modules = build_modules()
+    scanner = ProjectScanner(modules, tmp_path, jobs=jobs, use_gitignore=False)
+    count = scanner.scan()
+
+    assert module_files(modules) == module_files(expected)
+    # other/x.py не входит ни в один модуль
+    assert count == 7
+
+
+def test_scan_respects_gitignore(tmp_path):
+    build_tree(tmp_path)
+    (tmp_path / ".gitignore").write_text("*.md\nsrc/ui/a.py\n")
+
+    modules = build_modules()
+    count = ProjectScanner(modules, tmp_path).scan()
+    files = module_files(modules)
+
+    assert files["docs"] == {}
+    assert sorted(files["ui"]) == ["top.txt", "view.py"]
+    assert count == 5
+
+
+def test_git_index_matches_filesystem_scan(git_repo):
+    repo = git_repo()
+    build_tree(repo.path)
+    repo.commit("tree")
+    # Неотслеживаемый файл есть только на диске
+    (repo.path / "src/core/untracked.py").write_text("")
+
+    from_git = build_modules()
+    git_count = ProjectScanner(from_git, repo.path).scan_git_index()
+    (repo.path / "src/core/untracked.py").unlink()
+    from_fs = build_modules()
+    fs_count = ProjectScanner(from_fs, repo.path).scan()
+
+    assert module_files(from_git) == module_files(from_fs)
+    assert git_count == fs_count == 7
+
+
+def test_git_index_counts_conflicted_path_once(git_repo):
+    repo = git_repo()
+    repo.commit("base", **{"src__core__a.py": "base\n", "src__ui__view.py": ""})
+    repo.git("checkout", "-q", "-b", "side")
+    repo.commit("side", **{"src__core__a.py": "side\n"})
+    repo.git("checkout", "-q", "main")
+    repo.commit("main", **{"src__core__a.py": "main\n"})
+    with pytest.raises(subprocess.CalledProcessError):
+        repo.git("merge", "side")
+    assert len(repo.git("ls-files", "--stage", "src/core/a.py").splitlines()) == 3
+
+    modules = build_modules()
+    count = ProjectScanner(modules, repo.path).scan_git_index()
+
+    assert count == 2
+    assert module_files(modules)["core"] == {"a.py": [str(repo.path / "src/core/a.py")]}
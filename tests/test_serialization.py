@@ -0,0 +1,164 @@
+import json
+import os
+
+import pytest
+
+from deserializer import JsonDeserializer
+from module import Module
+from project import Project
+from snapshot import Snapshot, load_project_snapshot, write_snapshot
+from visitors import JsonVisitor, StreamingJsonVisitor
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """Просканированный проект с относительным root_directory"""
+    for name in ["tree/src/core/a.py", "tree/src/core/deep/a.py", "tree/src/core/deep/b.py",
+                 "tree/src/ui/view.py", "tree/README.md"]:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    monkeypatch.chdir(tmp_path)
+
+    core = Module(name="core", paths={"src/core"}, owners=["dev@example.com"], description="Ядро")
+    core.add_submodule(Module(name="deep", paths={"src/core/deep"}, exclude=["*.tmp"]))
+    project = Project("demo", "tree", [core, Module(name="ui", paths={"src/ui", "README.md"})])
+    project.scan_files()
+    return project
+
+
+def iter_modules(modules):
+    for module in modules:
+        yield module
+        yield from iter_modules(module.submodules or [])
+
+
+def describe(project):
+    """Структура проекта и пути файлов каждого модуля в сравнимом виде"""
+    return {
+        module.name: {
+            "paths": sorted(module.paths),
+            "owners": module.owners,
+            "description": module.description,
+            "exclude": module.exclude,
+            "submodules": [submodule.name for submodule in module.submodules or []],
+            "files": {name: sorted(map(str, info.paths)) for name, info in module.get_all_files().items()},
+        }
+        for module in iter_modules(project.modules)
+    }
+
+
+def write_json(project, path, streaming, relative_paths):
+    if streaming:
+        with open(path, "w", encoding="utf-8") as f:
+            visitor = StreamingJsonVisitor(f, relative_paths=relative_paths)
+            project.accept(visitor)
+            visitor.get_result()
+    else:
+        visitor = JsonVisitor(relative_paths=relative_paths)
+        project.accept(visitor)
+        path.write_text(visitor.get_result(), encoding="utf-8")
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("relative_paths", [False, True])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_json_round_trip(project, tmp_path, streaming, relative_paths, lazy):
+    path = tmp_path / "result.json"
+    write_json(project, path, streaming, relative_paths)
+
+    loaded = JsonDeserializer.deserialize(path, lazy=lazy)
+
+    assert loaded.name == project.name
+    assert loaded.root_directory == project.root_directory
+    assert describe(loaded) == describe(project)
+    assert loaded.find_by_path("src/core/deep/b.py").name == "deep"
+
+
+def test_relative_paths_compress_relative_root(project, tmp_path, monkeypatch):
+    path = tmp_path / "result.json"
+    write_json(project, path, streaming=True, relative_paths=True)
+    data = json.loads(path.read_text(encoding="utf-8"))
+
+    assert data["path_root"] == os.path.join(str(tmp_path), "tree")
+    # Все директории записаны относительно корня, ни одной целиком
+    assert all(parent is not None for parent, _ in data["directories"])
+    assert [-1, "src"] in data["directories"]
+
+    # Пути восстанавливаются одинаково из любой текущей директории
+    monkeypatch.chdir(tmp_path / "tree" / "src")
+    assert describe(JsonDeserializer.deserialize(path)) == describe(project)
+
+
+def test_lazy_module_loads_files_on_demand(project, tmp_path):
+    path = tmp_path / "result.json"
+    write_json(project, path, streaming=True, relative_paths=False)
+
+    loaded = JsonDeserializer.deserialize(path, lazy=True)
+    core = loaded.find_module("core")
+
+    assert not core.files_loaded
+    # Файлы подмодуля deep тоже лежат под src/core
+    assert sorted(core.files) == ["a.py", "b.py"]
+    assert core.files_loaded
+
+
+def test_snapshot_round_trip(project, tmp_path):
+    path = tmp_path / "result.snapshot"
+    write_snapshot(project, path)
+
+    with Snapshot(path) as snapshot:
+        assert snapshot.project_name == "demo"
+        assert snapshot.module_name(snapshot.find_by_path("src/core/deep/a.py")) == "deep"
+        loaded = snapshot.to_project()
+        assert describe(loaded) == describe(project)
+
+
+def test_load_project_snapshot_prefers_newest_file(project, tmp_path):
+    snapshot_path = tmp_path / "result.snapshot"
+    json_path = tmp_path / "result.json"
+    write_snapshot(project, snapshot_path)
+    project.find_module("ui").add_submodule(Module(name="extra", paths={"src/extra"}))
+    write_json(project, json_path, streaming=True, relative_paths=False)
+
+    os.utime(snapshot_path, (1_000_000, 1_000_000))
+    assert load_project_snapshot(snapshot_path, json_path).find_module("extra") is not None
+
+    os.utime(json_path, (1_000, 1_000))
+    assert load_project_snapshot(snapshot_path, json_path).find_module("extra") is None
+
+    with pytest.raises(FileNotFoundError):
+        load_project_snapshot(tmp_path / "missing.snapshot")
+
+
+def test_snapshot_and_json_loaders_agree_on_module_files(project, tmp_path):
+    # Подмодуль вне путей родителя: его файлы есть только в агрегате ui
+    project.find_module("ui").add_submodule(Module(name="core-view", paths={"src/core/deep/b.py"}))
+    project.scan_files()
+    snapshot_path = tmp_path / "result.snapshot"
+    json_path = tmp_path / "result.json"
+    write_snapshot(project, snapshot_path)
+    write_json(project, json_path, streaming=True, relative_paths=False)
+
+    def own_files(loaded):
+        return {module.name: {name: sorted(map(str, info.paths)) for name, info in module.files.items()}
+                for module in iter_modules(loaded.modules)}
+
+    from_snapshot = own_files(load_project_snapshot(snapshot_path))
+    assert from_snapshot == own_files(JsonDeserializer.deserialize(json_path))
+    assert from_snapshot == own_files(JsonDeserializer.deserialize(json_path, lazy=True))
+    assert sorted(from_snapshot["ui"]) == ["README.md", "b.py", "view.py"]
+
+
+def test_streaming_json_releases_file_aggregates(project, tmp_path):
+    total = project.get_total_files()
+    assert all(module._all_files_cache is None for module in iter_modules(project.modules))
+
+    streamed = tmp_path / "streamed.json"
+    write_json(project, streamed, streaming=True, relative_paths=False)
+    assert all(module._all_files_cache is None for module in iter_modules(project.modules))
+
+    plain = tmp_path / "plain.json"
+    write_json(project, plain, streaming=False, relative_paths=False)
+    assert json.loads(streamed.read_text(encoding="utf-8")) == json.loads(plain.read_text(encoding="utf-8"))
+    assert total == json.loads(plain.read_text(encoding="utf-8"))["total_files"] == 4
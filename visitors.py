@@ -1,9 +1,15 @@
 from abc import ABC, abstractmethod
+import io
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, TextIO
 from pathlib import Path
 import logging
 
+from path_table import RelativePathEncoder
+
+# Значение поля path_encoding для путей, закодированных RelativePathEncoder
+RELATIVE_PATH_ENCODING = "relative"
+
 class ProjectVisitor(ABC):
     @abstractmethod
     def visit_project(self, project) -> None:
@@ -44,7 +50,7 @@ class TextVisitor(ProjectVisitor):
             self._output.append(f"{indent}Files:")
             for name, file_info in files.items():
                 self._output.append(f"{indent}  {name}:")
-                for path in file_info.paths:
+                for path in file_info.paths.strings():
                     self._output.append(f"{indent}    - {path}")
         
         self._indent += 1
@@ -55,11 +61,30 @@ class TextVisitor(ProjectVisitor):
     def get_result(self) -> str:
         return "\n".join(self._output)
 
+def encode_file_paths(name: str, file_info, encoder: Optional[RelativePathEncoder]) -> list:
+    """Пути одного файла для JSON: полные строки или ссылки на таблицу директорий"""
+    if encoder is None:
+        return list(file_info.paths.strings())
+    return [encoder.encode(ref, name) for ref in file_info.refs]
+
+
+def encode_files(files, encoder: Optional[RelativePathEncoder]) -> Dict[str, list]:
+    """Пути файлов модуля для JSON: полные строки или ссылки на таблицу директорий"""
+    return {name: encode_file_paths(name, file_info, encoder) for name, file_info in files.items()}
+
+
 class JsonVisitor(ProjectVisitor):
-    def __init__(self):
+    def __init__(self, relative_paths: bool = False):
+        """
+        Args:
+            relative_paths: Хранить пути относительно root_directory через общую
+                таблицу директорий (path_encoding = "relative")
+        """
         self._data = {}
         self._current_module = None
         self._module_stack = []
+        self._relative_paths = relative_paths
+        self._encoder: Optional[RelativePathEncoder] = None
         
     def visit_project(self, project) -> None:
         self._data = {
@@ -70,6 +95,11 @@ class JsonVisitor(ProjectVisitor):
         }
         if hasattr(project, 'root_directory'):
             self._data["root_directory"] = project.root_directory
+        if self._relative_paths:
+            self._encoder = RelativePathEncoder(getattr(project, 'root_directory', ""))
+            self._data["path_encoding"] = RELATIVE_PATH_ENCODING
+            self._data["path_root"] = self._encoder.root
+            self._data["directories"] = self._encoder.directories
         
     def visit_module(self, module) -> None:
         module_data = {
@@ -77,6 +107,7 @@ class JsonVisitor(ProjectVisitor):
             "description": module.description,
             "owners": module.owners,
             "paths": list(module.paths),
+            "exclude": module.exclude,
             "files": {},
             "submodules": []
         }
@@ -86,9 +117,7 @@ class JsonVisitor(ProjectVisitor):
         files = module.get_all_files()
         logging.info(f"Found {len(files)} files in module {module.name}")
         
-        for name, file_info in files.items():
-            module_data["files"][name] = list(str(p) for p in file_info.paths)
-            logging.debug(f"Added file {name} with {len(file_info.paths)} paths to module {module.name}")
+        module_data["files"] = encode_files(files, self._encoder)
             
         # Add to parent or project
         if self._current_module is None:
@@ -104,9 +133,139 @@ class JsonVisitor(ProjectVisitor):
                 self.visit_module(submodule)
             self._current_module = self._module_stack.pop()
         
+    def get_data(self) -> dict:
+        """Возвращает собранные данные без сериализации в строку"""
+        return self._data
+
     def get_result(self) -> str:
         return json.dumps(self._data, indent=2, ensure_ascii=False)
 
+
+class StreamingJsonVisitor(ProjectVisitor):
+    """
+    JSON-visitor, который пишет результат в поток по мере обхода.
+
+    Формат совпадает с JsonVisitor (кроме порядка ключей проекта: root_directory
+    идет до modules), но в памяти в каждый момент находятся только агрегаты
+    файлов текущего модуля верхнего уровня: total_files считается без
+    построения агрегатов, файлы пишутся по одному, а агрегат модуля
+    освобождается сразу после записи. get_result() дописывает закрывающие скобки; если поток
+    не передан, результат собирается в строку и возвращается.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, indent: Optional[int] = 2,
+                 relative_paths: bool = False):
+        """
+        Args:
+            stream: Поток для записи (по умолчанию - строка в памяти)
+            indent: Отступ как в json.dumps; None - компактный вывод
+            relative_paths: Хранить пути относительно root_directory; таблица
+                директорий дописывается после modules
+        """
+        self._owns_stream = stream is None
+        self._stream = io.StringIO() if stream is None else stream
+        self._indent = indent
+        self._key_separator = ": " if indent is not None else ":"
+        self._first: List[bool] = []  # Для каждого открытого контейнера: не было ли еще элементов
+        self._finished = False
+        self._relative_paths = relative_paths
+        self._encoder: Optional[RelativePathEncoder] = None
+
+    def _newline(self) -> None:
+        if self._indent is not None:
+            self._stream.write("\n" + " " * (self._indent * len(self._first)))
+
+    def _open(self, bracket: str) -> None:
+        self._stream.write(bracket)
+        self._first.append(True)
+
+    def _close(self, bracket: str) -> None:
+        empty = self._first.pop()
+        if not empty:
+            self._newline()
+        self._stream.write(bracket)
+
+    def _item(self) -> None:
+        if self._first[-1]:
+            self._first[-1] = False
+        else:
+            self._stream.write(",")
+        self._newline()
+
+    def _key(self, key: str) -> None:
+        self._item()
+        self._stream.write(json.dumps(key, ensure_ascii=False) + self._key_separator)
+
+    def _value(self, value: Any) -> None:
+        if isinstance(value, dict):
+            self._open("{")
+            for key, item in value.items():
+                self._key(key)
+                self._value(item)
+            self._close("}")
+        elif isinstance(value, (list, tuple)):
+            self._open("[")
+            for item in value:
+                self._item()
+                self._value(item)
+            self._close("]")
+        else:
+            self._stream.write(json.dumps(value, ensure_ascii=False))
+
+    def _field(self, key: str, value: Any) -> None:
+        self._key(key)
+        self._value(value)
+
+    def visit_project(self, project) -> None:
+        self._open("{")
+        self._field("name", project.name)
+        self._field("total_modules", len(project.modules))
+        self._field("total_files", project.get_total_files())
+        if hasattr(project, 'root_directory'):
+            self._field("root_directory", project.root_directory)
+        if self._relative_paths:
+            self._encoder = RelativePathEncoder(getattr(project, 'root_directory', ""))
+            self._field("path_encoding", RELATIVE_PATH_ENCODING)
+            self._field("path_root", self._encoder.root)
+        self._key("modules")
+        self._open("[")
+
+    def visit_module(self, module) -> None:
+        self._item()
+        self._open("{")
+        self._field("name", module.name)
+        self._field("description", module.description)
+        self._field("owners", module.owners)
+        self._field("paths", list(module.paths))
+        self._field("exclude", module.exclude)
+
+        # Файлы пишутся по одному; агрегат модуля больше не нужен после записи,
+        # поэтому в памяти остаются только агрегаты еще не записанных подмодулей
+        self._key("files")
+        self._open("{")
+        for name, file_info in module.get_all_files().items():
+            self._field(name, encode_file_paths(name, file_info, self._encoder))
+        self._close("}")
+        module.release_files_cache()
+
+        self._key("submodules")
+        self._open("[")
+        for submodule in module.submodules or ():
+            self.visit_module(submodule)
+        self._close("]")
+        self._close("}")
+
+    def get_result(self) -> str:
+        if not self._finished:
+            self._close("]")
+            if self._encoder is not None:
+                self._field("directories", self._encoder.directories)
+            self._close("}")
+            self._finished = True
+        if self._owns_stream:
+            return self._stream.getvalue()
+        return ""
+
 class DetailedTextVisitor(ProjectVisitor):
     def __init__(self, root_directory: Path):
         self._output = []
@@ -137,9 +296,9 @@ class DetailedTextVisitor(ProjectVisitor):
             for path in module.paths:
                 self._output.append(f"{indent}  - {path}")
         
-        self._output.append(f"{indent}Количество уникальных файлов: {len(module.get_all_files())}")
-        
         files = module.get_all_files()
+        self._output.append(f"{indent}Количество уникальных файлов: {len(files)}")
+        
         if files:
             self._output.append(f"{indent}Файлы:")
             for name, file_info in sorted(files.items()):